@@ -1,16 +1,39 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
 from pydantic import BaseModel
-from typing import Dict, List, Optional
+from typing import Dict, Any, List, Optional
 import os
+import json
+import time
+import asyncio
+from contextlib import aclosing
+from pathlib import Path
 
 from ..core.agent.agent import Agent
-from ..core.models.model_router import ModelRouter
+from ..core.models.model_router import (
+    ModelRouter,
+    ROLE_CHAT,
+    ROLE_CODE_ANALYSIS,
+    ROLE_CODE_IMPROVEMENT,
+    ROLE_LEARNING
+)
+from ..core.models.cache import AnalysisCache
+from ..core.models.singleflight import SingleFlight
+from ..core.models.scheduler import RateLimitScheduler, PRIORITY_INTERACTIVE
+from ..core.models.hedging import HedgePolicy
 from ..core.models.openai_model import OpenAIModel
 from ..core.models.anthropic_model import AnthropicModel
 from ..core.config.key_manager import APIKeyManager
 from ..core.agent.learning import AgentLearning
+from ..core.agent.learning_queue import LearningIngestor, LearningQueueFullError
 from ..core.agent.improvement import CodeImprovement
+from ..core.monitoring.loop_monitor import EventLoopLagMonitor
+from ..core.monitoring import metrics
+from ..core.monitoring.tracing import tracer
+from ..core.monitoring.profiler import SamplingProfiler
+from ..core.storage.shared_state import open_shared_state
+from ..core.storage.versions import version_store, VersionNotFoundError
 
 app = FastAPI()
 
@@ -24,11 +47,100 @@ app.add_middleware(
 )
 
 # Initialize components
-key_manager = APIKeyManager()
-model_router = ModelRouter()
-agent = Agent(model_router, key_manager)
-learning_system = AgentLearning(model_router)
+# STATE_BACKEND=sqlite shares keys, registered models and sessions between uvicorn workers
+shared_state = open_shared_state(
+    os.getenv("STATE_BACKEND", "local"),
+    Path(os.getenv("STATE_DB_PATH", "workspace/state.db"))
+)
+key_manager = APIKeyManager(state=shared_state)
+model_router = ModelRouter(
+    cache=AnalysisCache(),
+    scheduler=RateLimitScheduler({
+        "openai": {
+            "rpm": int(os.getenv("OPENAI_RPM_LIMIT", "500")),
+            "tpm": int(os.getenv("OPENAI_TPM_LIMIT", "80000"))
+        },
+        "anthropic": {
+            "rpm": int(os.getenv("ANTHROPIC_RPM_LIMIT", "50")),
+            "tpm": int(os.getenv("ANTHROPIC_TPM_LIMIT", "40000"))
+        }
+    }),
+    # Duplicate slow interactive chat calls; HEDGE_BUDGET=0 disables hedging
+    hedging=HedgePolicy(budget=float(os.getenv("HEDGE_BUDGET", "0.05")))
+)
+agent = Agent(
+    model_router,
+    key_manager,
+    # In-flight self-analysis requests per provider
+    concurrency_limits={
+        "openai": int(os.getenv("OPENAI_CONCURRENCY_LIMIT", str(Agent.DEFAULT_CONCURRENCY_LIMIT))),
+        "anthropic": int(os.getenv("ANTHROPIC_CONCURRENCY_LIMIT", str(Agent.DEFAULT_CONCURRENCY_LIMIT)))
+    },
+    state=shared_state
+)
+learning_system = AgentLearning(
+    model_router,
+    max_learnings=int(os.getenv("LEARNING_MAX_ENTRIES", str(AgentLearning.DEFAULT_MAX_LEARNINGS)))
+)
 improvement_system = CodeImprovement(model_router)
+# Coalesces concurrent calls to the heavyweight agent endpoints
+endpoint_flights = SingleFlight()
+learning_ingestor = LearningIngestor(
+    learning_system,
+    batch_size=int(os.getenv("LEARNING_BATCH_SIZE", "10")),
+    flush_interval=float(os.getenv("LEARNING_FLUSH_INTERVAL", "2.0")),
+    max_queue_size=int(os.getenv("LEARNING_QUEUE_SIZE", "1000"))
+)
+loop_monitor = EventLoopLagMonitor(
+    threshold=float(os.getenv("LOOP_LAG_THRESHOLD_MS", "100")) / 1000
+)
+
+@app.on_event("startup")
+async def start_loop_monitor():
+    loop_monitor.start()
+
+@app.on_event("shutdown")
+async def stop_loop_monitor():
+    await loop_monitor.stop()
+
+@app.on_event("startup")
+async def start_learning_ingestor():
+    learning_ingestor.start()
+
+@app.on_event("shutdown")
+async def stop_learning_ingestor():
+    await learning_ingestor.stop()
+
+@app.on_event("startup")
+async def start_memory_journal():
+    if agent.journal is not None:
+        agent.journal.start()
+    agent.memory.start()
+
+@app.on_event("shutdown")
+async def persist_sessions():
+    if agent.journal is not None:
+        await agent.journal.stop()
+    await agent.memory.stop()
+    await agent.save_memory()
+
+@app.on_event("startup")
+async def start_shared_state():
+    if shared_state is not None:
+        # Build the models registered by any worker, then follow their changes
+        for service in shared_state.items(MODEL_REGISTRY_NAMESPACE):
+            await sync_service_models(service)
+        shared_state.subscribe(MODEL_REGISTRY_NAMESPACE, sync_service_models)
+        shared_state.start()
+
+@app.on_event("shutdown")
+async def stop_shared_state():
+    if shared_state is not None:
+        await shared_state.stop()
+
+@app.on_event("shutdown")
+async def close_model_clients():
+    await model_router.aclose()
 
 class APIKeyRequest(BaseModel):
     service: str
@@ -36,7 +148,26 @@ class APIKeyRequest(BaseModel):
 
 class ChatRequest(BaseModel):
     message: str
-    model: str = "gpt-4"
+    model: str = ROLE_CHAT
+    session_id: str = "default"
+
+class ChatBatchItem(BaseModel):
+    message: str
+    model: str = ROLE_CHAT
+    # Items without a session are answered independently, without session memory
+    session_id: Optional[str] = None
+
+class ChatBatchRequest(BaseModel):
+    items: List[ChatBatchItem]
+    max_concurrency: Optional[int] = None
+
+class RollbackRequest(BaseModel):
+    file_path: str
+    version: int
+
+class CodeAnalysisRequest(BaseModel):
+    code: str
+    model: str = ROLE_CODE_ANALYSIS
 
 class CodeModificationRequest(BaseModel):
     file_path: str
@@ -54,6 +185,149 @@ class ImprovementRequest(BaseModel):
     improvement_type: str
     context: Optional[Dict[str, Any]] = None
 
+# Shared state namespace listing the services whose models every worker registers
+MODEL_REGISTRY_NAMESPACE = "model_registry"
+
+# Models registered with the router for each service's API key
+SERVICE_MODELS = {
+    "openai": ["gpt-4", "gpt-3.5-turbo"],
+    "anthropic": ["claude"]
+}
+
+async def unregister_service_models(service: str) -> None:
+    """Remove a service's models from the router, closing their clients."""
+    for name in SERVICE_MODELS.get(service, []):
+        await model_router.unregister_model(name)
+
+async def sync_service_models(service: str) -> None:
+    """Rebuild a service's models from the shared registry after another worker changed it."""
+    key = key_manager.get_key(service)
+    if key is not None and shared_state.get(MODEL_REGISTRY_NAMESPACE, service) is not None:
+        await register_service_models(service, key)
+    else:
+        await unregister_service_models(service)
+
+async def register_service_models(service: str, key: str) -> None:
+    """Create and register the models backed by a service's API key.
+
+    Models already registered for the service are swapped out; their old
+    clients are closed once the requests still using them finish.
+    """
+    if service == "openai":
+        model_router.register_model(
+            "gpt-4",
+            OpenAIModel(key, default_model="gpt-4"),
+            roles=[ROLE_CHAT, ROLE_CODE_ANALYSIS, ROLE_CODE_IMPROVEMENT, ROLE_LEARNING]
+        )
+        model_router.register_model(
+            "gpt-3.5-turbo",
+            OpenAIModel(key, default_model="gpt-3.5-turbo"),
+            roles=[ROLE_CHAT]
+        )
+    elif service == "anthropic":
+        model_router.register_model(
+            "claude",
+            AnthropicModel(key),
+            roles=[ROLE_CODE_ANALYSIS, ROLE_CHAT, ROLE_CODE_IMPROVEMENT, ROLE_LEARNING]
+        )
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Record request counts, latency, in-flight requests and errors per route."""
+    route = request.scope.get("route")
+    path = getattr(route, "path", None)
+    if path is None:
+        # Routing happens after middleware; resolve the route template up front
+        for candidate in app.router.routes:
+            match, _ = candidate.matches(request.scope)
+            if match.name == "FULL":
+                path = candidate.path
+                break
+    path = path or "unmatched"
+
+    in_flight = metrics.HTTP_IN_FLIGHT.labels(route=path)
+    in_flight.inc()
+    started = time.perf_counter()
+    status = 500
+    try:
+        with tracer.trace(f"{request.method} {path}"):
+            response = await call_next(request)
+        status = response.status_code
+        if status >= 500:
+            metrics.HTTP_ERRORS.labels(route=path, error_type=f"http_{status}").inc()
+        return response
+    except Exception as e:
+        metrics.HTTP_ERRORS.labels(route=path, error_type=metrics.error_type(e)).inc()
+        raise
+    finally:
+        in_flight.dec()
+        metrics.HTTP_REQUESTS.labels(route=path, method=request.method, status=status).inc()
+        metrics.HTTP_REQUEST_DURATION.labels(route=path, method=request.method).observe(
+            time.perf_counter() - started
+        )
+
+def collect_component_metrics() -> None:
+    """Refresh gauges and counters from component statistics before a scrape."""
+    if model_router.cache is not None:
+        cache_stats = model_router.cache.stats()
+        metrics.ANALYSIS_CACHE_LOOKUPS.labels(result="memory_hit").set(cache_stats["memory_hits"])
+        metrics.ANALYSIS_CACHE_LOOKUPS.labels(result="disk_hit").set(cache_stats["disk_hits"])
+        metrics.ANALYSIS_CACHE_LOOKUPS.labels(result="miss").set(cache_stats["misses"])
+        metrics.ANALYSIS_CACHE_ENTRIES.set(cache_stats["size"])
+
+    metrics.DEDUPLICATED_REQUESTS.labels(layer="router").set(model_router.single_flight.deduplicated)
+    metrics.DEDUPLICATED_REQUESTS.labels(layer="endpoint").set(endpoint_flights.deduplicated)
+    metrics.MODEL_FAILOVERS.set(model_router.failovers)
+
+    if model_router.scheduler is not None:
+        for provider, provider_stats in model_router.scheduler.stats().items():
+            for priority, depth in provider_stats["queue_depth"].items():
+                metrics.SCHEDULER_QUEUE_DEPTH.labels(provider=provider, priority=priority).set(depth)
+
+    metrics.LEARNING_STORE_ENTRIES.set(learning_system.store.count())
+    metrics.LEARNING_QUEUE_DEPTH.set(learning_ingestor.queue.qsize())
+    metrics.LEARNING_INTERACTIONS.labels(outcome="processed").set(learning_ingestor.processed)
+    metrics.LEARNING_INTERACTIONS.labels(outcome="rejected").set(learning_ingestor.rejected)
+    memory_stats = agent.memory.stats()
+    metrics.LIVE_SESSIONS.set(memory_stats["live_sessions"])
+    metrics.SESSION_EVICTIONS.set(memory_stats["evictions"])
+    if agent.journal is not None:
+        metrics.JOURNAL_FLUSHES.set(agent.journal.flushes)
+        metrics.JOURNAL_SNAPSHOTS.set(agent.journal.snapshots)
+
+metrics.REGISTRY.add_collector(collect_component_metrics)
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Expose metrics in the Prometheus text format."""
+    return PlainTextResponse(
+        metrics.REGISTRY.render(),
+        media_type="text/plain; version=0.0.4"
+    )
+
+# Debug endpoints expose internals and are only enabled on request
+DEBUG_ENDPOINTS_ENABLED = os.getenv("ENABLE_DEBUG_ENDPOINTS", "").lower() in ("1", "true", "yes")
+MAX_PROFILE_SECONDS = 60
+
+def require_debug_endpoints() -> None:
+    if not DEBUG_ENDPOINTS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+
+@app.get("/debug/traces", dependencies=[Depends(require_debug_endpoints)])
+async def slowest_traces(limit: int = 10):
+    """Get the slowest recent request traces with their stage breakdown."""
+    return {"traces": tracer.slowest(limit)}
+
+@app.get("/debug/profile", dependencies=[Depends(require_debug_endpoints)])
+async def profile(seconds: float = 5.0, interval_ms: float = Query(5.0, ge=1)):
+    """Sample all threads for a while and return collapsed stacks for flamegraphs."""
+    if not 0 < seconds <= MAX_PROFILE_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be in (0, {MAX_PROFILE_SECONDS}]")
+
+    profiler = SamplingProfiler(interval=interval_ms / 1000)
+    samples = await asyncio.to_thread(profiler.run, seconds)
+    return PlainTextResponse(SamplingProfiler.collapse(samples))
+
 @app.post("/api/keys")
 async def store_api_key(request: APIKeyRequest):
     """Store an API key for a service."""
@@ -61,11 +335,14 @@ async def store_api_key(request: APIKeyRequest):
         key_manager.store_key(request.service, request.key)
         
         # If it's OpenAI or Anthropic, initialize the model
-        if request.service == "openai":
-            model_router.register_model("gpt-4", OpenAIModel(request.key))
-            model_router.register_model("gpt-3.5-turbo", OpenAIModel(request.key))
-        elif request.service == "anthropic":
-            model_router.register_model("claude", AnthropicModel(request.key))
+        await register_service_models(request.service, request.key)
+        if shared_state is not None and request.service in SERVICE_MODELS:
+            # Other workers rebuild their clients when they see the change
+            shared_state.set(
+                MODEL_REGISTRY_NAMESPACE,
+                request.service,
+                {"models": SERVICE_MODELS[request.service], "updated": time.time()}
+            )
             
         return {"status": "success", "message": f"API key for {request.service} stored"}
     except Exception as e:
@@ -80,18 +357,99 @@ async def list_services():
 async def remove_api_key(service: str):
     """Remove an API key for a service."""
     if key_manager.remove_key(service):
+        await unregister_service_models(service)
+        if shared_state is not None:
+            shared_state.delete(MODEL_REGISTRY_NAMESPACE, service)
         return {"status": "success", "message": f"API key for {service} removed"}
     raise HTTPException(status_code=404, detail=f"No API key found for {service}")
 
+@app.get("/api/router/stats")
+async def router_stats():
+    """Get model routing, analysis cache and request coalescing statistics."""
+    return {**model_router.stats(), "endpoint_single_flight": endpoint_flights.stats()}
+
+@app.get("/api/monitoring/loop")
+async def loop_stats():
+    """Get event loop lag statistics."""
+    return loop_monitor.stats()
+
 @app.post("/api/chat")
 async def chat(request: ChatRequest):
     """Process a chat message."""
     try:
-        response = await agent.process_request(request.message, request.model)
+        response = await agent.process_request(
+            request.message,
+            request.model,
+            request.session_id
+        )
         return {"reply": response}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """Stream a chat reply as Server-Sent Events."""
+    async def event_stream():
+        try:
+            # Close the agent stream right away on disconnect so it records the partial reply
+            async with aclosing(agent.stream_request(
+                request.message,
+                request.model,
+                request.session_id
+            )) as tokens:
+                async for token in tokens:
+                    yield f"data: {json.dumps({'token': token})}\n\n"
+            yield "event: done\ndata: {}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Upper bounds for /api/chat/batch
+BATCH_MAX_ITEMS = int(os.getenv("CHAT_BATCH_MAX_ITEMS", "5000"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("CHAT_BATCH_MAX_CONCURRENCY", "32"))
+
+@app.post("/api/chat/batch")
+async def chat_batch(request: ChatBatchRequest):
+    """Process many chat messages concurrently, streaming NDJSON results as they complete.
+
+    Each line is {"index": i, "reply": ...} or {"index": i, "error": ...},
+    where i is the item's position in the request.
+    """
+    if not request.items:
+        raise HTTPException(status_code=400, detail="Batch must contain at least one item")
+    if len(request.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch exceeds the limit of {BATCH_MAX_ITEMS} items"
+        )
+    if request.max_concurrency is None:
+        concurrency = BATCH_MAX_CONCURRENCY
+    else:
+        concurrency = min(request.max_concurrency, BATCH_MAX_CONCURRENCY)
+    if concurrency < 1:
+        raise HTTPException(status_code=400, detail="max_concurrency must be at least 1")
+
+    async def results():
+        async for result in agent.process_batch(
+            [
+                {"message": item.message, "model": item.model, "session_id": item.session_id}
+                for item in request.items
+            ],
+            max_concurrency=concurrency
+        ):
+            yield json.dumps(result) + "\n"
+
+    return StreamingResponse(
+        results(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/api/code/modify")
 async def modify_code(request: CodeModificationRequest):
     """Modify code with safety checks."""
@@ -104,11 +462,53 @@ async def modify_code(request: CodeModificationRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/code/analyze/stream")
+async def analyze_code_stream(request: CodeAnalysisRequest):
+    """Stream code analysis findings as NDJSON while the model is still writing.
+
+    Each line is a structured output event: {"type": "item", "key", "value"}
+    for a single finding, {"type": "field", "key", "value"} once a whole
+    report key is complete, then {"type": "done"} or {"type": "error"}.
+    """
+    async def findings():
+        try:
+            async for event in model_router.stream_analysis(
+                request.model,
+                request.code,
+                priority=PRIORITY_INTERACTIVE
+            ):
+                yield json.dumps(event) + "\n"
+            yield json.dumps({"type": "done"}) + "\n"
+        except Exception as e:
+            yield json.dumps({"type": "error", "detail": str(e)}) + "\n"
+
+    return StreamingResponse(
+        findings(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/api/code/versions")
+async def list_versions(file_path: str):
+    """List the recorded versions of a modified file, oldest first."""
+    return {"file_path": file_path, "versions": await asyncio.to_thread(version_store.history, file_path)}
+
+@app.post("/api/code/rollback")
+async def rollback_code(request: RollbackRequest):
+    """Restore a modified file to an earlier recorded version."""
+    try:
+        version = await asyncio.to_thread(version_store.rollback, request.file_path, request.version)
+        return {"status": "success", "version": version["version"]}
+    except VersionNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/api/agent/analysis")
 async def analyze_agent():
     """Analyze agent's code for potential improvements."""
     try:
-        analysis = await agent.analyze_self()
+        analysis = await endpoint_flights.do("agent_analysis", agent.analyze_self)
         return analysis
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -145,25 +545,46 @@ async def improve_agent(request: ImprovementRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/agent/learn")
-async def record_learning(request: LearningInteractionRequest):
-    """Record and analyze a learning interaction."""
+async def record_learning(request: LearningInteractionRequest, queued: bool = False):
+    """Record and analyze a learning interaction.
+
+    With ``queued=true`` the interaction is queued for batched background
+    analysis and the call returns 202 immediately.
+    """
+    interaction = {
+        "user_input": request.user_input,
+        "agent_response": request.agent_response,
+        "success": request.success,
+        "duration": request.duration,
+        "metadata": request.metadata or {}
+    }
+
+    if queued:
+        try:
+            queue_depth = learning_ingestor.submit(interaction)
+        except LearningQueueFullError as e:
+            raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+        return JSONResponse(status_code=202, content={"status": "queued", "queue_depth": queue_depth})
+
     try:
-        analysis = await learning_system.learn_from_interaction({
-            "user_input": request.user_input,
-            "agent_response": request.agent_response,
-            "success": request.success,
-            "duration": request.duration,
-            "metadata": request.metadata or {}
-        })
+        analysis = await learning_system.learn_from_interaction(interaction)
         return analysis
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/agent/learn/stats")
+async def learning_ingestion_stats():
+    """Get learning ingestion queue statistics."""
+    return learning_ingestor.stats()
+
 @app.get("/api/agent/improvement-plan")
-async def get_improvement_plan():
-    """Get a comprehensive improvement plan based on learning history."""
+async def get_improvement_plan(focus: Optional[str] = None):
+    """Get an improvement plan based on the learnings most relevant to an optional focus."""
     try:
-        plan = await learning_system.generate_improvement_plan()
+        plan = await endpoint_flights.do(
+            f"improvement_plan:{focus or ''}",
+            lambda: learning_system.generate_improvement_plan(focus)
+        )
         return plan
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
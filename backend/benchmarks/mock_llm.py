@@ -0,0 +1,262 @@
+"""Local stand-in for the OpenAI and Anthropic APIs used by the benchmarks.
+
+Implements the endpoints the backend calls (OpenAI chat completions and
+Anthropic text completions, each with and without streaming) with
+configurable latency, jitter, token rate and error injection, so load can
+be generated without paying for real API calls.
+
+Run it directly with:
+
+    python -m backend.benchmarks.mock_llm --port 8900 --latency-ms 300
+
+and point the backend at it with OPENAI_BASE_URL=http://127.0.0.1:8900/v1
+and ANTHROPIC_BASE_URL=http://127.0.0.1:8900.
+"""
+from typing import Dict, Any, List, Optional, AsyncGenerator
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import time
+import uuid
+
+class MockConfig:
+    """Latency, throughput and failure behaviour of the mock provider."""
+
+    def __init__(
+        self,
+        latency_ms: float = 200.0,
+        jitter_ms: float = 50.0,
+        tokens_per_second: float = 100.0,
+        completion_tokens: int = 60,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        # Streaming speed; 0 sends all tokens at once
+        self.tokens_per_second = tokens_per_second
+        self.completion_tokens = completion_tokens
+        # Share of requests answered with a 500 and with a 429 respectively
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+
+    @classmethod
+    def from_env(cls) -> "MockConfig":
+        """Build a config from MOCK_LLM_* environment variables."""
+        return cls(
+            latency_ms=float(os.getenv("MOCK_LLM_LATENCY_MS", "200")),
+            jitter_ms=float(os.getenv("MOCK_LLM_JITTER_MS", "50")),
+            tokens_per_second=float(os.getenv("MOCK_LLM_TOKENS_PER_SECOND", "100")),
+            completion_tokens=int(os.getenv("MOCK_LLM_COMPLETION_TOKENS", "60")),
+            error_rate=float(os.getenv("MOCK_LLM_ERROR_RATE", "0")),
+            rate_limit_rate=float(os.getenv("MOCK_LLM_RATE_LIMIT_RATE", "0"))
+        )
+
+    def to_env(self) -> Dict[str, str]:
+        """Environment variables reproducing this config in another process."""
+        return {
+            "MOCK_LLM_LATENCY_MS": str(self.latency_ms),
+            "MOCK_LLM_JITTER_MS": str(self.jitter_ms),
+            "MOCK_LLM_TOKENS_PER_SECOND": str(self.tokens_per_second),
+            "MOCK_LLM_COMPLETION_TOKENS": str(self.completion_tokens),
+            "MOCK_LLM_ERROR_RATE": str(self.error_rate),
+            "MOCK_LLM_RATE_LIMIT_RATE": str(self.rate_limit_rate)
+        }
+
+WORDS = (
+    "the agent reviewed the request and suggests keeping functions small "
+    "caching repeated work and validating inputs before use"
+).split()
+
+ANALYSIS_REPORT = {
+    "potential_issues": ["Broad exception handlers hide the original error"],
+    "security_concerns": ["User supplied paths are not validated"],
+    "performance_notes": ["Repeated work inside a loop could be cached"],
+    "improvement_suggestions": ["Extract the parsing logic into a helper"]
+}
+
+LEARNING_ANALYSIS = {
+    "worked_well": ["The answer addressed the question"],
+    "improvements": ["Ask a clarifying question for ambiguous requests"],
+    "patterns": ["Users ask follow-up questions about code"],
+    "learning_points": ["Provide examples earlier"]
+}
+
+def completion_text(prompt: str, config: MockConfig) -> str:
+    """Pick a plausible completion for the prompt: JSON where JSON is asked for."""
+    if "JSON array" in prompt:
+        count = max(1, len(re.findall(r"Interaction \d+:", prompt)))
+        return json.dumps([LEARNING_ANALYSIS] * count)
+    if "potential_issues" in prompt:
+        return json.dumps(ANALYSIS_REPORT)
+    if "JSON" in prompt:
+        return json.dumps({"suggestions": [], "priority": [], "implementation": {}, "risks": []})
+    return " ".join(WORDS[i % len(WORDS)] for i in range(config.completion_tokens))
+
+def split_tokens(text: str) -> List[str]:
+    """Split text into token-sized pieces that concatenate back to the text."""
+    return re.findall(r"\S+\s*|\s+", text) or [text]
+
+def create_app(config: MockConfig) -> FastAPI:
+    """Create the mock provider app."""
+    app = FastAPI()
+    app.state.config = config
+    app.state.requests = 0
+
+    async def simulate_latency() -> None:
+        delay = config.latency_ms + random.uniform(-config.jitter_ms, config.jitter_ms)
+        await asyncio.sleep(max(0.0, delay) / 1000)
+
+    def injected_error(kind: str) -> Optional[JSONResponse]:
+        roll = random.random()
+        if roll < config.rate_limit_rate:
+            return JSONResponse(
+                {"error": {"type": "rate_limit_error", "message": "Mock rate limit"}},
+                status_code=429,
+                headers={"retry-after": "1"}
+            )
+        if roll < config.rate_limit_rate + config.error_rate:
+            return JSONResponse(
+                {"error": {"type": "api_error", "message": f"Mock {kind} failure"}},
+                status_code=500
+            )
+        return None
+
+    async def paced(tokens: List[str]) -> AsyncGenerator[str, None]:
+        for token in tokens:
+            if config.tokens_per_second > 0:
+                await asyncio.sleep(1 / config.tokens_per_second)
+            yield token
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        app.state.requests += 1
+        body = await request.json()
+        await simulate_latency()
+        error = injected_error("chat")
+        if error is not None:
+            return error
+
+        prompt = "\n".join(str(message.get("content", "")) for message in body.get("messages", []))
+        text = completion_text(prompt, config)
+        model = body.get("model", "gpt-4")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+
+        if not body.get("stream"):
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": text},
+                    "finish_reason": "stop"
+                }],
+                "usage": {
+                    "prompt_tokens": len(prompt) // 4,
+                    "completion_tokens": len(split_tokens(text)),
+                    "total_tokens": len(prompt) // 4 + len(split_tokens(text))
+                }
+            }
+
+        async def events():
+            async for token in paced(split_tokens(text)):
+                chunk = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+            final = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]
+            }
+            yield f"data: {json.dumps(final)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.post("/v1/complete")
+    async def complete(request: Request):
+        app.state.requests += 1
+        body = await request.json()
+        await simulate_latency()
+        error = injected_error("completion")
+        if error is not None:
+            return error
+
+        text = completion_text(body.get("prompt", ""), config)
+        model = body.get("model", "claude-2")
+        completion_id = f"compl_{uuid.uuid4().hex}"
+
+        if not body.get("stream"):
+            return {
+                "id": completion_id,
+                "type": "completion",
+                "completion": text,
+                "stop_reason": "stop_sequence",
+                "model": model
+            }
+
+        async def events():
+            async for token in paced(split_tokens(text)):
+                event = {
+                    "id": completion_id,
+                    "type": "completion",
+                    "completion": token,
+                    "stop_reason": None,
+                    "model": model
+                }
+                yield f"event: completion\ndata: {json.dumps(event)}\n\n"
+            event = {"id": completion_id, "type": "completion", "completion": "", "stop_reason": "stop_sequence", "model": model}
+            yield f"event: completion\ndata: {json.dumps(event)}\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.get("/stats")
+    async def stats():
+        return {"requests": app.state.requests}
+
+    return app
+
+# App used when served by uvicorn as backend.benchmarks.mock_llm:app
+app = create_app(MockConfig.from_env())
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run the mock LLM provider")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--jitter-ms", type=float, default=50.0)
+    parser.add_argument("--tokens-per-second", type=float, default=100.0)
+    parser.add_argument("--completion-tokens", type=int, default=60)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    config = MockConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,358 @@
+"""Scenario benchmarks for the API, run against the local mock LLM provider.
+
+Starts the mock provider and the backend (unless --target points at an
+already running backend), registers fake API keys, and drives each scenario
+at the requested concurrency. Per scenario it reports p50/p95/p99 latency,
+requests per second, error counts and the backend's event-loop lag sampled
+from /api/monitoring/loop. Results are printed and saved as JSON for
+comparison between runs.
+
+    python -m backend.benchmarks.run --scenarios chat,chat_stream --concurrency 32 --requests 500
+"""
+from typing import Dict, Any, List, Optional, Callable, Awaitable
+from pathlib import Path
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import httpx
+from .mock_llm import MockConfig
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of a list of values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    """Latency summary in milliseconds."""
+    return {
+        "p50": percentile(values, 0.50) * 1000,
+        "p95": percentile(values, 0.95) * 1000,
+        "p99": percentile(values, 0.99) * 1000,
+        "mean": (sum(values) / len(values) * 1000) if values else 0.0,
+        "max": max(values) * 1000 if values else 0.0
+    }
+
+class RequestResult:
+    """Outcome of a single benchmark request."""
+
+    def __init__(self, latency: float, status: int, first_byte: Optional[float] = None, error: Optional[str] = None):
+        self.latency = latency
+        self.status = status
+        self.first_byte = first_byte
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and self.status < 400
+
+def find_error(body: Any) -> Optional[str]:
+    """Find an error reported inside a 200 response body.
+
+    The agent endpoints report failures as ``error`` keys (for analysis, one
+    per file) and chat replies carry the error text instead of an answer.
+    """
+    if isinstance(body, dict):
+        if "error" in body:
+            return str(body["error"])[:200]
+        if str(body.get("reply", "")).startswith("Error processing request"):
+            return body["reply"][:200]
+        for value in body.values():
+            if isinstance(value, dict) and "error" in value:
+                return str(value["error"])[:200]
+    return None
+
+async def _timed(send: Callable[[], Awaitable[httpx.Response]]) -> RequestResult:
+    started = time.perf_counter()
+    try:
+        response = await send()
+    except httpx.HTTPError as e:
+        return RequestResult(time.perf_counter() - started, 0, error=type(e).__name__)
+    try:
+        error = find_error(response.json())
+    except ValueError:
+        error = None
+    return RequestResult(time.perf_counter() - started, response.status_code, error=error)
+
+async def chat(client: httpx.AsyncClient, index: int, concurrency: int) -> RequestResult:
+    return await _timed(lambda: client.post("/api/chat", json={
+        "message": f"Benchmark message {index}",
+        "session_id": f"bench-{index % concurrency}"
+    }))
+
+async def chat_stream(client: httpx.AsyncClient, index: int, concurrency: int) -> RequestResult:
+    started = time.perf_counter()
+    first_byte = None
+    error = None
+    try:
+        async with client.stream("POST", "/api/chat/stream", json={
+            "message": f"Benchmark message {index}",
+            "session_id": f"bench-stream-{index % concurrency}"
+        }) as response:
+            async for line in response.aiter_lines():
+                if line.startswith("data:") and first_byte is None:
+                    first_byte = time.perf_counter() - started
+                if line.startswith("event: error"):
+                    error = "stream error"
+            status = response.status_code
+    except httpx.HTTPError as e:
+        return RequestResult(time.perf_counter() - started, 0, error=type(e).__name__)
+    return RequestResult(time.perf_counter() - started, status, first_byte, error)
+
+async def analysis(client: httpx.AsyncClient, index: int, concurrency: int) -> RequestResult:
+    return await _timed(lambda: client.get("/api/agent/analysis"))
+
+async def learn(client: httpx.AsyncClient, index: int, concurrency: int) -> RequestResult:
+    return await _timed(lambda: client.post("/api/agent/learn", params={"queued": "true"}, json={
+        "user_input": f"How do I fix bug {index}?",
+        "agent_response": "Check the traceback and add a test.",
+        "success": True,
+        "duration": 1.5
+    }))
+
+async def improvement_plan(client: httpx.AsyncClient, index: int, concurrency: int) -> RequestResult:
+    return await _timed(lambda: client.get("/api/agent/improvement-plan"))
+
+SCENARIOS = {
+    "chat": chat,
+    "chat_stream": chat_stream,
+    "analysis": analysis,
+    "learn": learn,
+    "improvement_plan": improvement_plan
+}
+
+async def sample_loop_lag(client: httpx.AsyncClient, samples: List[float], stop: asyncio.Event, interval: float) -> None:
+    """Poll the backend's loop monitor until stopped."""
+    while not stop.is_set():
+        try:
+            response = await client.get("/api/monitoring/loop")
+            samples.append(response.json()["last_lag_ms"])
+        except (httpx.HTTPError, ValueError, KeyError):
+            pass
+        try:
+            await asyncio.wait_for(stop.wait(), interval)
+        except asyncio.TimeoutError:
+            pass
+
+async def run_scenario(
+    base_url: str,
+    name: str,
+    requests: int,
+    concurrency: int,
+    timeout: float
+) -> Dict[str, Any]:
+    """Run one scenario and summarize its results."""
+    scenario = SCENARIOS[name]
+    limits = httpx.Limits(max_connections=concurrency + 2, max_keepalive_connections=concurrency + 2)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        loop_before = (await client.get("/api/monitoring/loop")).json()
+
+        results: List[RequestResult] = []
+        next_index = iter(range(requests))
+
+        async def worker() -> None:
+            for index in next_index:
+                results.append(await scenario(client, index, concurrency))
+
+        lag_samples: List[float] = []
+        stop = asyncio.Event()
+        sampler = asyncio.create_task(sample_loop_lag(client, lag_samples, stop, 0.1))
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await sampler
+
+        loop_after = (await client.get("/api/monitoring/loop")).json()
+
+    successes = [result for result in results if result.ok]
+    statuses: Dict[str, int] = {}
+    errors: Dict[str, int] = {}
+    for result in results:
+        statuses[str(result.status)] = statuses.get(str(result.status), 0) + 1
+        if not result.ok:
+            errors[result.error or f"HTTP {result.status}"] = errors.get(result.error or f"HTTP {result.status}", 0) + 1
+
+    summary = {
+        "scenario": name,
+        "requests": len(results),
+        "concurrency": concurrency,
+        "successes": len(successes),
+        "errors": errors,
+        "status_codes": statuses,
+        "duration_s": elapsed,
+        "requests_per_second": len(results) / elapsed if elapsed else 0.0,
+        "latency_ms": summarize([result.latency for result in successes]),
+        "loop_lag_ms": {
+            "p50": percentile(lag_samples, 0.50),
+            "p95": percentile(lag_samples, 0.95),
+            "max": max(lag_samples) if lag_samples else 0.0,
+            "blocked_count": loop_after["blocked_count"] - loop_before["blocked_count"]
+        }
+    }
+    first_bytes = [result.first_byte for result in successes if result.first_byte is not None]
+    if first_bytes:
+        summary["time_to_first_token_ms"] = summarize(first_bytes)
+    return summary
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _wait_until_ready(url: str, process: subprocess.Popen, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server for {url} exited with code {process.returncode}")
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server at {url} did not start within {timeout}s")
+
+def _start_server(app: str, port: int, env: Dict[str, str], cwd: str) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app, "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        env={**os.environ, "PYTHONPATH": str(REPO_ROOT), **env},
+        cwd=cwd
+    )
+
+class BenchmarkEnvironment:
+    """Mock provider and backend processes started for a benchmark run."""
+
+    def __init__(self, mock_config: MockConfig, services: List[str], backend_env: Dict[str, str]):
+        self.mock_config = mock_config
+        self.services = services
+        self.backend_env = backend_env
+        self.processes: List[subprocess.Popen] = []
+        # The backend writes its workspace, caches and learning store into its working directory
+        self.workdir = tempfile.TemporaryDirectory(prefix="aiden-bench-")
+        self.base_url = ""
+
+    def __enter__(self) -> "BenchmarkEnvironment":
+        mock_port = _free_port()
+        mock = _start_server("backend.benchmarks.mock_llm:app", mock_port, self.mock_config.to_env(), self.workdir.name)
+        self.processes.append(mock)
+        _wait_until_ready(f"http://127.0.0.1:{mock_port}/stats", mock)
+
+        backend_port = _free_port()
+        backend = _start_server("backend.api.endpoints:app", backend_port, {
+            "OPENAI_BASE_URL": f"http://127.0.0.1:{mock_port}/v1",
+            "ANTHROPIC_BASE_URL": f"http://127.0.0.1:{mock_port}",
+            **self.backend_env
+        }, self.workdir.name)
+        self.processes.append(backend)
+        self.base_url = f"http://127.0.0.1:{backend_port}"
+        _wait_until_ready(f"{self.base_url}/api/monitoring/loop", backend)
+
+        for service in self.services:
+            response = httpx.post(f"{self.base_url}/api/keys", json={"service": service, "key": "bench-key"})
+            response.raise_for_status()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        for process in reversed(self.processes):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        self.workdir.cleanup()
+
+async def run_benchmarks(base_url: str, scenarios: List[str], requests: int, concurrency: int, timeout: float) -> List[Dict[str, Any]]:
+    results = []
+    for name in scenarios:
+        summary = await run_scenario(base_url, name, requests, concurrency, timeout)
+        latency = summary["latency_ms"]
+        print(
+            f"{name:>16}: {summary['requests_per_second']:8.1f} req/s  "
+            f"p50 {latency['p50']:7.1f} ms  p95 {latency['p95']:7.1f} ms  p99 {latency['p99']:7.1f} ms  "
+            f"errors {summary['requests'] - summary['successes']}  "
+            f"loop lag max {summary['loop_lag_ms']['max']:.1f} ms"
+        )
+        results.append(summary)
+    return results
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the API against a mock LLM provider")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated scenario names")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout in seconds")
+    parser.add_argument(
+        "--services",
+        default="openai",
+        help="Services to register fake keys for (openai, anthropic)"
+    )
+    parser.add_argument("--target", help="Benchmark an already running backend instead of starting one")
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--jitter-ms", type=float, default=50.0)
+    parser.add_argument("--tokens-per-second", type=float, default=100.0)
+    parser.add_argument("--completion-tokens", type=int, default=60)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--output", help="Result file (defaults to benchmarks/results/<timestamp>.json)")
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(unknown)} (choose from {', '.join(SCENARIOS)})")
+
+    mock_config = MockConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate
+    )
+
+    if args.target:
+        results = asyncio.run(run_benchmarks(args.target, scenarios, args.requests, args.concurrency, args.timeout))
+    else:
+        # Provider rate limits are lifted so the benchmark measures the backend itself
+        backend_env = {
+            "OPENAI_RPM_LIMIT": "1000000",
+            "OPENAI_TPM_LIMIT": "1000000000",
+            "ANTHROPIC_RPM_LIMIT": "1000000",
+            "ANTHROPIC_TPM_LIMIT": "1000000000"
+        }
+        services = [service.strip() for service in args.services.split(",") if service.strip()]
+        with BenchmarkEnvironment(mock_config, services, backend_env) as environment:
+            results = asyncio.run(
+                run_benchmarks(environment.base_url, scenarios, args.requests, args.concurrency, args.timeout)
+            )
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "target": args.target,
+        "mock_provider": None if args.target else vars(mock_config),
+        "requests_per_scenario": args.requests,
+        "concurrency": args.concurrency,
+        "scenarios": results
+    }
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {output}")
+
+if __name__ == "__main__":
+    main()
@@ -1,129 +1,422 @@
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, AsyncGenerator
 from pathlib import Path
+from collections import OrderedDict
 import json
 import asyncio
-from ..models.model_router import ModelRouter
+import time
+from ..models.model_router import (
+    ModelRouter,
+    ROLE_CHAT,
+    ROLE_CODE_ANALYSIS,
+    ROLE_CODE_IMPROVEMENT
+)
+from ..models.scheduler import PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+from ..models.tokens import estimate_message_tokens
 from ..config.key_manager import APIKeyManager
 from .modifier import CodeModifier
+from .session import SessionStore, DEFAULT_SESSION
+from .journal import MemoryJournal
+from .retrieval import BM25Index, select_snippets
+from ..storage.shared_state import SharedState
+from ..monitoring.tracing import span
 
 class Agent:
     """Main agent class that orchestrates all operations."""
     
-    def __init__(self, model_router: ModelRouter, key_manager: APIKeyManager):
+    DEFAULT_CONCURRENCY_LIMIT = 4
+    SYSTEM_PROMPT = (
+        "You are Aiden, a self-improving AI agent. "
+        "You can analyze and modify code, including your own implementation."
+    )
+    # Share of the context budget for the latest turns; the rest goes to recalled older turns
+    RECENT_CONTEXT_SHARE = 0.6
+    RECALL_TOP_K = 8
+
+    def __init__(
+        self,
+        model_router: ModelRouter,
+        key_manager: APIKeyManager,
+        concurrency_limits: Optional[Dict[str, int]] = None,
+        concurrent: bool = True,
+        max_sessions: int = 1000,
+        context_token_budget: int = 3000,
+        memory_index_size: int = 20000,
+        state: Optional[SharedState] = None
+    ):
         self.model_router = model_router
         self.key_manager = key_manager
         self.code_modifier = CodeModifier(model_router)
         self.workspace_path = Path("workspace")
         self.workspace_path.mkdir(exist_ok=True)
-        self.memory: List[Dict[str, Any]] = []
+        # Shared state persists every entry itself, so the journal is only used without it
+        self.journal = MemoryJournal(self.workspace_path / "journal") if state is None else None
+        self.memory = SessionStore(
+            self.workspace_path / "sessions",
+            max_sessions=max_sessions,
+            journal=self.journal,
+            state=state
+        )
+        self.context_token_budget = context_token_budget
+        # Relevance index over conversation turns, filled as entries are remembered
+        self.memory_index = BM25Index(max_documents=memory_index_size)
+        # Index document ids per session, least recently used first, bounded like the session store
+        self._indexed_sessions: "OrderedDict[str, List[int]]" = OrderedDict()
+        self._memory_doc_ids = 0
+        # Maximum number of in-flight self-analysis requests per provider, e.g. {"openai": 4}
+        self.concurrency_limits: Dict[str, int] = concurrency_limits or {}
+        self.concurrent = concurrent
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def set_concurrency_limit(self, provider: str, limit: int) -> None:
+        """Set the maximum number of concurrent requests for a provider."""
+        if limit < 1:
+            raise ValueError("Concurrency limit must be at least 1")
+        self.concurrency_limits[provider] = limit
+        self._semaphores.pop(provider, None)
+
+    def _get_semaphore(self, provider: str) -> asyncio.Semaphore:
+        """Get the semaphore bounding in-flight requests for a provider."""
+        if provider not in self._semaphores:
+            limit = self.concurrency_limits.get(provider, self.DEFAULT_CONCURRENCY_LIMIT)
+            self._semaphores[provider] = asyncio.Semaphore(limit)
+        return self._semaphores[provider]
+
+    def _resolve_provider(self, model_name: str) -> str:
+        """Resolve a model or role name to the provider of its best candidate."""
+        candidates = self.model_router.get_candidates(model_name)
+        model = self.model_router.get_model(candidates[0]) if candidates else None
+        # Unknown names fall back to their own budget; the router reports the error
+        return model.provider if model is not None else model_name
+
+    async def _bounded_request(self, model_name: str, request_type: str, **kwargs):
+        """Route a request while respecting the provider's concurrency limit."""
+        async with self._get_semaphore(self._resolve_provider(model_name)):
+            return await self.model_router.route_request(model_name, request_type, **kwargs)
 
-    async def process_request(self, message: str, model: str = "gpt-4") -> str:
+    async def process_request(
+        self,
+        message: str,
+        model: str = ROLE_CHAT,
+        session_id: str = DEFAULT_SESSION
+    ) -> str:
         """Process a user request and generate a response."""
+        try:
+            return await self._chat(message, model, session_id, PRIORITY_INTERACTIVE)
+        except Exception as e:
+            return f"Error processing request: {str(e)}"
+
+    async def process_batch(
+        self,
+        items: List[Dict[str, str]],
+        max_concurrency: int = 16
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """Process many chat messages concurrently, yielding results as they complete.
+
+        Each item has a message and optionally a model and session_id.
+        Results carry the item's input index and either a reply or an
+        error, so one failing item does not abort the rest. Items sharing a
+        session run one after another in input order to keep that
+        conversation coherent; items without a session are answered on
+        their own, without reading or writing any session memory.
+        """
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        semaphore = asyncio.Semaphore(max_concurrency)
+        session_locks: Dict[str, asyncio.Lock] = {}
+        results: asyncio.Queue = asyncio.Queue()
+
+        async def run(index: int, item: Dict[str, str]) -> None:
+            session_id = item.get("session_id")
+            model = item.get("model") or ROLE_CHAT
+            try:
+                if session_id is None:
+                    async with semaphore:
+                        reply = await self.model_router.route_request(
+                            model,
+                            "chat",
+                            messages=[
+                                {"role": "system", "content": self.SYSTEM_PROMPT},
+                                {"role": "user", "content": item["message"]}
+                            ],
+                            priority=PRIORITY_BACKGROUND
+                        )
+                else:
+                    lock = session_locks.setdefault(session_id, asyncio.Lock())
+                    async with lock, semaphore:
+                        reply = await self._chat(item["message"], model, session_id, PRIORITY_BACKGROUND)
+                await results.put({"index": index, "reply": reply})
+            except Exception as e:
+                await results.put({"index": index, "error": str(e)})
+
+        tasks = [asyncio.create_task(run(index, item)) for index, item in enumerate(items)]
+        try:
+            for _ in range(len(tasks)):
+                yield await results.get()
+        finally:
+            # Stop outstanding work if the consumer goes away early
+            for task in tasks:
+                task.cancel()
+
+    async def _chat(self, message: str, model: str, session_id: str, priority: int) -> str:
+        """Send a message with its session context, recording both sides in memory."""
         # Add message to memory
-        self.memory.append({
-            "role": "user",
-            "content": message,
-            "timestamp": asyncio.get_running_loop().time()
-        })
+        await self.memory.preload(session_id)
+        self._remember(session_id, "user", message)
 
         try:
             response = await self.model_router.route_request(
                 model,
                 "chat",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are Aiden, a self-improving AI agent. "
-                                 "You can analyze and modify code, including your own implementation."
-                    },
-                    *[{"role": m["role"], "content": m["content"]} for m in self.memory[-5:]]
-                ]
+                messages=self._build_messages(session_id),
+                priority=priority
             )
+        except Exception as e:
+            self._remember(session_id, "error", f"Error processing request: {str(e)}")
+            raise
 
-            # Add response to memory
-            self.memory.append({
-                "role": "assistant",
-                "content": response,
-                "timestamp": asyncio.get_running_loop().time()
-            })
+        # Add response to memory; the session may have been evicted during the call
+        await self.memory.preload(session_id)
+        self._remember(session_id, "assistant", response)
+        return response
 
-            return response
+    async def stream_request(
+        self,
+        message: str,
+        model: str = ROLE_CHAT,
+        session_id: str = DEFAULT_SESSION
+    ) -> AsyncGenerator[str, None]:
+        """Process a user request, yielding response tokens as they arrive."""
+        await self.memory.preload(session_id)
+        self._remember(session_id, "user", message)
 
+        chunks: List[str] = []
+        completed = False
+        error: Optional[Exception] = None
+        try:
+            async for token in self.model_router.stream_request(
+                model,
+                messages=self._build_messages(session_id),
+                priority=PRIORITY_INTERACTIVE
+            ):
+                chunks.append(token)
+                yield token
+            completed = True
         except Exception as e:
-            error_msg = f"Error processing request: {str(e)}"
-            self.memory.append({
-                "role": "error",
-                "content": error_msg,
-                "timestamp": asyncio.get_running_loop().time()
-            })
-            return error_msg
+            error = e
+            raise
+        finally:
+            # Also runs when the client disconnects mid-stream, so the partial reply is kept
+            if completed or chunks:
+                self._remember(session_id, "assistant", "".join(chunks))
+            if error is not None:
+                self._remember(session_id, "error", f"Error processing request: {str(error)}")
+
+    def _remember(self, session_id: str, role: str, content: str) -> None:
+        """Record a message in a session's memory."""
+        self._ensure_indexed(session_id)
+        entry = {
+            "role": role,
+            "content": content,
+            "timestamp": time.time()
+        }
+        self.memory.append(session_id, entry)
+        self._index_entry(session_id, entry)
+
+    def _ensure_indexed(self, session_id: str) -> None:
+        """Index a session's stored history unless the index is still current.
+
+        A session is indexed again when it was evicted from the session
+        store (or dropped there because another worker appended to it), or
+        when its oldest documents fell out of the bounded index.
+        """
+        doc_ids = self._indexed_sessions.get(session_id)
+        if (
+            doc_ids is not None
+            and self.memory.is_cached(session_id)
+            and (not doc_ids or doc_ids[0] in self.memory_index)
+        ):
+            self._indexed_sessions.move_to_end(session_id)
+            return
+
+        self._drop_index(session_id)
+        self._indexed_sessions[session_id] = []
+        for entry in self.memory.get_history(session_id):
+            self._index_entry(session_id, entry)
+        while len(self._indexed_sessions) > self.memory.max_sessions:
+            self._drop_index(next(iter(self._indexed_sessions)))
+
+    def _drop_index(self, session_id: str) -> None:
+        for doc_id in self._indexed_sessions.pop(session_id, []):
+            self.memory_index.remove(doc_id)
+
+    def _index_entry(self, session_id: str, entry: Dict[str, Any]) -> None:
+        if entry["role"] not in SessionStore.CONTEXT_ROLES:
+            return
+        self._memory_doc_ids += 1
+        self.memory_index.add(
+            self._memory_doc_ids,
+            f"{entry['role']}: {entry['content']}",
+            session_id
+        )
+        doc_ids = self._indexed_sessions.setdefault(session_id, [])
+        doc_ids.append(self._memory_doc_ids)
+        # Recall covers the turns the session store keeps
+        if len(doc_ids) > self.memory.max_messages_per_session:
+            self.memory_index.remove(doc_ids.pop(0))
+
+    def _build_messages(self, session_id: str) -> List[Dict[str, str]]:
+        """Build the chat messages sent to the model within the context token budget.
+
+        The latest turns fill part of the budget; the rest holds older turns
+        of the session that are most relevant to the current message.
+        """
+        with span("build_context"):
+            self._ensure_indexed(session_id)
+            system_message = {"role": "system", "content": self.SYSTEM_PROMPT}
+            budget = self.context_token_budget - estimate_message_tokens([system_message])
+            recent = self.memory.build_context(session_id, int(budget * self.RECENT_CONTEXT_SHARE))
+
+            recent_texts = {f"{m['role']}: {m['content']}" for m in recent}
+            query = recent[-1]["content"] if recent else ""
+            matches = [
+                match for match in self.memory_index.search(
+                    query,
+                    k=self.RECALL_TOP_K + len(recent),
+                    where=lambda owner: owner == session_id
+                )
+                if match[2] not in recent_texts
+            ][:self.RECALL_TOP_K]
+            header = "Relevant earlier conversation:"
+            remaining = budget - estimate_message_tokens(recent) - estimate_message_tokens([{"content": header}])
+            snippets = select_snippets(matches, remaining)
+            if not snippets:
+                return [system_message, *recent]
+
+            recalled = {
+                "role": "system",
+                "content": header + "\n" + "\n".join(f"- {snippet}" for snippet in snippets)
+            }
+            return [system_message, recalled, *recent]
+
+    def _get_agent_files(self) -> List[Path]:
+        """Get the source files that make up the agent."""
+        return list(Path(__file__).parent.glob("*.py"))
+
+    async def _analyze_file(self, file: Path) -> Dict[str, Any]:
+        """Analyze a single agent file, returning an error slot on failure."""
+        with span("read_file", file=file.name):
+            code = file.read_text()
+        try:
+            return await self._bounded_request(
+                ROLE_CODE_ANALYSIS,
+                "code_analysis",
+                code=code
+            )
+        except Exception as e:
+            return {"error": str(e)}
+
+    async def _improve_file(self, file_name: str, analysis: Dict[str, Any]) -> Any:
+        """Generate improvement suggestions for a single analyzed file."""
+        try:
+            # Generate improvements based on analysis
+            messages = [
+                {"role": "system", "content": "You are an expert code improver. "
+                                            "Suggest specific, safe improvements to the code."},
+                {"role": "user", "content": f"Analysis: {json.dumps(analysis)}\n\n"
+                                          f"Suggest improvements for {file_name}"}
+            ]
+
+            return await self._bounded_request(
+                ROLE_CODE_IMPROVEMENT,
+                "chat",
+                messages=messages
+            )
+        except Exception as e:
+            return {"error": str(e)}
 
     async def analyze_self(self) -> Dict[str, Any]:
         """Analyze agent's own code for potential improvements."""
-        agent_files = list(Path(__file__).parent.glob("*.py"))
-        analyses = {}
+        agent_files = self._get_agent_files()
 
+        if self.concurrent:
+            results = await asyncio.gather(*(self._analyze_file(file) for file in agent_files))
+            return {file.name: result for file, result in zip(agent_files, results)}
+
+        analyses = {}
         for file in agent_files:
-            code = file.read_text()
-            try:
-                analysis = await self.model_router.route_request(
-                    "claude",  # Using Claude for code analysis
-                    "code_analysis",
-                    code=code
-                )
-                analyses[file.name] = analysis
-            except Exception as e:
-                analyses[file.name] = {"error": str(e)}
+            analyses[file.name] = await self._analyze_file(file)
 
         return analyses
 
     async def improve_self(self) -> Dict[str, Any]:
         """Attempt to improve agent's own code based on analysis."""
+        if self.concurrent:
+            return await self._improve_self_pipelined()
+
         analyses = await self.analyze_self()
         improvements = {}
 
         for file_name, analysis in analyses.items():
             if "error" in analysis:
                 continue
+            improvements[file_name] = await self._improve_file(file_name, analysis)
 
-            try:
-                # Generate improvements based on analysis
-                messages = [
-                    {"role": "system", "content": "You are an expert code improver. "
-                                                "Suggest specific, safe improvements to the code."},
-                    {"role": "user", "content": f"Analysis: {json.dumps(analysis)}\n\n"
-                                              f"Suggest improvements for {file_name}"}
-                ]
-                
-                improvement_suggestions = await self.model_router.route_request(
-                    "gpt-4",
-                    "chat",
-                    messages=messages
-                )
-                
-                improvements[file_name] = improvement_suggestions
+        return improvements
 
-            except Exception as e:
-                improvements[file_name] = {"error": str(e)}
+    async def _improve_self_pipelined(self) -> Dict[str, Any]:
+        """Analyze and improve agent files concurrently.
 
-        return improvements
+        Each file's improvement request starts as soon as its own analysis
+        finishes, instead of waiting for the whole analysis pass.
+        """
+        async def pipeline(file: Path) -> Optional[Any]:
+            analysis = await self._analyze_file(file)
+            if "error" in analysis:
+                return None
+            return await self._improve_file(file.name, analysis)
 
-    def save_memory(self, file_path: Optional[str] = None) -> None:
-        """Save agent's memory to a file."""
-        if file_path is None:
-            file_path = self.workspace_path / "memory.json"
+        agent_files = self._get_agent_files()
+        results = await asyncio.gather(*(pipeline(file) for file in agent_files))
+
+        return {
+            file.name: result
+            for file, result in zip(agent_files, results)
+            if result is not None
+        }
 
-        with open(file_path, 'w') as f:
-            json.dump(self.memory, f, indent=2)
+    async def save_memory(self) -> None:
+        """Snapshot agent's memory and compact the journal.
+
+        Entries are journaled as they are recorded, so this is only needed to
+        bound recovery time; the journal also snapshots on its own.
+        """
+        await self.memory.snapshot()
 
     def load_memory(self, file_path: Optional[str] = None) -> None:
-        """Load agent's memory from a file."""
+        """Load agent's memory.
+
+        Sessions are loaded lazily from their files and the journal, so this
+        only re-indexes the journal and imports a legacy memory file once.
+        """
         if file_path is None:
             file_path = self.workspace_path / "memory.json"
 
-        if Path(file_path).exists():
-            with open(file_path, 'r') as f:
-                self.memory = json.load(f)
+        migrated_path = Path(file_path).with_suffix(".json.migrated")
+        try:
+            # Rename first so only one worker imports the file
+            Path(file_path).rename(migrated_path)
+        except FileNotFoundError:
+            pass
+        else:
+            with open(migrated_path, 'r') as f:
+                sessions = json.load(f)
+            # Older memory files hold a single list shared by all users
+            if isinstance(sessions, list):
+                sessions = {DEFAULT_SESSION: sessions}
+            self.memory.load(sessions)
+            self.memory.flush()
+
+        self.memory.recover()
 
     async def execute_code_modification(self, file_path: str, changes: str) -> Dict[str, Any]:
         """Execute code modification with safety checks."""
@@ -133,7 +426,8 @@ class Agent:
             
             # If analysis shows no major issues, apply changes
             if not analysis.get("critical_issues"):
-                success, error = self.code_modifier.apply_changes(file_path, changes)
+                # The versioned write fsyncs several files; keep it off the event loop
+                success, error = await asyncio.to_thread(self.code_modifier.apply_changes, file_path, changes)
                 if success:
                     return {"status": "success", "analysis": analysis}
                 else:
@@ -0,0 +1,159 @@
+from typing import Dict, Any, List, Optional
+import ast
+import hashlib
+
+# Unit holding imports, constants and other module-level statements
+MODULE_UNIT = "<module>"
+
+class CodeUnit:
+    """A function, method or class body fingerprinted by its AST."""
+
+    def __init__(self, name: str, source: str, digest: str):
+        self.name = name
+        self.source = source
+        self.digest = digest
+
+def _digest(*nodes: ast.AST) -> str:
+    # ast.dump omits line numbers, so moved or reformatted code keeps its fingerprint
+    return hashlib.sha256("\n".join(ast.dump(node) for node in nodes).encode("utf-8")).hexdigest()
+
+def _segment(lines: List[str], node: ast.AST) -> str:
+    start = min([node.lineno] + [d.lineno for d in getattr(node, "decorator_list", [])])
+    return "".join(lines[start - 1:node.end_lineno]).rstrip()
+
+def extract_units(code: str) -> Optional[Dict[str, CodeUnit]]:
+    """Fingerprint the functions, methods and class bodies of a module.
+
+    Methods are named ``Class.method``; the rest of a class (bases,
+    decorators, attributes) is the ``Class`` unit and everything outside
+    classes and functions is the ``<module>`` unit. Returns None if the code
+    does not parse.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return None
+
+    lines = code.splitlines(keepends=True)
+    units: Dict[str, CodeUnit] = {}
+
+    def add(name: str, source: str, digest: str) -> None:
+        unique, index = name, 2
+        while unique in units:
+            unique, index = f"{name}#{index}", index + 1
+        units[unique] = CodeUnit(unique, source, digest)
+
+    module_nodes: List[ast.stmt] = []
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            add(node.name, _segment(lines, node), _digest(node))
+        elif isinstance(node, ast.ClassDef):
+            members = []
+            for child in node.body:
+                if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    add(f"{node.name}.{child.name}", _segment(lines, child), _digest(child))
+                else:
+                    members.append(child)
+            header_end = node.body[0].lineno - 1
+            header = "".join(lines[node.lineno - 1:header_end]).rstrip()
+            source = "\n".join([header] + [_segment(lines, member) for member in members]) if header else _segment(lines, node)
+            add(
+                node.name,
+                source,
+                _digest(*node.decorator_list, *node.bases, *node.keywords, *members, ast.Name(id=node.name))
+            )
+        else:
+            module_nodes.append(node)
+
+    if module_nodes:
+        add(
+            MODULE_UNIT,
+            "\n".join(_segment(lines, node) for node in module_nodes),
+            _digest(*module_nodes)
+        )
+    return units
+
+class CodeDiff:
+    """Unit-level difference between two versions of a module."""
+
+    def __init__(self, old_units: Dict[str, CodeUnit], new_units: Dict[str, CodeUnit]):
+        self.old_units = old_units
+        self.new_units = new_units
+        self.added = [name for name in new_units if name not in old_units]
+        self.removed = [name for name in old_units if name not in new_units]
+        self.modified = [
+            name for name in new_units
+            if name in old_units and old_units[name].digest != new_units[name].digest
+        ]
+        self.unchanged = [
+            name for name in new_units
+            if name in old_units and old_units[name].digest == new_units[name].digest
+        ]
+
+    @property
+    def changed(self) -> List[str]:
+        """Names of units that were added or modified, in new source order."""
+        return [name for name in self.new_units if name in self.added or name in self.modified]
+
+    @property
+    def context(self) -> str:
+        """Module-level imports and definitions of the new version."""
+        unit = self.new_units.get(MODULE_UNIT)
+        return unit.source if unit is not None else ""
+
+    def excerpt(self, name: str) -> str:
+        """Source of a new-version unit prefixed with the module context it needs."""
+        source = self.new_units[name].source
+        if name == MODULE_UNIT or not self.context:
+            return source
+        return f"# Module context\n{self.context}\n\n# Code under analysis\n{source}"
+
+    @property
+    def context_changed(self) -> bool:
+        """Whether the module-level code differs between the versions."""
+        return MODULE_UNIT in self.changed or MODULE_UNIT in self.removed
+
+    def change_excerpt(self, name: str) -> str:
+        """Original and new source of a changed unit with the new module context."""
+        if name in self.modified:
+            source = f"--- original\n{self.old_units[name].source}\n--- new\n{self.new_units[name].source}"
+        else:
+            source = f"--- added\n{self.new_units[name].source}"
+        if name == MODULE_UNIT or not self.context:
+            return source
+        return f"# Module context\n{self.context}\n\n# Change under analysis\n{source}"
+
+    def render(self) -> str:
+        """Render the changed units as old/new excerpts for a prompt."""
+        sections = []
+        for name in self.changed:
+            if name in self.modified:
+                sections.append(
+                    f"Changed {name}:\n--- original\n{self.old_units[name].source}\n"
+                    f"--- new\n{self.new_units[name].source}"
+                )
+            else:
+                sections.append(f"Added {name}:\n{self.new_units[name].source}")
+        for name in self.removed:
+            sections.append(f"Removed {name}:\n{self.old_units[name].source}")
+        return "\n\n".join(sections)
+
+    def stats(self) -> Dict[str, Any]:
+        """Counts of changed units and the share of the new source they cover."""
+        total = sum(len(unit.source) for unit in self.new_units.values())
+        changed = sum(len(self.new_units[name].source) for name in self.changed)
+        return {
+            "added": len(self.added),
+            "removed": len(self.removed),
+            "modified": len(self.modified),
+            "unchanged": len(self.unchanged),
+            "changed_ratio": changed / total if total else 0.0
+        }
+
+def diff_code(old_code: str, new_code: str) -> Optional[CodeDiff]:
+    """Diff two module versions unit by unit, or None if either fails to parse."""
+    old_units = extract_units(old_code)
+    new_units = extract_units(new_code)
+    if old_units is None or new_units is None:
+        return None
+    return CodeDiff(old_units, new_units)
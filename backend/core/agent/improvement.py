@@ -1,21 +1,27 @@
 from typing import Dict, Any, List, Optional
-from pathlib import Path
 import ast
+import asyncio
 import astor
-import json
-from ..models.model_router import ModelRouter
+from ..models.model_router import ModelRouter, ROLE_CODE_IMPROVEMENT
+from .safety import SafetyAnalyzer, IMPROVEMENT_PROFILE, safety_analyzer
+from ..storage.versions import VersionStore, version_store
+from ..monitoring.tracing import span
 
 class CodeImprovement:
     """Handles code improvement suggestions and implementations."""
-    
-    def __init__(self, model_router: ModelRouter):
+
+    # Bump when the suggestion prompt or cached result format changes so cached results are invalidated
+    SUGGESTION_PROMPT_VERSION = "2"
+
+    def __init__(
+        self,
+        model_router: ModelRouter,
+        safety: Optional[SafetyAnalyzer] = None,
+        versions: Optional[VersionStore] = None
+    ):
         self.model_router = model_router
-        self.safety_checks = [
-            self._check_syntax,
-            self._check_dangerous_imports,
-            self._check_file_operations,
-            self._check_network_operations
-        ]
+        self.safety = safety or safety_analyzer
+        self.versions = versions or version_store
 
     async def suggest_improvements(self, code: str) -> Dict[str, Any]:
         """Generate improvement suggestions for the given code."""
@@ -38,17 +44,17 @@ class CodeImprovement:
         """
 
         try:
-            response = await self.model_router.route_request(
-                "gpt-4",
-                "chat",
+            # The router parses the reply, so only valid suggestions are cached
+            return await self.model_router.route_request(
+                ROLE_CODE_IMPROVEMENT,
+                "code_suggestions",
+                code=code,
+                prompt_version=self.SUGGESTION_PROMPT_VERSION,
                 messages=[
                     {"role": "system", "content": "You are a Python code improvement expert."},
                     {"role": "user", "content": prompt}
                 ]
             )
-            
-            # Parse the response as JSON
-            return json.loads(response)
         except Exception as e:
             return {"error": f"Failed to generate improvements: {str(e)}"}
 
@@ -59,8 +65,9 @@ class CodeImprovement:
     ) -> Dict[str, Any]:
         """Implement suggested improvements with safety checks."""
         try:
-            with open(file_path, 'r') as f:
-                original_code = f.read()
+            with span("read_file"):
+                with open(file_path, 'r') as f:
+                    original_code = f.read()
 
             # Get implementation details from improvements
             implementations = improvements.get('implementation', {})
@@ -68,38 +75,38 @@ class CodeImprovement:
                 return {"error": "No implementation details provided"}
 
             # Create AST from original code
-            tree = ast.parse(original_code)
+            with span("ast_parse"):
+                tree = ast.parse(original_code)
             
             # Apply improvements using AST transformation
-            modified_tree = self._apply_improvements_to_ast(tree, implementations)
+            with span("ast_transform"):
+                modified_tree = self._apply_improvements_to_ast(tree, implementations)
             
             # Convert modified AST back to code
-            modified_code = astor.to_source(modified_tree)
+            with span("ast_to_source"):
+                modified_code = astor.to_source(modified_tree)
             
             # Run safety checks
-            for check in self.safety_checks:
-                result = check(modified_code)
-                if not result['safe']:
-                    return {"error": f"Safety check failed: {result['reason']}"}
-
-            # Create backup
-            backup_path = f"{file_path}.bak"
-            Path(file_path).rename(backup_path)
+            with span("safety_checks"):
+                verdict = self.safety.check(modified_code, IMPROVEMENT_PROFILE)
+            if not verdict['safe']:
+                return {"error": f"Safety check failed: {verdict['reason']}"}
 
             try:
-                # Write improved code
-                with open(file_path, 'w') as f:
-                    f.write(modified_code)
+                # Write improved code, keeping the original in the version store
+                with span("write_file"):
+                    version = await asyncio.to_thread(
+                        self.versions.write, file_path, modified_code, message="implement improvements"
+                    )
                 
                 return {
                     "status": "success",
                     "message": "Improvements implemented successfully",
-                    "backup_created": backup_path
+                    "version": version["version"]
                 }
                 
             except Exception as write_error:
-                # Restore from backup if write fails
-                Path(backup_path).rename(file_path)
+                # The original file is left untouched if the write failed
                 return {"error": f"Failed to write improved code: {str(write_error)}"}
                 
         except Exception as e:
@@ -115,79 +122,3 @@ class CodeImprovement:
         # In a real implementation, this would parse the implementation
         # details and modify the AST accordingly
         return tree
-
-    def _check_syntax(self, code: str) -> Dict[str, Any]:
-        """Check if the modified code has valid syntax."""
-        try:
-            ast.parse(code)
-            return {"safe": True}
-        except SyntaxError as e:
-            return {"safe": False, "reason": f"Syntax error: {str(e)}"}
-
-    def _check_dangerous_imports(self, code: str) -> Dict[str, Any]:
-        """Check for potentially dangerous imports."""
-        dangerous_modules = {
-            'os', 'subprocess', 'sys', 'shutil',
-            'requests', 'urllib', 'socket'
-        }
-        
-        try:
-            tree = ast.parse(code)
-            for node in ast.walk(tree):
-                if isinstance(node, ast.Import):
-                    for name in node.names:
-                        if name.name in dangerous_modules:
-                            return {
-                                "safe": False,
-                                "reason": f"Dangerous import detected: {name.name}"
-                            }
-                elif isinstance(node, ast.ImportFrom):
-                    if node.module in dangerous_modules:
-                        return {
-                            "safe": False,
-                            "reason": f"Dangerous import detected: {node.module}"
-                        }
-            
-            return {"safe": True}
-            
-        except Exception as e:
-            return {"safe": False, "reason": f"Import check failed: {str(e)}"}
-
-    def _check_file_operations(self, code: str) -> Dict[str, Any]:
-        """Check for potentially dangerous file operations."""
-        dangerous_patterns = [
-            'open(',
-            'write(',
-            'delete(',
-            'remove(',
-            'unlink('
-        ]
-        
-        for pattern in dangerous_patterns:
-            if pattern in code:
-                return {
-                    "safe": False,
-                    "reason": f"Potentially dangerous file operation detected: {pattern}"
-                }
-        
-        return {"safe": True}
-
-    def _check_network_operations(self, code: str) -> Dict[str, Any]:
-        """Check for potentially dangerous network operations."""
-        dangerous_patterns = [
-            'socket.',
-            'connect(',
-            'listen(',
-            'bind(',
-            'request.',
-            'urlopen('
-        ]
-        
-        for pattern in dangerous_patterns:
-            if pattern in code:
-                return {
-                    "safe": False,
-                    "reason": f"Potentially dangerous network operation detected: {pattern}"
-                }
-        
-        return {"safe": True"}
\ No newline at end of file
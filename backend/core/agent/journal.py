@@ -0,0 +1,210 @@
+from typing import Dict, Any, List, Optional, Tuple, Callable, Awaitable
+from pathlib import Path
+import asyncio
+import json
+import logging
+import os
+import time
+from ..monitoring.metrics import DISK_OPERATION_DURATION
+
+logger = logging.getLogger(__name__)
+
+class MemoryJournal:
+    """Append-only journal of memory entries, written in background batches.
+
+    Entries are numbered with a global sequence and appended to JSON-lines
+    segment files by a background task, so recording a message never waits
+    for the disk. After ``snapshot_every`` entries the snapshot handler
+    (installed by the session store) persists the live sessions, and the
+    segments the snapshot covers are deleted. On startup, ``replay`` reads
+    the remaining segments so entries written after the last snapshot
+    survive a crash.
+    """
+
+    SEGMENT_PREFIX = "journal-"
+
+    def __init__(
+        self,
+        directory: Path,
+        flush_interval: float = 0.2,
+        max_batch: int = 500,
+        snapshot_every: int = 5000,
+        fsync: bool = False
+    ):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync
+        self.snapshot_handler: Optional[Callable[[], Awaitable[None]]] = None
+
+        # Sequence and segment covered by the last snapshot
+        self.snapshot_seq, snapshot_segment = self._read_marker()
+        segments = self._segments()
+        self.segment = max([snapshot_segment] + [number for number, _ in segments]) + 1
+        self.seq = max(self.snapshot_seq, self._last_seq(segments))
+        self._pending: List[Tuple[int, str, Dict[str, Any]]] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._write_lock = asyncio.Lock()
+        self.since_snapshot = 0
+        self.flushes = 0
+        self.snapshots = 0
+
+    def start(self) -> None:
+        """Start the background flush task on the running event loop."""
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background task and write out everything still buffered."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def append(self, session_id: str, entry: Dict[str, Any]) -> int:
+        """Buffer an entry for the journal, returning its sequence number."""
+        self.seq += 1
+        self._pending.append((self.seq, session_id, entry))
+        self.since_snapshot += 1
+        if self._wakeup is not None and len(self._pending) >= self.max_batch:
+            self._wakeup.set()
+        return self.seq
+
+    async def flush(self) -> None:
+        """Write buffered entries to the current segment off the event loop."""
+        async with self._write_lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, []
+            started = time.perf_counter()
+            await asyncio.to_thread(self._write, self.segment, batch)
+            DISK_OPERATION_DURATION.labels(operation="journal_flush").observe(time.perf_counter() - started)
+            self.flushes += 1
+
+    async def rotate(self) -> Tuple[int, int]:
+        """Flush and start a new segment.
+
+        Returns the last sequence number and segment written before the
+        rotation, to be passed to complete_snapshot once a snapshot covers
+        them.
+        """
+        await self.flush()
+        async with self._write_lock:
+            boundary = (self.seq - len(self._pending), self.segment)
+            self.segment += 1
+            self.since_snapshot = len(self._pending)
+        return boundary
+
+    async def complete_snapshot(self, seq: int, segment: int) -> None:
+        """Record that everything up to seq is snapshotted and drop the covered segments."""
+        await asyncio.to_thread(self._write_marker, seq, segment)
+        self.snapshot_seq = seq
+
+    def _write_marker(self, seq: int, segment: int) -> None:
+        marker = self.directory / "snapshot.json"
+        tmp_path = marker.with_suffix(".tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump({"seq": seq, "segment": segment}, f)
+        os.replace(tmp_path, marker)
+        for number, path in self._segments():
+            if number <= segment:
+                path.unlink(missing_ok=True)
+
+    def replay(self, after_seq: Optional[int] = None) -> Dict[str, List[Tuple[int, Dict[str, Any]]]]:
+        """Read journaled entries newer than the last snapshot, grouped by session.
+
+        A torn final line left by a crash mid-write is skipped.
+        """
+        if after_seq is None:
+            after_seq = self.snapshot_seq
+        replayed: Dict[str, List[Tuple[int, Dict[str, Any]]]] = {}
+        for _, path in self._segments():
+            with open(path, 'r') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        logger.warning("Skipping unreadable journal record in %s", path.name)
+                        continue
+                    if record["seq"] > after_seq:
+                        replayed.setdefault(record["session_id"], []).append((record["seq"], record["entry"]))
+        return replayed
+
+    def stats(self) -> Dict[str, Any]:
+        """Get journal statistics."""
+        return {
+            "seq": self.seq,
+            "pending": len(self._pending),
+            "segments": len(self._segments()),
+            "since_snapshot": self.since_snapshot,
+            "flushes": self.flushes,
+            "snapshots": self.snapshots
+        }
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+                if self.snapshot_handler is not None and self.since_snapshot >= self.snapshot_every:
+                    await self.snapshot_handler()
+                    self.snapshots += 1
+            except Exception:
+                logger.exception("Journal flush failed")
+
+    def _write(self, segment: int, batch: List[Tuple[int, str, Dict[str, Any]]]) -> None:
+        lines = "".join(
+            json.dumps({"seq": seq, "session_id": session_id, "entry": entry}) + "\n"
+            for seq, session_id, entry in batch
+        )
+        with open(self._segment_path(segment), 'a') as f:
+            f.write(lines)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+
+    def _read_marker(self) -> Tuple[int, int]:
+        try:
+            with open(self.directory / "snapshot.json", 'r') as f:
+                marker = json.load(f)
+            return marker["seq"], marker["segment"]
+        except (OSError, ValueError, KeyError):
+            return 0, 0
+
+    def _segment_path(self, segment: int) -> Path:
+        return self.directory / f"{self.SEGMENT_PREFIX}{segment:08d}.log"
+
+    def _segments(self) -> List[Tuple[int, Path]]:
+        segments = []
+        for path in self.directory.glob(f"{self.SEGMENT_PREFIX}*.log"):
+            try:
+                segments.append((int(path.stem[len(self.SEGMENT_PREFIX):]), path))
+            except ValueError:
+                continue
+        return sorted(segments)
+
+    def _last_seq(self, segments: List[Tuple[int, Path]]) -> int:
+        """Sequence number of the newest journaled entry."""
+        for _, path in reversed(segments):
+            last = 0
+            with open(path, 'r') as f:
+                for line in f:
+                    try:
+                        last = max(last, json.loads(line)["seq"])
+                    except (ValueError, KeyError):
+                        continue
+            if last:
+                return last
+        return 0
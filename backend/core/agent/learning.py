@@ -1,18 +1,48 @@
-from typing import Dict, Any, List, Optional
-import json
+from typing import Dict, Any, List, Optional, Deque, Tuple
+from collections import deque
 from pathlib import Path
 from datetime import datetime
 import asyncio
-from ..models.model_router import ModelRouter
+import time
+from ..models.model_router import ModelRouter, ROLE_LEARNING
+from ..models.structured_output import parse_json, StructuredOutputError
+from .learning_store import LearningStore
+from .code_diff import diff_code
+from .retrieval import BM25Index, select_snippets
+from ..monitoring.metrics import DISK_OPERATION_DURATION
+from ..monitoring.tracing import span
 
 class AgentLearning:
     """Handles the agent's learning and self-improvement capabilities."""
     
-    def __init__(self, model_router: ModelRouter):
+    # Number of stored learnings between store compactions
+    COMPACT_INTERVAL = 1000
+    # Learnings kept by default; older ones are dropped at compaction
+    DEFAULT_MAX_LEARNINGS = 50000
+    PLAN_TOP_K = 50
+    # Learnings read per query when catching up with the store
+    SYNC_BATCH = 1000
+
+    def __init__(
+        self,
+        model_router: ModelRouter,
+        max_learnings: int = DEFAULT_MAX_LEARNINGS,
+        plan_token_budget: int = 2500,
+        index_size: int = 5000
+    ):
         self.model_router = model_router
         self.learning_path = Path("learning_history")
-        self.learning_path.mkdir(exist_ok=True)
-        self.current_learnings: List[Dict[str, Any]] = []
+        self.store = LearningStore(Path("learning_history.db"))
+        self.max_learnings = max_learnings
+        # One-shot migration from the legacy file-per-learning history
+        self.store.migrate_from_directory(self.learning_path)
+        self.current_learnings: Deque[Dict[str, Any]] = deque(maxlen=100)
+        self._stored_since_compaction = 0
+        self.plan_token_budget = plan_token_budget
+        # Relevance index over stored learnings, primed with the newest ones
+        self.index = BM25Index(max_documents=index_size)
+        self._synced_id = max(0, self.store.last_id() - index_size)
+        self._sync_learnings()
 
     async def learn_from_interaction(self, interaction: Dict[str, Any]) -> Dict[str, Any]:
         """Learn from a single interaction with a user."""
@@ -21,7 +51,7 @@ class AgentLearning:
             analysis = await self._analyze_interaction(interaction)
             
             # Store the learning
-            self._store_learning({
+            await self._store_learning({
                 "timestamp": datetime.now().isoformat(),
                 "interaction": interaction,
                 "analysis": analysis,
@@ -32,6 +62,24 @@ class AgentLearning:
         except Exception as e:
             return {"error": f"Failed to learn from interaction: {str(e)}"}
 
+    async def learn_from_interactions(self, interactions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Learn from a batch of interactions using a single model call."""
+        try:
+            analyses = await self._analyze_interactions(interactions)
+        except Exception as e:
+            analyses = [{"error": f"Analysis failed: {str(e)}"} for _ in interactions]
+
+        timestamp = datetime.now().isoformat()
+        for interaction, analysis in zip(interactions, analyses):
+            await self._store_learning({
+                "timestamp": timestamp,
+                "interaction": interaction,
+                "analysis": analysis,
+                "type": "interaction_learning"
+            })
+
+        return analyses
+
     async def learn_from_code_changes(self, file_path: str, old_code: str, new_code: str) -> Dict[str, Any]:
         """Learn from code modifications."""
         try:
@@ -39,7 +87,7 @@ class AgentLearning:
             analysis = await self._analyze_code_changes(old_code, new_code)
             
             # Store the learning
-            self._store_learning({
+            await self._store_learning({
                 "timestamp": datetime.now().isoformat(),
                 "file_path": file_path,
                 "analysis": analysis,
@@ -50,16 +98,23 @@ class AgentLearning:
         except Exception as e:
             return {"error": f"Failed to learn from code changes: {str(e)}"}
 
-    async def generate_improvement_plan(self) -> Dict[str, Any]:
-        """Generate a plan for self-improvement based on accumulated learnings."""
+    async def generate_improvement_plan(self, focus: Optional[str] = None) -> Dict[str, Any]:
+        """Generate a plan for self-improvement from the learnings relevant to focus, or the newest ones."""
         try:
-            recent_learnings = self._get_recent_learnings(limit=50)
+            with span("load_learnings"):
+                if focus:
+                    await self._refresh_index()
+                    learnings = await self._get_relevant_learnings(focus)
+                    heading = f"these learning experiences related to \"{focus}\""
+                else:
+                    learnings = await self._get_newest_learnings()
+                    heading = "these recent learning experiences"
             
             # Create a prompt for the AI to analyze learnings
-            prompt = f"""Based on these recent learning experiences, suggest improvements:
+            prompt = f"""Based on {heading}, suggest improvements:
 
-            Recent Learnings:
-            {json.dumps(recent_learnings, indent=2)}
+            Learnings:
+            {learnings}
 
             Please analyze these learnings and suggest:
             1. Patterns in user interactions
@@ -74,7 +129,7 @@ class AgentLearning:
             Format your response as a structured improvement plan."""
 
             response = await self.model_router.route_request(
-                "gpt-4",
+                ROLE_LEARNING,
                 "chat",
                 messages=[
                     {"role": "system", "content": "You are an AI learning specialist."},
@@ -83,7 +138,8 @@ class AgentLearning:
             )
 
             # Parse and structure the improvement plan
-            plan = self._structure_improvement_plan(response)
+            with span("parse_plan"):
+                plan = self._structure_improvement_plan(response)
             
             return plan
         except Exception as e:
@@ -106,7 +162,7 @@ class AgentLearning:
             4. Specific learning points"""
 
             analysis = await self.model_router.route_request(
-                "gpt-4",
+                ROLE_LEARNING,
                 "chat",
                 messages=[
                     {"role": "system", "content": "You are an interaction analysis specialist."},
@@ -114,20 +170,68 @@ class AgentLearning:
                 ]
             )
 
-            return json.loads(analysis)
+            with span("parse_json"):
+                return parse_json(analysis, "object")
         except Exception as e:
             return {"error": f"Analysis failed: {str(e)}"}
 
+    async def _analyze_interactions(self, interactions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Analyze several interactions at once, returning one analysis per interaction."""
+        if len(interactions) == 1:
+            return [await self._analyze_interaction(interactions[0])]
+
+        formatted = "\n\n".join(
+            f"""Interaction {index}:
+            User Input: {interaction.get('user_input')}
+            Agent Response: {interaction.get('agent_response')}
+            Success: {interaction.get('success')}
+            Duration: {interaction.get('duration')}"""
+            for index, interaction in enumerate(interactions)
+        )
+        prompt = f"""Analyze these interactions for learning opportunities:
+
+            {formatted}
+
+            For each interaction, identify:
+            1. What worked well
+            2. What could be improved
+            3. Any patterns or insights
+            4. Specific learning points
+
+            Format your response as a JSON array with exactly one object per
+            interaction, in the same order as the interactions above."""
+
+        response = await self.model_router.route_request(
+            ROLE_LEARNING,
+            "chat",
+            messages=[
+                {"role": "system", "content": "You are an interaction analysis specialist."},
+                {"role": "user", "content": prompt}
+            ]
+        )
+
+        with span("parse_json"):
+            analyses = parse_json(response, "array")
+        if not isinstance(analyses, list) or len(analyses) != len(interactions):
+            raise ValueError("Expected one analysis per interaction")
+        return analyses
+
     async def _analyze_code_changes(self, old_code: str, new_code: str) -> Dict[str, Any]:
         """Analyze code changes for learning purposes."""
         try:
-            prompt = f"""Compare these code versions and analyze the changes:
+            with span("diff_units"):
+                diff = diff_code(old_code, new_code)
+            if diff is None:
+                changes = f"Original Code:\n{old_code}\n\nNew Code:\n{new_code}"
+            elif not diff.changed and not diff.removed:
+                return {"nature_of_changes": "No functional changes"}
+            else:
+                # Only the functions and classes that differ are sent
+                changes = diff.render()
 
-            Original Code:
-            {old_code}
+            prompt = f"""Compare these code versions and analyze the changes:
 
-            New Code:
-            {new_code}
+            {changes}
 
             Please identify:
             1. Nature of changes
@@ -136,7 +240,7 @@ class AgentLearning:
             4. Learning points"""
 
             analysis = await self.model_router.route_request(
-                "gpt-4",
+                ROLE_LEARNING,
                 "chat",
                 messages=[
                     {"role": "system", "content": "You are a code analysis specialist."},
@@ -144,53 +248,97 @@ class AgentLearning:
                 ]
             )
 
-            return json.loads(analysis)
+            with span("parse_json"):
+                return parse_json(analysis, "object")
         except Exception as e:
             return {"error": f"Analysis failed: {str(e)}"}
 
-    def _store_learning(self, learning: Dict[str, Any]) -> None:
+    async def _store_learning(self, learning: Dict[str, Any]) -> None:
         """Store a learning experience."""
-        # Add to current learnings
-        self.current_learnings.append(learning)
-        
-        # Save to file
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        file_path = self.learning_path / f"learning_{timestamp}.json"
-        
-        with open(file_path, 'w') as f:
-            json.dump(learning, f, indent=2)
-
-    def _get_recent_learnings(self, limit: int = 50) -> List[Dict[str, Any]]:
-        """Get recent learning experiences."""
-        # Combine current learnings with stored learnings
-        all_learnings = []
-        
-        # Load from files
-        learning_files = sorted(self.learning_path.glob("learning_*.json"), reverse=True)
-        for file in learning_files[:limit]:
-            try:
-                with open(file, 'r') as f:
-                    learning = json.load(f)
-                    all_learnings.append(learning)
-            except Exception:
-                continue
-
-        # Add current learnings
-        all_learnings.extend(self.current_learnings)
-        
-        # Return most recent ones
-        return sorted(
-            all_learnings,
-            key=lambda x: x.get('timestamp', ''),
-            reverse=True
-        )[:limit]
+        # Append to the learning store; the store's lock may be held by a compaction
+        started = time.perf_counter()
+        await asyncio.to_thread(self.store.append, learning)
+        DISK_OPERATION_DURATION.labels(operation="learning_append").observe(time.perf_counter() - started)
+        await self._refresh_index()
+
+        self._stored_since_compaction += 1
+        if self._stored_since_compaction >= self.COMPACT_INTERVAL:
+            started = time.perf_counter()
+            await asyncio.to_thread(self.store.compact, self.max_learnings)
+            DISK_OPERATION_DURATION.labels(operation="learning_compact").observe(time.perf_counter() - started)
+            self._stored_since_compaction = 0
+
+    def _sync_learnings(self) -> None:
+        """Add learnings stored since the last sync, including other workers', to the index."""
+        while True:
+            rows = self.store.since(self._synced_id, limit=self.SYNC_BATCH)
+            self._index_rows(rows)
+            if len(rows) < self.SYNC_BATCH:
+                return
+
+    async def _refresh_index(self) -> None:
+        """Like _sync_learnings, reading the store in a worker thread."""
+        while True:
+            rows = await asyncio.to_thread(self.store.since, self._synced_id, self.SYNC_BATCH)
+            self._index_rows(rows)
+            if len(rows) < self.SYNC_BATCH:
+                return
+
+    def _index_rows(self, rows: List[Tuple[int, Dict[str, Any]]]) -> None:
+        for learning_id, learning in rows:
+            self.current_learnings.append(learning)
+            self.index.add(learning_id, self._learning_text(learning))
+            self._synced_id = learning_id
+
+    @staticmethod
+    def _learning_text(learning: Dict[str, Any]) -> str:
+        """Extract the interaction and analysis text of a learning, without keys, timestamps or tags."""
+        def values(value: Any) -> List[str]:
+            if isinstance(value, dict):
+                return [text for item in value.values() for text in values(item)]
+            if isinstance(value, (list, tuple)):
+                return [text for item in value for text in values(item)]
+            return [str(value)] if isinstance(value, str) and value else []
+
+        interaction = learning.get("interaction")
+        texts = [learning["file_path"]] if isinstance(learning.get("file_path"), str) else []
+        if isinstance(interaction, dict):
+            texts.extend(values([interaction.get("user_input"), interaction.get("agent_response")]))
+        texts.extend(values(learning.get("analysis")))
+        return " | ".join(texts)
+
+    async def _get_relevant_learnings(self, query: str) -> str:
+        """Format the learnings most relevant to query that fit in the plan token budget."""
+        matches = self.index.search(query, k=self.PLAN_TOP_K)
+        if not matches:
+            # Nothing matches the query; fall back to the newest learnings
+            return await self._get_newest_learnings()
+        return self._format_learnings(matches)
+
+    async def _get_newest_learnings(self) -> str:
+        """Format the newest learnings that fit in the plan token budget."""
+        learnings = await self._get_recent_learnings(limit=self.PLAN_TOP_K)
+        return self._format_learnings([
+            (None, 0.0, self._learning_text(learning), None) for learning in learnings
+        ])
+
+    def _format_learnings(self, matches: List[Tuple[Any, float, str, Any]]) -> str:
+        snippets = select_snippets(matches, self.plan_token_budget)
+        return "\n".join(f"- {snippet}" for snippet in snippets)
+
+    async def _get_recent_learnings(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Get recent learning experiences, newest first."""
+        started = time.perf_counter()
+        learnings = await asyncio.to_thread(self.store.recent, limit)
+        DISK_OPERATION_DURATION.labels(operation="learning_recent").observe(time.perf_counter() - started)
+        return learnings
 
     def _structure_improvement_plan(self, raw_plan: str) -> Dict[str, Any]:
         """Structure the raw improvement plan into a formatted response."""
         try:
             # Attempt to parse if it's already JSON
-            return json.loads(raw_plan)
-        except json.JSONDecodeError:
+            return parse_json(raw_plan, "object")
+        except StructuredOutputError:
             # If not JSON, structure it manually
             return {
                 "raw_plan": raw_plan,
@@ -0,0 +1,113 @@
+from typing import Dict, Any, List, Optional
+import asyncio
+import logging
+from .learning import AgentLearning
+
+logger = logging.getLogger(__name__)
+
+# Queued by stop() to tell the worker to finish its batch and exit
+_STOP = object()
+
+class LearningQueueFullError(Exception):
+    """Raised when the learning ingestion queue cannot accept more interactions."""
+    pass
+
+class LearningIngestor:
+    """Queues interactions and analyzes them in micro-batches in the background."""
+
+    def __init__(
+        self,
+        learning_system: AgentLearning,
+        batch_size: int = 10,
+        flush_interval: float = 2.0,
+        max_queue_size: int = 1000
+    ):
+        self.learning_system = learning_system
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        self.processed = 0
+        self.batches = 0
+        self.rejected = 0
+        self._worker: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Start the background worker."""
+        if self._worker is None:
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background worker after draining queued interactions.
+
+        The worker finishes the batch it is collecting or processing instead
+        of being cancelled, so no interaction taken off the queue is lost.
+        """
+        if self._worker is None:
+            return
+        await self.queue.put(_STOP)
+        await self._worker
+        self._worker = None
+
+        while not self.queue.empty():
+            await self._process(self._take_batch())
+
+    def submit(self, interaction: Dict[str, Any]) -> int:
+        """Queue an interaction for analysis and return the queue depth."""
+        try:
+            self.queue.put_nowait(interaction)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise LearningQueueFullError("Learning queue is full, retry later")
+        return self.queue.qsize()
+
+    def stats(self) -> Dict[str, Any]:
+        """Get ingestion statistics."""
+        return {
+            "queue_depth": self.queue.qsize(),
+            "max_queue_size": self.queue.maxsize,
+            "processed": self.processed,
+            "batches": self.batches,
+            "rejected": self.rejected
+        }
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            interaction = await self.queue.get()
+            if interaction is _STOP:
+                return
+            batch = [interaction]
+            deadline = loop.time() + self.flush_interval
+            stopping = False
+
+            # Collect more interactions until the batch is full or the interval elapses
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    interaction = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if interaction is _STOP:
+                    stopping = True
+                    break
+                batch.append(interaction)
+
+            await self._process(batch)
+            if stopping:
+                return
+
+    def _take_batch(self) -> List[Dict[str, Any]]:
+        batch = []
+        while len(batch) < self.batch_size and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        return batch
+
+    async def _process(self, batch: List[Dict[str, Any]]) -> None:
+        try:
+            await self.learning_system.learn_from_interactions(batch)
+        except Exception:
+            logger.exception("Failed to process learning batch")
+        self.processed += len(batch)
+        self.batches += 1
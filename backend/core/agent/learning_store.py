@@ -0,0 +1,144 @@
+from typing import Dict, Any, List, Optional, Tuple
+from pathlib import Path
+import json
+import sqlite3
+import threading
+
+class LearningStore:
+    """Append-only store for learning experiences backed by SQLite in WAL mode."""
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=10.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS learnings (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TEXT NOT NULL,
+                type TEXT,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_learnings_timestamp
+                ON learnings (timestamp);
+            CREATE INDEX IF NOT EXISTS idx_learnings_type_timestamp
+                ON learnings (type, timestamp);
+        """)
+        self._conn.commit()
+
+    def append(self, learning: Dict[str, Any]) -> int:
+        """Append a learning and return its id."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO learnings (timestamp, type, data) VALUES (?, ?, ?)",
+                (learning.get("timestamp", ""), learning.get("type"), json.dumps(learning))
+            )
+            self._conn.commit()
+            return cursor.lastrowid
+
+    def recent(self, limit: int = 50, learning_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Get the most recent learnings, newest first."""
+        query = "SELECT data FROM learnings"
+        params: List[Any] = []
+        if learning_type is not None:
+            query += " WHERE type = ?"
+            params.append(learning_type)
+        query += " ORDER BY timestamp DESC, id DESC LIMIT ?"
+        params.append(limit)
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def since(self, after_id: int, limit: int = 1000) -> List[Tuple[int, Dict[str, Any]]]:
+        """Get (id, learning) pairs stored after after_id, oldest first.
+
+        Other processes may append to the same database, so this is how a
+        process picks up their learnings.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, data FROM learnings WHERE id > ? ORDER BY id LIMIT ?",
+                (after_id, limit)
+            ).fetchall()
+        return [(row[0], json.loads(row[1])) for row in rows]
+
+    def last_id(self) -> int:
+        """Id of the newest stored learning (0 if there is none)."""
+        with self._lock:
+            row = self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM learnings").fetchone()
+        return row[0]
+
+    def count(self, learning_type: Optional[str] = None) -> int:
+        """Count stored learnings."""
+        with self._lock:
+            if learning_type is None:
+                row = self._conn.execute("SELECT COUNT(*) FROM learnings").fetchone()
+            else:
+                row = self._conn.execute(
+                    "SELECT COUNT(*) FROM learnings WHERE type = ?",
+                    (learning_type,)
+                ).fetchone()
+        return row[0]
+
+    def compact(self, max_entries: int) -> int:
+        """Drop learnings beyond the newest max_entries and reclaim their disk space.
+
+        The database is only checkpointed and vacuumed when rows were
+        dropped. Returns the number of dropped learnings.
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                """DELETE FROM learnings WHERE id NOT IN (
+                       SELECT id FROM learnings ORDER BY timestamp DESC, id DESC LIMIT ?
+                   )""",
+                (max_entries,)
+            )
+            self._conn.commit()
+            deleted = cursor.rowcount
+            if deleted > 0:
+                self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                self._conn.execute("VACUUM")
+            return deleted
+
+    def migrate_from_directory(self, directory: Path) -> int:
+        """Import learning_*.json files from the legacy history directory.
+
+        The directory is renamed afterwards so the migration only runs once.
+        Returns the number of imported learnings.
+        """
+        directory = Path(directory)
+        if not directory.is_dir():
+            return 0
+
+        rows = []
+        for file in sorted(directory.glob("learning_*.json")):
+            try:
+                with open(file, 'r') as f:
+                    learning = json.load(f)
+            except (OSError, ValueError):
+                continue
+            rows.append((learning.get("timestamp", ""), learning.get("type"), json.dumps(learning)))
+
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO learnings (timestamp, type, data) VALUES (?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+
+        target = directory.with_name(directory.name + ".migrated")
+        suffix = 1
+        while target.exists():
+            # Keep earlier migrated directories, e.g. after a restore from backup
+            suffix += 1
+            target = directory.with_name(f"{directory.name}.migrated.{suffix}")
+        directory.rename(target)
+        return len(rows)
+
+    def close(self) -> None:
+        """Close the underlying database connection."""
+        with self._lock:
+            self._conn.close()
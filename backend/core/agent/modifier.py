@@ -1,14 +1,29 @@
 import ast
+import asyncio
 from typing import Dict, Any, Optional
 from pathlib import Path
 import astor
-from ..models.model_router import ModelRouter
+from ..models.model_router import ModelRouter, ROLE_CODE_ANALYSIS
+from ..models.base import AIModel
+from ..models.chunking import merge_reports
+from .code_diff import diff_code
+from .safety import SafetyAnalyzer, MODIFIER_PROFILE, safety_analyzer
+from ..storage.files import atomic_write
+from ..storage.versions import VersionStore, version_store
+from ..monitoring.tracing import span
 
 class CodeModifier:
     """Handles code modification with safety checks."""
     
-    def __init__(self, model_router: ModelRouter):
+    def __init__(
+        self,
+        model_router: ModelRouter,
+        safety: Optional[SafetyAnalyzer] = None,
+        versions: Optional[VersionStore] = None
+    ):
         self.model_router = model_router
+        self.safety = safety or safety_analyzer
+        self.versions = versions or version_store
 
     def read_file(self, file_path: str) -> str:
         """Read a file's contents."""
@@ -21,48 +36,70 @@ class CodeModifier:
         proposed_changes: str
     ) -> Dict[str, Any]:
         """Analyze proposed code changes using AI model."""
-        current_code = self.read_file(file_path)
-        
-        analysis = await self.model_router.route_request(
-            "gpt-4",
-            "code_analysis",
-            code=current_code,
-            changes=proposed_changes
-        )
-        
+        with span("read_file"):
+            current_code = self.read_file(file_path)
+
+        with span("diff_units"):
+            diff = diff_code(current_code, proposed_changes)
+        if diff is None:
+            # Unparseable code cannot be split into units; analyze both versions whole
+            return await self.model_router.route_request(
+                ROLE_CODE_ANALYSIS,
+                "code_analysis",
+                code=f"--- original\n{current_code}\n--- new\n{proposed_changes}"
+            )
+
+        semaphore = asyncio.Semaphore(self._analysis_concurrency())
+
+        async def analyze(excerpt: str) -> Dict[str, Any]:
+            async with semaphore:
+                return await self.model_router.route_request(ROLE_CODE_ANALYSIS, "code_analysis", code=excerpt)
+
+        async def analyze_change(name: str) -> Dict[str, Any]:
+            report = await analyze(diff.change_excerpt(name))
+            # Recorded under the unit's own excerpt so later diffs that leave it unchanged reuse it
+            self.model_router.store_cached(ROLE_CODE_ANALYSIS, "code_analysis", report, code=diff.excerpt(name))
+            return report
+
+        # Changed units go to the model as original/new pairs
+        analyses = [analyze_change(name) for name in diff.changed]
+
+        # Reuse earlier analyses of unchanged units where they exist. Their
+        # excerpts include the module context, so when it changed they are
+        # analyzed again rather than left out.
+        reports = []
+        for name in diff.unchanged:
+            cached = self.model_router.get_cached(ROLE_CODE_ANALYSIS, "code_analysis", code=diff.excerpt(name))
+            if cached is not None:
+                reports.append(cached)
+            elif diff.context_changed:
+                analyses.append(analyze(diff.excerpt(name)))
+
+        reports = list(await asyncio.gather(*analyses)) + reports
+
+        analysis = merge_reports(reports)
+        analysis["changed_units"] = diff.changed
+        analysis["removed_units"] = diff.removed
         return analysis
 
+    def _analysis_concurrency(self) -> int:
+        """Concurrent unit analyses allowed by the best analysis model."""
+        candidates = self.model_router.get_candidates(ROLE_CODE_ANALYSIS)
+        if not candidates:
+            return AIModel.analysis_concurrency
+        return self.model_router.get_model(candidates[0]).analysis_concurrency
+
     def validate_syntax(self, code: str) -> bool:
         """Validate Python code syntax."""
-        try:
-            ast.parse(code)
-            return True
-        except SyntaxError:
-            return False
+        return not self.safety.check(code, MODIFIER_PROFILE)["syntax_error"]
 
     def validate_safety(self, code: str) -> tuple[bool, Optional[str]]:
         """
         Validate code safety by checking for dangerous operations.
         Returns (is_safe, reason_if_unsafe)
         """
-        try:
-            tree = ast.parse(code)
-            
-            # Check for dangerous imports
-            dangerous_modules = {'os', 'subprocess', 'sys'}
-            for node in ast.walk(tree):
-                if isinstance(node, ast.Import):
-                    for name in node.names:
-                        if name.name in dangerous_modules:
-                            return False, f"Dangerous import: {name.name}"
-                elif isinstance(node, ast.ImportFrom):
-                    if node.module in dangerous_modules:
-                        return False, f"Dangerous import: {node.module}"
-            
-            return True, None
-            
-        except Exception as e:
-            return False, str(e)
+        verdict = self.safety.check(code, MODIFIER_PROFILE)
+        return verdict["safe"], verdict["reason"]
 
     def apply_changes(
         self, 
@@ -72,30 +109,27 @@ class CodeModifier:
     ) -> tuple[bool, Optional[str]]:
         """
         Apply code changes with safety checks.
+        The file is replaced atomically; with backup, the previous and new
+        contents are recorded in the version store and can be rolled back.
         Returns (success, error_message_if_failed)
         """
-        # Validate syntax
-        if not self.validate_syntax(changes):
+        # Validate syntax and safety in a single parse
+        with span("validate_safety"):
+            verdict = self.safety.check(changes, MODIFIER_PROFILE)
+        if verdict["syntax_error"]:
             return False, "Invalid Python syntax"
-
-        # Validate safety
-        is_safe, safety_reason = self.validate_safety(changes)
-        if not is_safe:
-            return False, f"Safety check failed: {safety_reason}"
-
-        # Create backup
-        if backup:
-            backup_path = f"{file_path}.bak"
-            Path(file_path).rename(backup_path)
+        if not verdict["safe"]:
+            return False, f"Safety check failed: {verdict['reason']}"
 
         try:
             # Write new code
-            with open(file_path, 'w') as f:
-                f.write(changes)
+            with span("write_file"):
+                if backup:
+                    self.versions.write(file_path, changes, message="apply changes")
+                else:
+                    atomic_write(Path(file_path), changes.encode("utf-8"))
             return True, None
             
         except Exception as e:
-            # Restore from backup if something went wrong
-            if backup:
-                Path(backup_path).rename(file_path)
+            # The original file is left untouched if the write failed
             return False, str(e)
\ No newline at end of file
@@ -0,0 +1,135 @@
+from typing import Dict, Any, List, Optional, Callable, Hashable, Tuple
+from collections import OrderedDict
+import math
+import re
+from ..models.tokens import estimate_tokens, CHARS_PER_TOKEN
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9_]+")
+
+STOP_WORDS = frozenset(
+    "a an and are as at be but by can do for from has have how i if in into is it its "
+    "me my no not of on or our so that the their then there these this to was we were "
+    "what when which who why will with you your".split()
+)
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens without stop words."""
+    return [term for term in TOKEN_PATTERN.findall(text.lower()) if term not in STOP_WORDS and len(term) > 1]
+
+class BM25Index:
+    """In-memory inverted index ranked with Okapi BM25, updated incrementally.
+
+    Documents are added and removed one at a time; with ``max_documents``
+    the oldest documents are dropped first so the index stays bounded.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, max_documents: Optional[int] = None):
+        self.k1 = k1
+        self.b = b
+        self.max_documents = max_documents
+        self._postings: Dict[str, Dict[Hashable, int]] = {}
+        self._documents: "OrderedDict[Hashable, Tuple[str, int, Any]]" = OrderedDict()
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def __contains__(self, doc_id: Hashable) -> bool:
+        return doc_id in self._documents
+
+    def add(self, doc_id: Hashable, text: str, payload: Any = None) -> None:
+        """Index a document, replacing any document with the same id."""
+        if doc_id in self._documents:
+            self.remove(doc_id)
+
+        terms = tokenize(text)
+        counts: Dict[str, int] = {}
+        for term in terms:
+            counts[term] = counts.get(term, 0) + 1
+        for term, count in counts.items():
+            self._postings.setdefault(term, {})[doc_id] = count
+
+        self._documents[doc_id] = (text, len(terms), payload)
+        self._total_length += len(terms)
+
+        while self.max_documents is not None and len(self._documents) > self.max_documents:
+            self.remove(next(iter(self._documents)))
+
+    def remove(self, doc_id: Hashable) -> bool:
+        """Remove a document from the index."""
+        document = self._documents.pop(doc_id, None)
+        if document is None:
+            return False
+        text, length, _ = document
+        self._total_length -= length
+        for term in set(tokenize(text)):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+        return True
+
+    def search(
+        self,
+        query: str,
+        k: int = 10,
+        where: Optional[Callable[[Any], bool]] = None
+    ) -> List[Tuple[Hashable, float, str, Any]]:
+        """Return the k best (doc_id, score, text, payload) matches for a query."""
+        if not self._documents:
+            return []
+
+        count = len(self._documents)
+        average_length = self._total_length / count or 1.0
+        scores: Dict[Hashable, float] = {}
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, frequency in postings.items():
+                length = self._documents[doc_id][1]
+                norm = frequency + self.k1 * (1 - self.b + self.b * length / average_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (self.k1 + 1) / norm
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        results = []
+        for doc_id, score in ranked:
+            text, _, payload = self._documents[doc_id]
+            if where is not None and not where(payload):
+                continue
+            results.append((doc_id, score, text, payload))
+            if len(results) >= k:
+                break
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        """Get index size statistics."""
+        return {
+            "documents": len(self._documents),
+            "terms": len(self._postings),
+            "max_documents": self.max_documents
+        }
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text down to roughly max_tokens."""
+    limit = max_tokens * CHARS_PER_TOKEN
+    return text if len(text) <= limit else text[:limit].rstrip() + "..."
+
+def select_snippets(
+    matches: List[Tuple[Hashable, float, str, Any]],
+    token_budget: int,
+    max_snippet_tokens: int = 300
+) -> List[str]:
+    """Take ranked matches in order while they fit in the token budget."""
+    snippets = []
+    used = 0
+    for _, _, text, _ in matches:
+        snippet = truncate_to_tokens(text, max_snippet_tokens)
+        cost = estimate_tokens(snippet)
+        if used + cost > token_budget:
+            continue
+        snippets.append(snippet)
+        used += cost
+    return snippets
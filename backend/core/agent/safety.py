@@ -0,0 +1,192 @@
+from typing import Dict, Any, List, Optional, Iterable, Tuple, FrozenSet
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import ast
+import hashlib
+import threading
+
+class SafetyProfile:
+    """The set of rules a piece of code is checked against."""
+
+    def __init__(
+        self,
+        name: str,
+        dangerous_modules: Iterable[str],
+        file_calls: Iterable[str] = (),
+        network_calls: Iterable[str] = (),
+        network_modules: Iterable[str] = ()
+    ):
+        self.name = name
+        self.dangerous_modules: FrozenSet[str] = frozenset(dangerous_modules)
+        # Called names (function or method) treated as file operations
+        self.file_calls: FrozenSet[str] = frozenset(file_calls)
+        # Called names treated as network operations
+        self.network_calls: FrozenSet[str] = frozenset(network_calls)
+        # Names whose attributes are treated as network operations, e.g. socket.socket
+        self.network_modules: FrozenSet[str] = frozenset(network_modules)
+
+# Rules applied before code modifications are written
+MODIFIER_PROFILE = SafetyProfile("modifier", {"os", "subprocess", "sys"})
+
+# Rules applied to model-generated improvements
+IMPROVEMENT_PROFILE = SafetyProfile(
+    "improvement",
+    {"os", "subprocess", "sys", "shutil", "requests", "urllib", "socket"},
+    file_calls={"open", "write", "delete", "remove", "unlink"},
+    network_calls={"connect", "listen", "bind", "urlopen"},
+    network_modules={"socket", "request"}
+)
+
+# Rule order decides which violation is reported as the reason
+_RULE_IMPORT, _RULE_FILE, _RULE_NETWORK = range(3)
+
+class _SafetyVisitor(ast.NodeVisitor):
+    """Collects every rule violation of a profile in one pass over the tree."""
+
+    def __init__(self, profile: SafetyProfile):
+        self.profile = profile
+        self.violations: List[Tuple[int, int, str]] = []
+
+    def _report(self, rule: int, node: ast.AST, message: str) -> None:
+        self.violations.append((rule, getattr(node, "lineno", 0), message))
+
+    def visit_Import(self, node: ast.Import) -> None:
+        for alias in node.names:
+            if alias.name in self.profile.dangerous_modules:
+                self._report(_RULE_IMPORT, node, f"Dangerous import detected: {alias.name}")
+
+    def visit_ImportFrom(self, node: ast.ImportFrom) -> None:
+        if node.module in self.profile.dangerous_modules:
+            self._report(_RULE_IMPORT, node, f"Dangerous import detected: {node.module}")
+
+    def visit_Call(self, node: ast.Call) -> None:
+        func = node.func
+        name = func.id if isinstance(func, ast.Name) else func.attr if isinstance(func, ast.Attribute) else None
+        if name in self.profile.file_calls:
+            self._report(_RULE_FILE, node, f"Potentially dangerous file operation detected: {name}(")
+        if name in self.profile.network_calls:
+            self._report(_RULE_NETWORK, node, f"Potentially dangerous network operation detected: {name}(")
+        self.generic_visit(node)
+
+    def visit_Attribute(self, node: ast.Attribute) -> None:
+        if isinstance(node.value, ast.Name) and node.value.id in self.profile.network_modules:
+            self._report(
+                _RULE_NETWORK,
+                node,
+                f"Potentially dangerous network operation detected: {node.value.id}."
+            )
+        self.generic_visit(node)
+
+def analyze_source(code: str, profile: SafetyProfile) -> Dict[str, Any]:
+    """Parse code once and check it against every rule of a profile."""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        return {"safe": False, "syntax_error": True, "reason": f"Syntax error: {str(e)}", "issues": []}
+
+    visitor = _SafetyVisitor(profile)
+    visitor.visit(tree)
+    violations = sorted(visitor.violations)
+    issues = [{"line": line, "message": message} for _, line, message in violations]
+    return {
+        "safe": not violations,
+        "syntax_error": False,
+        "reason": violations[0][2] if violations else None,
+        "issues": issues
+    }
+
+def _analyze_in_worker(item: Tuple[str, str, SafetyProfile]) -> Tuple[str, Dict[str, Any]]:
+    digest, code, profile = item
+    return digest, analyze_source(code, profile)
+
+class SafetyAnalyzer:
+    """Single-pass safety checker with verdicts memoized by content hash."""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._verdicts: "OrderedDict[Tuple[str, str], Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def digest(code: str) -> str:
+        return hashlib.sha256(code.encode("utf-8")).hexdigest()
+
+    def check(self, code: str, profile: SafetyProfile = IMPROVEMENT_PROFILE) -> Dict[str, Any]:
+        """Check code against a profile, reusing the verdict for identical code."""
+        key = (profile.name, self.digest(code))
+        verdict = self._lookup(key)
+        if verdict is None:
+            verdict = analyze_source(code, profile)
+            self._store(key, verdict)
+        return verdict
+
+    def check_files(
+        self,
+        paths: Iterable[str],
+        profile: SafetyProfile = IMPROVEMENT_PROFILE,
+        max_workers: Optional[int] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """Check many files, parsing uncached ones across a process pool."""
+        verdicts: Dict[str, Dict[str, Any]] = {}
+        pending: Dict[str, List[str]] = {}
+        sources: Dict[str, str] = {}
+        for path in paths:
+            try:
+                with open(path, 'r') as f:
+                    code = f.read()
+            except (OSError, UnicodeDecodeError) as e:
+                verdicts[str(path)] = {"safe": False, "syntax_error": False, "reason": str(e), "issues": []}
+                continue
+            digest = self.digest(code)
+            cached = self._lookup((profile.name, digest))
+            if cached is not None:
+                verdicts[str(path)] = cached
+            else:
+                pending.setdefault(digest, []).append(str(path))
+                sources[digest] = code
+
+        if len(sources) > 1:
+            items = [(digest, code, profile) for digest, code in sources.items()]
+            with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                results = list(pool.map(_analyze_in_worker, items, chunksize=max(1, len(items) // 32)))
+        else:
+            results = [(digest, analyze_source(code, profile)) for digest, code in sources.items()]
+
+        for digest, verdict in results:
+            self._store((profile.name, digest), verdict)
+            for path in pending[digest]:
+                verdicts[path] = verdict
+        return verdicts
+
+    def stats(self) -> Dict[str, Any]:
+        """Get memoization counters."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self._verdicts),
+            "max_entries": self.max_entries
+        }
+
+    def _lookup(self, key: Tuple[str, str]) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            verdict = self._verdicts.get(key)
+            if verdict is None:
+                self.misses += 1
+                return None
+            self._verdicts.move_to_end(key)
+            self.hits += 1
+            return verdict
+
+    def _store(self, key: Tuple[str, str], verdict: Dict[str, Any]) -> None:
+        with self._lock:
+            self._verdicts[key] = verdict
+            self._verdicts.move_to_end(key)
+            while len(self._verdicts) > self.max_entries:
+                self._verdicts.popitem(last=False)
+
+# Shared by CodeModifier and CodeImprovement
+safety_analyzer = SafetyAnalyzer()
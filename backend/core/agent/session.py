@@ -0,0 +1,386 @@
+from typing import Dict, Any, List, Optional, Tuple
+from collections import OrderedDict
+from pathlib import Path
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from ..models.tokens import estimate_tokens, MESSAGE_OVERHEAD_TOKENS
+from ..monitoring.metrics import DISK_OPERATION_DURATION
+from .journal import MemoryJournal
+from ..storage.shared_state import SharedState
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SESSION = "default"
+
+class SessionStore:
+    """Per-session conversation histories with LRU eviction to disk.
+
+    With a journal, every appended entry is also journaled. Session files
+    record the journal sequence they include, so loading a session applies
+    only the journaled entries newer than its file.
+
+    With shared state, entries are buffered and written there in batches
+    by a background task instead of to session files and the journal. The
+    same task drops cached sessions another worker has appended to, so they
+    are reloaded on next use, and periodically trims the stored sessions.
+    """
+
+    # Roles the chat providers accept as conversation context
+    CONTEXT_ROLES = {"user", "assistant"}
+
+    def __init__(
+        self,
+        storage_path: Path,
+        max_sessions: int = 1000,
+        max_messages_per_session: int = 200,
+        journal: Optional[MemoryJournal] = None,
+        state: Optional[SharedState] = None,
+        flush_interval: float = 0.2,
+        trim_interval: float = 60.0
+    ):
+        self.storage_path = Path(storage_path)
+        self.storage_path.mkdir(parents=True, exist_ok=True)
+        self.max_sessions = max_sessions
+        self.max_messages_per_session = max_messages_per_session
+        self._sessions: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+        # Journal sequence of the newest entry per session
+        self._seqs: Dict[str, int] = {}
+        self.evictions = 0
+        self.journal = journal
+        self.state = state
+        self.flush_interval = flush_interval
+        self.trim_interval = trim_interval
+        # Entries not yet written to the shared state
+        self._pending: List[Tuple[str, Dict[str, Any]]] = []
+        self._sync_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._replay: Dict[str, List[Tuple[int, Dict[str, Any]]]] = {}
+        # Snapshots write from a worker thread while evictions write from the loop
+        self._file_lock = threading.Lock()
+        self._written_seqs: Dict[str, int] = {}
+        # Evicted sessions whose files are still being written off the loop
+        self._evicted: Dict[str, Tuple[List[Dict[str, Any]], int]] = {}
+        self._evict_writer: Optional[asyncio.Task] = None
+        if journal is not None:
+            journal.snapshot_handler = self.snapshot
+            self.recover()
+
+    def recover(self) -> None:
+        """Index journaled entries not yet covered by a snapshot.
+
+        Only the journal is read here; session files are loaded lazily when
+        a session is first used.
+        """
+        if self.journal is not None:
+            self._replay = self.journal.replay()
+
+    def start(self) -> None:
+        """Start writing buffered entries to the shared state in the background."""
+        if self.state is not None and (self._task is None or self._task.done()):
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background task and write out everything still buffered."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.state is not None:
+            await self.sync()
+
+    async def sync(self) -> None:
+        """Write buffered entries to the shared state and drop sessions other workers changed."""
+        async with self._sync_lock:
+            batch, self._pending = self._pending, []
+            live = list(self._sessions)
+            written, versions = await asyncio.to_thread(self._write_pending, batch, live)
+
+        stale = set()
+        for session_id, (previous, seq) in written.items():
+            if previous != self._seqs.get(session_id, 0):
+                # Another worker appended in between
+                stale.add(session_id)
+            self._seqs[session_id] = seq
+        for session_id, version in versions.items():
+            if session_id in self._seqs and version != self._seqs[session_id]:
+                stale.add(session_id)
+        # Sessions with newer buffered entries are checked again on the next sync
+        buffered = {session_id for session_id, _ in self._pending}
+        for session_id in stale - buffered:
+            self._sessions.pop(session_id, None)
+
+    def append(self, session_id: str, entry: Dict[str, Any]) -> None:
+        """Append an entry to a session's history."""
+        history = self.get_history(session_id)
+        history.append(entry)
+        if len(history) > self.max_messages_per_session:
+            del history[:len(history) - self.max_messages_per_session]
+        if self.state is not None:
+            self._pending.append((session_id, entry))
+        elif self.journal is not None:
+            self._seqs[session_id] = self.journal.append(session_id, entry)
+
+    def get_history(self, session_id: str) -> List[Dict[str, Any]]:
+        """Get a session's history, loading it from disk if it was evicted."""
+        history = self._sessions.get(session_id)
+        if history is None:
+            if session_id in self._evicted:
+                evicted, self._seqs[session_id] = self._evicted.pop(session_id)
+                # Copy, since the writer thread may still be serializing the evicted list
+                history = list(evicted)
+            else:
+                history, self._seqs[session_id] = self._load_session(session_id, self._replay)
+            self._sessions[session_id] = history
+            self._evict_if_needed()
+        else:
+            self._sessions.move_to_end(session_id)
+        return history
+
+    async def preload(self, session_id: str) -> None:
+        """Load a session into memory in a worker thread unless it is already there.
+
+        get_history loads missing sessions itself, but on the calling
+        thread; request handlers preload first to keep the loop free.
+        """
+        if session_id in self._sessions or session_id in self._evicted:
+            return
+        started = time.perf_counter()
+        if self.state is not None:
+            # Hold off syncs so buffered entries are either read back or still pending
+            async with self._sync_lock:
+                history, seq = await asyncio.to_thread(self._read_session, session_id, {})
+        else:
+            replay = {session_id: self._replay.get(session_id, [])}
+            history, seq = await asyncio.to_thread(self._read_session, session_id, replay)
+        DISK_OPERATION_DURATION.labels(operation="session_load").observe(time.perf_counter() - started)
+        if session_id in self._sessions or session_id in self._evicted:
+            # Loaded or appended to while the read was running
+            return
+        self._sessions[session_id] = self._with_pending(session_id, history)
+        self._seqs[session_id] = seq
+        self._evict_if_needed()
+
+    def is_cached(self, session_id: str) -> bool:
+        """Whether a session's history is held in memory (not evicted or invalidated)."""
+        return session_id in self._sessions
+
+    def build_context(self, session_id: str, token_budget: int) -> List[Dict[str, str]]:
+        """Build chat context from the newest messages that fit in the token budget."""
+        context: List[Dict[str, str]] = []
+        used = 0
+        for entry in reversed(self.get_history(session_id)):
+            if entry["role"] not in self.CONTEXT_ROLES:
+                continue
+            cost = estimate_tokens(entry["content"]) + MESSAGE_OVERHEAD_TOKENS
+            # Always keep the newest message, even if it exceeds the budget on its own
+            if context and used + cost > token_budget:
+                break
+            context.append({"role": entry["role"], "content": entry["content"]})
+            used += cost
+        context.reverse()
+        return context
+
+    def sessions(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Get all live (in-memory) sessions."""
+        return dict(self._sessions)
+
+    def load(self, sessions: Dict[str, List[Dict[str, Any]]]) -> None:
+        """Replace live sessions with the given histories."""
+        self._sessions.clear()
+        for session_id, history in sessions.items():
+            history = history[-self.max_messages_per_session:]
+            if self.state is not None:
+                self._pending.extend((session_id, entry) for entry in history)
+            self._sessions[session_id] = history
+            self._evict_if_needed()
+
+    def flush(self) -> None:
+        """Persist all live sessions to disk."""
+        if self.state is not None:
+            batch, self._pending = self._pending, []
+            for session_id, (_, seq) in self._write_pending(batch, [])[0].items():
+                self._seqs[session_id] = seq
+            return
+        for session_id, history in self._sessions.items():
+            self._save_session(session_id, history, self._seqs.get(session_id, 0))
+        self._save_evicted(list(self._evicted.items()))
+
+    async def snapshot(self) -> None:
+        """Write live sessions to disk off the event loop and compact the journal.
+
+        The journal is rotated first, so the segments it returns are fully
+        covered once the session files are written and can be deleted.
+        Sessions that only exist in the journal (after a crash) are written
+        too before their entries are dropped.
+        """
+        if self.state is not None:
+            await self.sync()
+            await asyncio.to_thread(self.state.trim_sessions, self.max_messages_per_session)
+            return
+        if self.journal is None:
+            await asyncio.to_thread(self.flush)
+            return
+
+        seq, segment = await self.journal.rotate()
+        live = [
+            (session_id, list(history), self._seqs.get(session_id, 0))
+            for session_id, history in self._sessions.items()
+        ]
+        # Evicted sessions not written yet are covered by the rotated segments too
+        live.extend(
+            (session_id, list(history), seq)
+            for session_id, (history, seq) in self._evicted.items()
+        )
+        replay = dict(self._replay)
+        started = time.perf_counter()
+        await asyncio.to_thread(self._write_snapshot, live, replay)
+        DISK_OPERATION_DURATION.labels(operation="memory_snapshot").observe(time.perf_counter() - started)
+        for session_id in replay:
+            self._replay.pop(session_id, None)
+        await self.journal.complete_snapshot(seq, segment)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get session store statistics."""
+        return {
+            "live_sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "evictions": self.evictions
+        }
+
+    def _write_snapshot(
+        self,
+        live: List[Tuple[str, List[Dict[str, Any]], int]],
+        replay: Dict[str, List[Tuple[int, Dict[str, Any]]]]
+    ) -> None:
+        for session_id, history, seq in live:
+            self._save_session(session_id, history, seq)
+        live_ids = {session_id for session_id, _, _ in live}
+        for session_id in replay:
+            if session_id not in live_ids:
+                history, seq = self._load_session(session_id, replay)
+                self._save_session(session_id, history, seq)
+
+    def _write_pending(
+        self,
+        batch: List[Tuple[str, Dict[str, Any]]],
+        live: List[str]
+    ) -> Tuple[Dict[str, Tuple[int, int]], Dict[str, int]]:
+        written = self.state.append_session_entries(batch) if batch else {}
+        versions = self.state.session_versions(live) if live else {}
+        return written, versions
+
+    async def _run(self) -> None:
+        last_trim = time.monotonic()
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.sync()
+                if time.monotonic() - last_trim >= self.trim_interval:
+                    # Keep the shared session log bounded while the server runs
+                    await asyncio.to_thread(self.state.trim_sessions, self.max_messages_per_session)
+                    last_trim = time.monotonic()
+            except Exception:
+                logger.exception("Writing sessions to shared state failed")
+
+    def _evict_if_needed(self) -> None:
+        while len(self._sessions) > self.max_sessions:
+            session_id, history = self._sessions.popitem(last=False)
+            seq = self._seqs.pop(session_id, 0)
+            if self.state is None:
+                self._evicted[session_id] = (history, seq)
+            self.evictions += 1
+        if self._evicted and (self._evict_writer is None or self._evict_writer.done()):
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                # Not serving yet (e.g. loading memory at startup); write directly
+                self._save_evicted(list(self._evicted.items()))
+                self._evicted.clear()
+                return
+            self._evict_writer = loop.create_task(self._write_evicted())
+
+    async def _write_evicted(self) -> None:
+        """Write evicted sessions to their files in a worker thread."""
+        while self._evicted:
+            batch = list(self._evicted.items())
+            started = time.perf_counter()
+            try:
+                await asyncio.to_thread(self._save_evicted, batch)
+            except Exception:
+                logger.exception("Writing evicted sessions failed")
+                return
+            DISK_OPERATION_DURATION.labels(operation="session_evict").observe(time.perf_counter() - started)
+            for session_id, item in batch:
+                # Keep sessions evicted again while the batch was written
+                if self._evicted.get(session_id) is item:
+                    del self._evicted[session_id]
+
+    def _save_evicted(self, batch: List[Tuple[str, Tuple[List[Dict[str, Any]], int]]]) -> None:
+        for session_id, (history, seq) in batch:
+            self._save_session(session_id, history, seq)
+
+    def _session_file(self, session_id: str) -> Path:
+        name = hashlib.sha256(session_id.encode("utf-8")).hexdigest()[:32]
+        return self.storage_path / f"{name}.json"
+
+    def _save_session(self, session_id: str, history: List[Dict[str, Any]], seq: int = 0) -> None:
+        file_path = self._session_file(session_id)
+        tmp_path = file_path.with_suffix(".tmp")
+        with self._file_lock:
+            if seq and self._written_seqs.get(session_id, 0) > seq:
+                # A newer version of the session was written in the meantime
+                return
+            with open(tmp_path, 'w') as f:
+                json.dump({"session_id": session_id, "seq": seq, "history": history}, f)
+            os.replace(tmp_path, file_path)
+            if seq:
+                self._written_seqs[session_id] = seq
+
+    def _load_session(
+        self,
+        session_id: str,
+        replay: Dict[str, List[Tuple[int, Dict[str, Any]]]]
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """Load a session file and apply the journaled entries newer than it."""
+        history, seq = self._read_session(session_id, replay)
+        return self._with_pending(session_id, history), seq
+
+    def _with_pending(self, session_id: str, history: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Add the session's entries still waiting to be written to the shared state."""
+        if self.state is None:
+            return history
+        history.extend(entry for pending_id, entry in self._pending if pending_id == session_id)
+        return history[-self.max_messages_per_session:]
+
+    def _read_session(
+        self,
+        session_id: str,
+        replay: Dict[str, List[Tuple[int, Dict[str, Any]]]]
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """Read a session from the shared state or its file and journal; safe to call off the loop."""
+        if self.state is not None:
+            return self.state.session_entries(session_id, self.max_messages_per_session)
+        history: List[Dict[str, Any]] = []
+        seq = 0
+        file_path = self._session_file(session_id)
+        if file_path.exists():
+            try:
+                with open(file_path, 'r') as f:
+                    stored = json.load(f)
+                history, seq = stored.get("history", []), stored.get("seq", 0)
+            except (OSError, ValueError):
+                pass
+
+        for entry_seq, entry in replay.get(session_id, []):
+            if entry_seq > seq:
+                history.append(entry)
+                seq = entry_seq
+        return history[-self.max_messages_per_session:], seq
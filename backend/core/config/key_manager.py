@@ -3,18 +3,54 @@ from typing import Dict, Optional
 import json
 import os
 from pathlib import Path
+from ..storage.shared_state import SharedState
+
+# Shared state namespace holding encrypted API keys
+KEYS_NAMESPACE = "api_keys"
+
+def load_key_file(path: Path) -> bytes:
+    """Read an encryption key file, creating it with a new key if it is missing.
+
+    The key is written to a private temporary file and linked into place,
+    so concurrent workers agree on one key and never read a partial file.
+    """
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(Fernet.generate_key())
+            os.link(tmp_path, path)
+        except FileExistsError:
+            pass
+        finally:
+            tmp_path.unlink(missing_ok=True)
+    return path.read_bytes().strip()
 
 class APIKeyManager:
-    """Manages API keys for different services with encryption."""
-    
-    def __init__(self, encryption_key: bytes = None):
+    """Manages API keys for different services with encryption.
+
+    With shared state, keys are stored there so every worker sees them.
+    The encryption key then comes from AIDEN_ENCRYPTION_KEY, or is generated
+    once into a 0600 key file (AIDEN_ENCRYPTION_KEY_FILE) kept outside the
+    state database, so all workers on the host can decrypt.
+    """
+
+    def __init__(self, encryption_key: bytes = None, state: Optional[SharedState] = None):
         """Initialize the key manager with an optional encryption key."""
+        self.state = state
+        if encryption_key is None and os.getenv("AIDEN_ENCRYPTION_KEY"):
+            encryption_key = os.getenv("AIDEN_ENCRYPTION_KEY").encode()
+        if encryption_key is None and state is not None:
+            encryption_key = load_key_file(Path(os.getenv("AIDEN_ENCRYPTION_KEY_FILE", "config/encryption.key")))
         if encryption_key is None:
             encryption_key = Fernet.generate_key()
         self.fernet = Fernet(encryption_key)
         self.keys: Dict[str, bytes] = {}
         self.config_path = Path("config/keys.json")
-        self._load_keys()
+        if state is None:
+            self._load_keys()
 
     def _load_keys(self) -> None:
         """Load encrypted keys from file if it exists."""
@@ -33,17 +69,27 @@ class APIKeyManager:
     def store_key(self, service: str, api_key: str) -> None:
         """Store an API key for a service."""
         encrypted_key = self.fernet.encrypt(api_key.encode())
+        if self.state is not None:
+            self.state.set(KEYS_NAMESPACE, service, encrypted_key.decode())
+            return
         self.keys[service] = encrypted_key
         self._save_keys()
 
     def get_key(self, service: str) -> Optional[str]:
         """Get a decrypted API key for a service."""
+        if self.state is not None:
+            encrypted_key = self.state.get(KEYS_NAMESPACE, service)
+            if encrypted_key is None:
+                return None
+            return self.fernet.decrypt(encrypted_key.encode()).decode()
         if service not in self.keys:
             return None
         return self.fernet.decrypt(self.keys[service]).decode()
 
     def remove_key(self, service: str) -> bool:
         """Remove an API key for a service."""
+        if self.state is not None:
+            return self.state.delete(KEYS_NAMESPACE, service)
         if service in self.keys:
             del self.keys[service]
             self._save_keys()
@@ -52,4 +98,6 @@ class APIKeyManager:
 
     def list_services(self) -> list[str]:
         """List all services with stored API keys."""
+        if self.state is not None:
+            return list(self.state.items(KEYS_NAMESPACE))
         return list(self.keys.keys())
\ No newline at end of file
@@ -1,33 +1,44 @@
-from typing import List, Dict, Any
+from typing import List, Dict, AsyncGenerator, Optional
 import anthropic
 from .base import AIModel
+from .http_client import HTTPClientConfig, create_http_client
+from .tokens import estimate_tokens
+from ..monitoring.metrics import record_token_usage
 
 class AnthropicModel(AIModel):
     """Anthropic (Claude) model implementation."""
     
-    def __init__(self, api_key: str):
-        """Initialize with API key."""
-        self.client = anthropic.Client(api_key=api_key)
+    provider = "anthropic"
+
+    def __init__(self, api_key: str, http_config: Optional[HTTPClientConfig] = None):
+        """Initialize with API key and a pooled HTTP client owned by this model."""
+        self.client = anthropic.AsyncAnthropic(
+            api_key=api_key,
+            http_client=create_http_client(http_config, anthropic.DefaultAsyncHttpxClient)
+        )
         self.default_model = "claude-2"
 
     async def generate_response(self, messages: List[Dict[str, str]], **kwargs) -> str:
         """Generate a response using Anthropic's Claude."""
+        model = kwargs.get('model', self.default_model)
         try:
             # Convert chat format to Claude format
             prompt = self._convert_messages_to_prompt(messages)
             
-            response = self.client.completion(
-                model=kwargs.get('model', self.default_model),
+            response = await self.client.completions.create(
+                model=model,
                 prompt=prompt,
                 max_tokens_to_sample=kwargs.get('max_tokens', 2000),
                 temperature=kwargs.get('temperature', 0.7)
             )
+            # The completions API reports no usage, so token counts are estimated
+            record_token_usage(model, estimate_tokens(prompt), estimate_tokens(response.completion))
             return response.completion
         except Exception as e:
             raise Exception(f"Anthropic API error: {str(e)}")
 
-    async def analyze_code(self, code: str, **kwargs) -> Dict[str, Any]:
-        """Analyze code using Claude."""
+    def _analysis_messages(self, code: str) -> List[Dict[str, str]]:
+        """Build the code analysis prompt for Claude."""
         prompt = f"""Please analyze this code and provide a detailed report:
 
         {code}
@@ -40,15 +51,10 @@ class AnthropicModel(AIModel):
         
         Be thorough but concise."""
 
-        try:
-            response = await self.generate_response([
-                {"role": "system", "content": "You are an expert code analyzer."},
-                {"role": "user", "content": prompt}
-            ])
-            # Note: The response should be valid JSON string
-            return eval(response)  # In production, use proper JSON parsing with error handling
-        except Exception as e:
-            raise Exception(f"Code analysis failed: {str(e)}")
+        return [
+            {"role": "system", "content": "You are an expert code analyzer."},
+            {"role": "user", "content": prompt}
+        ]
 
     def _convert_messages_to_prompt(self, messages: List[Dict[str, str]]) -> str:
         """Convert chat messages to Claude's expected format."""
@@ -67,12 +73,29 @@ class AnthropicModel(AIModel):
         prompt += "\n\nAssistant:"
         return prompt.lstrip()
 
-    async def stream_response(self, messages: List[Dict[str, str]], **kwargs):
-        """
-        Stream response from Claude.
-        Note: Anthropic's Python client doesn't support streaming yet,
-        this is a placeholder for future implementation.
-        """
-        # For now, we'll just return the full response
-        response = await self.generate_response(messages, **kwargs)
-        yield response
\ No newline at end of file
+    async def stream_response(self, messages: List[Dict[str, str]], **kwargs) -> AsyncGenerator[str, None]:
+        """Stream response tokens from Claude as they are generated."""
+        model = kwargs.get('model', self.default_model)
+        prompt = self._convert_messages_to_prompt(messages)
+        completion_tokens = 0
+        try:
+            stream = await self.client.completions.create(
+                model=model,
+                prompt=prompt,
+                max_tokens_to_sample=kwargs.get('max_tokens', 2000),
+                temperature=kwargs.get('temperature', 0.7),
+                stream=True
+            )
+
+            async for event in stream:
+                if event.completion:
+                    completion_tokens += estimate_tokens(event.completion)
+                    yield event.completion
+        except Exception as e:
+            raise Exception(f"Anthropic streaming error: {str(e)}")
+        finally:
+            record_token_usage(model, estimate_tokens(prompt), completion_tokens)
+
+    async def aclose(self) -> None:
+        """Close the model's HTTP connection pool."""
+        await self.client.close()
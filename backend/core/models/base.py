@@ -1,15 +1,65 @@
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any
+from typing import List, Dict, Any, AsyncGenerator
+from .chunking import analyze_in_chunks, pack_chunks
+from .structured_output import parse_json, parse_stream
+from .tokens import estimate_tokens
 
 class AIModel(ABC):
     """Base class for AI model implementations."""
-    
+
+    # Bump when the analysis prompt changes so cached results are invalidated
+    prompt_version = "2"
+    # Provider whose rate limits apply to this model
+    provider = "default"
+    # Source larger than this many tokens is analyzed in concurrent chunks
+    analysis_chunk_tokens = 3000
+    analysis_concurrency = 8
+
     @abstractmethod
     async def generate_response(self, messages: List[Dict[str, str]], **kwargs) -> str:
         """Generate a response from the model based on input messages."""
         pass
 
-    @abstractmethod
     async def analyze_code(self, code: str, **kwargs) -> Dict[str, Any]:
-        """Analyze code and return insights."""
-        pass
\ No newline at end of file
+        """Analyze code and return insights, splitting large modules into chunks."""
+        return await analyze_in_chunks(
+            code,
+            self._analyze_source,
+            self.analysis_chunk_tokens,
+            self.analysis_concurrency
+        )
+
+    async def stream_analysis(self, code: str) -> AsyncGenerator[Dict[str, Any], None]:
+        """Stream analysis findings as they are parsed from the model output.
+
+        Yields structured output events; large modules are analyzed chunk
+        by chunk, one after another.
+        """
+        if estimate_tokens(code) <= self.analysis_chunk_tokens:
+            sources = [code]
+        else:
+            sources = [chunk.render() for chunk in pack_chunks(code, self.analysis_chunk_tokens)]
+        for source in sources:
+            async for event in parse_stream(self.stream_response(self._analysis_messages(source)), "object"):
+                yield event
+
+    async def _analyze_source(self, code: str) -> Dict[str, Any]:
+        """Analyze a single source excerpt in one model call."""
+        try:
+            response = await self.generate_response(self._analysis_messages(code))
+            return parse_json(response, "object")
+        except Exception as e:
+            raise Exception(f"Code analysis failed: {str(e)}")
+
+    @abstractmethod
+    def _analysis_messages(self, code: str) -> List[Dict[str, str]]:
+        """Build the chat messages asking the model to analyze a source excerpt."""
+        pass
+
+    async def stream_response(self, messages: List[Dict[str, str]], **kwargs) -> AsyncGenerator[str, None]:
+        """Stream response tokens; defaults to yielding the full response at once."""
+        yield await self.generate_response(messages, **kwargs)
+
+    async def aclose(self) -> None:
+        """Release resources such as HTTP connection pools held by the model."""
+        pass
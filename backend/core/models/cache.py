@@ -0,0 +1,123 @@
+from typing import Dict, Any, Optional, Tuple
+from collections import OrderedDict
+from pathlib import Path
+import hashlib
+import json
+import os
+import time
+
+class AnalysisCache:
+    """Two-tier (in-memory LRU + on-disk) cache for code analysis results."""
+
+    def __init__(
+        self,
+        max_size: int = 256,
+        ttl: float = 7 * 24 * 3600,
+        cache_dir: Optional[str] = "cache/analysis"
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        if self.cache_dir is not None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(model_name: str, request_type: str, prompt_version: str, *contents: str) -> str:
+        """Build a cache key from the model, prompt template version and content hashes."""
+        digests = [hashlib.sha256((content or "").encode("utf-8")).hexdigest() for content in contents]
+        raw = "|".join([model_name, request_type, str(prompt_version), *digests])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Get a cached value, checking memory first and then disk."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            created_at, value = entry
+            if not self._is_expired(created_at):
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return value
+            del self._entries[key]
+
+        entry = self._read_disk(key)
+        if entry is not None:
+            created_at, value = entry
+            self._remember(key, created_at, value)
+            self.disk_hits += 1
+            return value
+
+        self.misses += 1
+        return None
+
+    def set(self, key: str, value: Any) -> None:
+        """Store a value in both cache tiers."""
+        created_at = time.time()
+        self._remember(key, created_at, value)
+        self._write_disk(key, created_at, value)
+
+    def clear(self) -> None:
+        """Remove all cached entries from memory and disk."""
+        self._entries.clear()
+        if self.cache_dir is not None:
+            for file in self.cache_dir.glob("*.json"):
+                file.unlink(missing_ok=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters for the cache."""
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            "hits": hits,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "size": len(self._entries),
+            "max_size": self.max_size
+        }
+
+    def _is_expired(self, created_at: float) -> bool:
+        return self.ttl is not None and time.time() - created_at > self.ttl
+
+    def _remember(self, key: str, created_at: float, value: Any) -> None:
+        self._entries[key] = (created_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _read_disk(self, key: str) -> Optional[Tuple[float, Any]]:
+        if self.cache_dir is None:
+            return None
+
+        file_path = self.cache_dir / f"{key}.json"
+        try:
+            with open(file_path, 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if self._is_expired(entry.get("created_at", 0)):
+            file_path.unlink(missing_ok=True)
+            return None
+        return entry["created_at"], entry["value"]
+
+    def _write_disk(self, key: str, created_at: float, value: Any) -> None:
+        if self.cache_dir is None:
+            return
+
+        file_path = self.cache_dir / f"{key}.json"
+        tmp_path = file_path.with_suffix(".tmp")
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump({"created_at": created_at, "value": value}, f)
+            os.replace(tmp_path, file_path)
+        except (OSError, TypeError, ValueError):
+            # Values that cannot be persisted stay in the memory tier only
+            tmp_path.unlink(missing_ok=True)
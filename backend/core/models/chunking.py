@@ -0,0 +1,201 @@
+from typing import Dict, Any, List, Callable, Awaitable, Optional, Tuple
+import ast
+import asyncio
+import json
+from .tokens import estimate_tokens, CHARS_PER_TOKEN
+
+# Keys of the report returned by analyze_code
+REPORT_KEYS = (
+    "potential_issues",
+    "security_concerns",
+    "performance_notes",
+    "improvement_suggestions"
+)
+
+# Largest share of the chunk budget the shared module context may take
+CONTEXT_SHARE = 0.25
+
+class SourceUnit:
+    """A top-level definition or statement group of a module."""
+
+    def __init__(self, name: str, source: str, start_line: int, end_line: int):
+        self.name = name
+        self.source = source
+        self.start_line = start_line
+        self.end_line = end_line
+
+class SourceChunk:
+    """Units analyzed together, with the module context they need."""
+
+    def __init__(self, context: str, units: List[SourceUnit]):
+        self.context = context
+        self.units = units
+
+    @property
+    def names(self) -> List[str]:
+        return [unit.name for unit in self.units]
+
+    @property
+    def source(self) -> str:
+        return "\n\n".join(unit.source for unit in self.units)
+
+    def render(self) -> str:
+        """Render the chunk as a prompt-ready source excerpt."""
+        if not self.context:
+            return self.source
+        return f"# Module context\n{self.context}\n\n# Code under analysis\n{self.source}"
+
+def _segment(lines: List[str], start: int, end: int) -> str:
+    return "".join(lines[start - 1:end]).rstrip()
+
+def split_into_units(code: str) -> Optional[Tuple[str, List[SourceUnit]]]:
+    """Split module source into shared context and top-level class/function units.
+
+    Imports, module docstrings and module-level assignments form the context
+    sent along with every chunk; each class or function, with its decorators,
+    becomes a unit. Other top-level statements are grouped into units of
+    consecutive statements. Returns None if the code does not parse.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return None
+
+    lines = code.splitlines(keepends=True)
+    context: List[str] = []
+    units: List[SourceUnit] = []
+    pending: List[ast.stmt] = []
+
+    def flush_pending() -> None:
+        if pending:
+            start, end = pending[0].lineno, pending[-1].end_lineno
+            units.append(SourceUnit(f"<module lines {start}-{end}>", _segment(lines, start, end), start, end))
+            pending.clear()
+
+    for index, node in enumerate(tree.body):
+        start = min([node.lineno] + [d.lineno for d in getattr(node, "decorator_list", [])])
+        end = node.end_lineno
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            flush_pending()
+            units.append(SourceUnit(node.name, _segment(lines, start, end), start, end))
+        elif (
+            isinstance(node, (ast.Import, ast.ImportFrom, ast.Assign, ast.AnnAssign))
+            or (index == 0 and isinstance(node, ast.Expr) and isinstance(node.value, ast.Constant))
+        ):
+            context.append(_segment(lines, start, end))
+        else:
+            pending.append(node)
+    flush_pending()
+
+    return "\n".join(context), units
+
+def truncate_context(context: str, max_tokens: int) -> str:
+    """Keep the leading lines of the module context that fit in max_tokens."""
+    if estimate_tokens(context) <= max_tokens:
+        return context
+    marker = "# ... module context truncated"
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    kept: List[str] = []
+    used = len(marker)
+    for line in context.splitlines():
+        if used + len(line) + 1 > max_chars:
+            break
+        kept.append(line)
+        used += len(line) + 1
+    kept.append(marker)
+    return "\n".join(kept)
+
+def pack_chunks(code: str, max_tokens: int) -> List[SourceChunk]:
+    """Pack a module's units into chunks of at most max_tokens each.
+
+    Units are kept whole and in source order; a unit larger than the budget
+    gets a chunk of its own. The module context is truncated to
+    CONTEXT_SHARE of the budget so large module-level tables cannot crowd
+    out the code. Code that does not parse is returned as a single chunk.
+    """
+    split = split_into_units(code)
+    if split is None:
+        return [SourceChunk("", [SourceUnit("<module>", code, 1, code.count("\n") + 1)])]
+
+    context, units = split
+    if not units:
+        return [SourceChunk("", [SourceUnit("<module>", code, 1, code.count("\n") + 1)])]
+
+    context = truncate_context(context, int(max_tokens * CONTEXT_SHARE))
+    budget = max(1, max_tokens - estimate_tokens(context))
+    chunks: List[SourceChunk] = []
+    current: List[SourceUnit] = []
+    used = 0
+    for unit in units:
+        size = estimate_tokens(unit.source)
+        if current and used + size > budget:
+            chunks.append(SourceChunk(context, current))
+            current, used = [], 0
+        current.append(unit)
+        used += size
+    if current:
+        chunks.append(SourceChunk(context, current))
+    return chunks
+
+def merge_reports(reports: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Merge per-chunk analysis reports into a single report.
+
+    List values are concatenated in chunk order with duplicates dropped;
+    unknown keys are merged the same way.
+    """
+    merged: Dict[str, List[Any]] = {key: [] for key in REPORT_KEYS}
+    seen: Dict[str, set] = {key: set() for key in REPORT_KEYS}
+    for report in reports:
+        if not isinstance(report, dict):
+            continue
+        for key, value in report.items():
+            items = value if isinstance(value, list) else [value]
+            bucket = merged.setdefault(key, [])
+            keys_seen = seen.setdefault(key, set())
+            for item in items:
+                fingerprint = json.dumps(item, sort_keys=True, default=str)
+                if fingerprint not in keys_seen:
+                    keys_seen.add(fingerprint)
+                    bucket.append(item)
+    return merged
+
+async def analyze_in_chunks(
+    code: str,
+    analyze: Callable[[str], Awaitable[Dict[str, Any]]],
+    max_tokens: int,
+    max_concurrency: int = 8
+) -> Dict[str, Any]:
+    """Analyze code chunk by chunk and merge the reports.
+
+    Code within the token budget is analyzed in a single call. Larger
+    modules are split along top-level definitions and the chunks are
+    analyzed concurrently, so latency follows the slowest chunk rather than
+    the file size. A failing chunk does not discard the others: the
+    successful reports are merged and the failed chunks are listed under
+    ``failed_chunks``. Only if every chunk fails is the error raised.
+    """
+    if estimate_tokens(code) <= max_tokens:
+        return await analyze(code)
+
+    chunks = pack_chunks(code, max_tokens)
+    if len(chunks) == 1:
+        return await analyze(code)
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def analyze_chunk(chunk: SourceChunk) -> Dict[str, Any]:
+        async with semaphore:
+            return await analyze(chunk.render())
+
+    results = await asyncio.gather(*(analyze_chunk(chunk) for chunk in chunks), return_exceptions=True)
+    failures = [(chunk, result) for chunk, result in zip(chunks, results) if isinstance(result, BaseException)]
+    if len(failures) == len(chunks):
+        raise failures[0][1]
+
+    merged = merge_reports([result for result in results if not isinstance(result, BaseException)])
+    if failures:
+        merged["failed_chunks"] = [
+            {"units": chunk.names, "error": str(error)}
+            for chunk, error in failures
+        ]
+    return merged
@@ -0,0 +1,73 @@
+from typing import Dict, Any, Optional
+import time
+
+class ModelHealth:
+    """Tracks EWMA latency and error rate for a model, with a simple circuit breaker."""
+
+    def __init__(
+        self,
+        alpha: float = 0.2,
+        failure_threshold: int = 3,
+        cooldown: float = 30.0,
+        error_penalty: float = 10.0
+    ):
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.error_penalty = error_penalty
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.consecutive_failures = 0
+        self.requests = 0
+        self.failures = 0
+        self.open_until = 0.0
+
+    def record_success(self, latency: float) -> None:
+        """Record a successful call and its latency in seconds."""
+        self._update(latency, error=False)
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+
+    def record_failure(self, latency: float) -> None:
+        """Record a failed call."""
+        self._update(latency, error=True)
+        self.failures += 1
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= self.failure_threshold:
+            self.open_until = time.monotonic() + self.cooldown
+
+    def record_cancelled(self, elapsed: float) -> None:
+        """Record an abandoned call; elapsed is a lower bound on its latency."""
+        if self.latency is None:
+            self.latency = elapsed
+        elif elapsed > self.latency:
+            # A shorter elapsed time says nothing about how slow the call was
+            self.latency = self.alpha * elapsed + (1 - self.alpha) * self.latency
+
+    def is_available(self) -> bool:
+        """Whether the model is currently accepting traffic (circuit closed)."""
+        return time.monotonic() >= self.open_until
+
+    def score(self) -> float:
+        """Lower is better: expected latency inflated by the recent error rate."""
+        latency = self.latency if self.latency is not None else 0.0
+        return latency * (1 + self.error_penalty * self.error_rate)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get health statistics."""
+        return {
+            "ewma_latency_ms": self.latency * 1000 if self.latency is not None else None,
+            "error_rate": self.error_rate,
+            "requests": self.requests,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+            "available": self.is_available()
+        }
+
+    def _update(self, latency: float, error: bool) -> None:
+        self.requests += 1
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency = self.alpha * latency + (1 - self.alpha) * self.latency
+        self.error_rate = self.alpha * (1.0 if error else 0.0) + (1 - self.alpha) * self.error_rate
@@ -0,0 +1,81 @@
+from typing import Dict, Any, Optional, Deque
+from collections import deque
+import math
+
+class HedgePolicy:
+    """Decides when a slow request gets a duplicate (hedged) call.
+
+    The hedge delay is the model's recent latency percentile, so only calls
+    slower than usual are hedged. Hedges are limited to a share of all
+    hedgeable requests, keeping the extra provider cost bounded.
+    """
+
+    def __init__(
+        self,
+        budget: float = 0.05,
+        percentile: float = 0.95,
+        window: int = 200,
+        min_samples: int = 20,
+        min_delay: float = 0.05,
+        request_types: Optional[set] = None
+    ):
+        # Maximum hedges as a share of hedgeable requests
+        self.budget = budget
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.request_types = request_types or {"chat"}
+        self.window = window
+        self._latencies: Dict[str, Deque[float]] = {}
+        self.requests = 0
+        self.fired = 0
+        self.won = 0
+
+    def applies_to(self, request_type: str) -> bool:
+        """Whether requests of this type may be hedged."""
+        return self.budget > 0 and request_type in self.request_types
+
+    def observe(self, model_name: str, request_type: str, latency: float) -> None:
+        """Record the latency of a call.
+
+        Calls cancelled because the other side of a hedge won are recorded
+        with their elapsed time, a lower bound, so slow calls still count.
+        """
+        if request_type in self.request_types:
+            self._latencies.setdefault(model_name, deque(maxlen=self.window)).append(latency)
+
+    def delay(self, model_name: str) -> Optional[float]:
+        """Seconds to wait before hedging a call, or None without enough latency data."""
+        latencies = self._latencies.get(model_name)
+        if latencies is None or len(latencies) < self.min_samples:
+            return None
+        ordered = sorted(latencies)
+        index = min(len(ordered) - 1, math.ceil(self.percentile * len(ordered)) - 1)
+        return max(self.min_delay, ordered[index])
+
+    def record_request(self) -> None:
+        self.requests += 1
+
+    def try_hedge(self) -> bool:
+        """Claim a hedge from the budget if one is available."""
+        if self.fired + 1 > self.budget * self.requests:
+            return False
+        self.fired += 1
+        return True
+
+    def record_win(self) -> None:
+        self.won += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Get hedging statistics."""
+        return {
+            "budget": self.budget,
+            "requests": self.requests,
+            "hedges_fired": self.fired,
+            "hedges_won": self.won,
+            "delay_ms": {
+                name: delay * 1000
+                for name, delay in ((name, self.delay(name)) for name in self._latencies)
+                if delay is not None
+            }
+        }
@@ -0,0 +1,61 @@
+from typing import Optional, Type
+from types import ModuleType
+import importlib
+import os
+import httpx
+
+class HTTPClientConfig:
+    """Connection pool and timeout settings for provider HTTP clients."""
+
+    def __init__(
+        self,
+        pool_size: int = 20,
+        keepalive_expiry: float = 60.0,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 120.0
+    ):
+        self.pool_size = pool_size
+        self.keepalive_expiry = keepalive_expiry
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+
+    @classmethod
+    def from_env(cls) -> "HTTPClientConfig":
+        """Build a config from HTTP_* environment variables."""
+        return cls(
+            pool_size=int(os.getenv("HTTP_POOL_SIZE", "20")),
+            keepalive_expiry=float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60")),
+            connect_timeout=float(os.getenv("HTTP_CONNECT_TIMEOUT", "5")),
+            read_timeout=float(os.getenv("HTTP_READ_TIMEOUT", "120"))
+        )
+
+def _httpx_module(client_class: Type[httpx.AsyncClient]) -> ModuleType:
+    """The httpx distribution a client class is built on; SDKs may ship their own fork."""
+    for base in client_class.__mro__:
+        if base.__name__ == "AsyncClient":
+            return importlib.import_module(base.__module__.split(".")[0])
+    return httpx
+
+def create_http_client(
+    config: Optional[HTTPClientConfig] = None,
+    client_class: Type[httpx.AsyncClient] = httpx.AsyncClient
+) -> httpx.AsyncClient:
+    """Create a long-lived pooled async HTTP client with keep-alive.
+
+    Provider SDKs pass their own ``DefaultAsyncHttpxClient`` subclass so the
+    SDK's default settings (redirects, transport) are kept.
+    """
+    config = config or HTTPClientConfig.from_env()
+    # Limits and timeouts must come from the same package as the client class
+    client_httpx = _httpx_module(client_class)
+    return client_class(
+        limits=client_httpx.Limits(
+            max_connections=config.pool_size,
+            max_keepalive_connections=config.pool_size,
+            keepalive_expiry=config.keepalive_expiry
+        ),
+        timeout=client_httpx.Timeout(
+            config.read_timeout,
+            connect=config.connect_timeout
+        )
+    )
@@ -1,5 +1,30 @@
-from typing import Dict, Optional
+from typing import Dict, Any, Optional, List, AsyncGenerator, AsyncIterator, Callable
+import asyncio
+import time
 from .base import AIModel
+from .cache import AnalysisCache
+from .health import ModelHealth
+from .hedging import HedgePolicy
+from .scheduler import RateLimitScheduler, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND, get_retry_after
+from .singleflight import SingleFlight
+from .structured_output import parse_json
+from .tokens import estimate_tokens, estimate_message_tokens
+from ..monitoring.tracing import span
+from ..monitoring.metrics import (
+    MODEL_REQUESTS,
+    MODEL_REQUEST_DURATION,
+    MODEL_IN_FLIGHT,
+    MODEL_ERRORS,
+    MODEL_HEDGES,
+    MODEL_HEDGE_WINS,
+    error_type
+)
+
+# Logical roles that callers route to instead of hardcoding model names
+ROLE_CHAT = "chat"
+ROLE_CODE_ANALYSIS = "code_analysis"
+ROLE_CODE_IMPROVEMENT = "code_improvement"
+ROLE_LEARNING = "learning"
 
 class ModelNotFoundError(Exception):
     """Raised when requested model is not found."""
@@ -7,27 +32,447 @@ class ModelNotFoundError(Exception):
 
 class ModelRouter:
     """Routes requests to appropriate AI models."""
-    
-    def __init__(self):
+
+    # Request types whose results only depend on the submitted code
+    CACHEABLE_REQUEST_TYPES = {"code_analysis", "code_suggestions"}
+
+    # Completion tokens reserved against tokens-per-minute limits when max_tokens is not given
+    DEFAULT_COMPLETION_TOKENS = 2000
+
+    def __init__(
+        self,
+        cache: Optional[AnalysisCache] = None,
+        attempt_timeout: Optional[float] = 90.0,
+        scheduler: Optional[RateLimitScheduler] = None,
+        hedging: Optional[HedgePolicy] = None
+    ):
         self.models: Dict[str, AIModel] = {}
+        self.pools: Dict[str, List[str]] = {}
+        self.health: Dict[str, ModelHealth] = {}
+        self.cache = cache
+        self.scheduler = scheduler
+        self.single_flight = SingleFlight()
+        # Time after which a slow call is abandoned in favour of the next candidate
+        self.attempt_timeout = attempt_timeout
+        self.failovers = 0
+        self.hedging = hedging
+        # Calls in progress per model object, so replaced clients are only closed once idle
+        self._active: Dict[AIModel, int] = {}
+        self._retired: set = set()
+        self._closing: set = set()
+
+    def register_model(self, name: str, model: AIModel, roles: Optional[List[str]] = None) -> None:
+        """Register a new model with the router, optionally serving some roles.
 
-    def register_model(self, name: str, model: AIModel) -> None:
-        """Register a new model with the router."""
+        A model already registered under the name is swapped out; its client
+        is closed once the calls still using it have finished.
+        """
+        previous = self.models.get(name)
         self.models[name] = model
+        self.health.setdefault(name, ModelHealth())
+        if previous is not None and previous is not model:
+            self._retire(previous)
+        for role in roles or []:
+            pool = self.pools.setdefault(role, [])
+            if name not in pool:
+                pool.append(name)
+
+    async def unregister_model(self, name: str) -> bool:
+        """Remove a model from the router and close its client."""
+        model = self.models.pop(name, None)
+        if model is None:
+            return False
+        self.health.pop(name, None)
+        for pool in self.pools.values():
+            if name in pool:
+                pool.remove(name)
+        if self._active.get(model, 0):
+            # Close once the calls still using the client have finished
+            self._retired.add(model)
+        else:
+            await model.aclose()
+        return True
+
+    async def aclose(self) -> None:
+        """Unregister all models and close their clients."""
+        for name in list(self.models):
+            await self.unregister_model(name)
+
+    def _retire(self, model: AIModel) -> None:
+        """Close a removed model's client as soon as no call is using it."""
+        if self._active.get(model, 0):
+            self._retired.add(model)
+            return
+        task = asyncio.get_running_loop().create_task(model.aclose())
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    def _checkout(self, model: AIModel) -> None:
+        self._active[model] = self._active.get(model, 0) + 1
+
+    def _release(self, model: AIModel) -> None:
+        remaining = self._active.get(model, 1) - 1
+        if remaining > 0:
+            self._active[model] = remaining
+            return
+        self._active.pop(model, None)
+        if model in self._retired:
+            self._retired.discard(model)
+            self._retire(model)
 
     def get_model(self, name: str) -> Optional[AIModel]:
         """Get a model by name."""
         return self.models.get(name)
 
+    def get_candidates(self, name: str) -> List[str]:
+        """Resolve a model or role name to model names, best candidate first."""
+        if name not in self.pools:
+            return [name] if name in self.models else []
+
+        pool = [model_name for model_name in self.pools[name] if model_name in self.models]
+        # Healthy models ordered by score; models with an open circuit only as a last resort
+        return sorted(
+            pool,
+            key=lambda model_name: (
+                not self.health[model_name].is_available(),
+                self.health[model_name].score()
+            )
+        )
+
     async def route_request(self, model_name: str, request_type: str, **kwargs):
-        """Route a request to the appropriate model and method."""
-        model = self.get_model(model_name)
-        if not model:
+        """Route a request to the appropriate model and method.
+
+        ``model_name`` may be a registered model or a role; roles fail over to
+        the next healthiest model when a call errors or times out. Concurrent
+        identical analysis requests of the same priority share a single
+        in-flight call; chat requests are never coalesced. ``priority`` selects
+        the scheduler class (background unless given). With a hedge policy,
+        interactive requests that are slower than usual get a duplicate call
+        to an equivalent model and the first answer wins.
+        """
+        priority = kwargs.pop("priority", PRIORITY_BACKGROUND)
+        if request_type not in self.CACHEABLE_REQUEST_TYPES:
+            return await self._route_request(model_name, request_type, priority, **kwargs)
+        key = SingleFlight.make_key(model_name, request_type, priority=priority, **kwargs)
+        return await self.single_flight.do(
+            key,
+            lambda: self._route_request(model_name, request_type, priority, **kwargs)
+        )
+
+    async def _route_request(self, model_name: str, request_type: str, priority: int, **kwargs):
+        """Route a single request across the candidate models."""
+        candidates = self.get_candidates(model_name)
+        if not candidates:
             raise ModelNotFoundError(f"Model {model_name} not found")
-        
+
+        prompt_version = kwargs.pop("prompt_version", None)
+
+        cache_keys = self._cache_keys(candidates, request_type, prompt_version, kwargs)
+        for key in cache_keys.values():
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        last_error: Optional[Exception] = None
+        # Models already called for this request, including hedge targets
+        tried: set = set()
+        for index, candidate in enumerate(candidates):
+            if candidate in tried:
+                continue
+            if tried:
+                self.failovers += 1
+            tried.add(candidate)
+
+            # Only bound the attempt when there is somewhere else to go
+            timeout = self.attempt_timeout if index < len(candidates) - 1 else None
+            try:
+                if self._should_hedge(request_type, priority):
+                    result = await asyncio.wait_for(
+                        self._call_hedged(candidate, candidates[index + 1:], request_type, priority, tried, **kwargs),
+                        timeout
+                    )
+                else:
+                    result = await self._call_model(candidate, request_type, priority, timeout, **kwargs)
+            except asyncio.TimeoutError:
+                last_error = TimeoutError(f"Model {candidate} timed out after {timeout}s")
+                continue
+            except Exception as e:
+                last_error = e
+                continue
+
+            if candidate in cache_keys:
+                self.cache.set(cache_keys[candidate], result)
+            return result
+
+        raise last_error
+
+    def _should_hedge(self, request_type: str, priority: int) -> bool:
+        return (
+            self.hedging is not None
+            and priority == PRIORITY_INTERACTIVE
+            and self.hedging.applies_to(request_type)
+        )
+
+    async def _call_hedged(
+        self,
+        name: str,
+        alternates: List[str],
+        request_type: str,
+        priority: int,
+        tried: set,
+        **kwargs
+    ):
+        """Call a model, firing a duplicate call if it is slower than its recent p95.
+
+        The duplicate goes to the next available candidate, or to the same
+        model when there is none, and its target is added to tried. The
+        first successful answer is returned and the other call is cancelled.
+        """
+        self.hedging.record_request()
+        primary = asyncio.ensure_future(self._call_model(name, request_type, priority, None, **kwargs))
+        calls = {primary: name}
+        try:
+            delay = self.hedging.delay(name)
+            if delay is not None:
+                await asyncio.wait({primary}, timeout=delay)
+                if not primary.done() and self.hedging.try_hedge():
+                    available = [alt for alt in alternates if self.health[alt].is_available()]
+                    target = available[0] if available else name
+                    tried.add(target)
+                    MODEL_HEDGES.labels(model=target).inc()
+                    hedge = asyncio.ensure_future(self._call_model(target, request_type, priority, None, **kwargs))
+                    calls[hedge] = target
+
+            pending = set(calls)
+            last_error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for call in done:
+                    if call.exception() is None:
+                        if call is not primary:
+                            self.hedging.record_win()
+                            MODEL_HEDGE_WINS.labels(model=calls[call]).inc()
+                        return call.result()
+                    last_error = call.exception()
+            raise last_error
+        finally:
+            for call in calls:
+                if not call.done():
+                    call.cancel()
+
+    def get_cached(self, model_name: str, request_type: str, **kwargs) -> Optional[Any]:
+        """Return a cached result for a request without calling any model."""
+        prompt_version = kwargs.pop("prompt_version", None)
+        cache_keys = self._cache_keys(self.get_candidates(model_name), request_type, prompt_version, kwargs)
+        for key in cache_keys.values():
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        return None
+
+    def store_cached(self, model_name: str, request_type: str, result: Any, **kwargs) -> None:
+        """Cache a result for a request under the best candidate's key."""
+        prompt_version = kwargs.pop("prompt_version", None)
+        cache_keys = self._cache_keys(self.get_candidates(model_name)[:1], request_type, prompt_version, kwargs)
+        for key in cache_keys.values():
+            self.cache.set(key, result)
+
+    def _cache_keys(
+        self,
+        candidates: List[str],
+        request_type: str,
+        prompt_version: Optional[str],
+        kwargs: Dict[str, Any]
+    ) -> Dict[str, str]:
+        """Cache key per candidate, empty if the request type is not cached."""
+        if self.cache is None or request_type not in self.CACHEABLE_REQUEST_TYPES:
+            return {}
+        return {
+            candidate: AnalysisCache.make_key(
+                candidate,
+                request_type,
+                prompt_version or self.models[candidate].prompt_version,
+                kwargs.get("code", ""),
+                kwargs.get("changes", "")
+            )
+            for candidate in candidates
+        }
+
+    async def _call_model(
+        self,
+        name: str,
+        request_type: str,
+        priority: int,
+        timeout: Optional[float],
+        **kwargs
+    ):
+        """Call a single model, recording its latency and outcome."""
+        model = self.models[name]
+        self._checkout(model)
+        try:
+            with span("rate_limit_wait", provider=model.provider):
+                await self._acquire(model, priority, kwargs)
+
+            in_flight = MODEL_IN_FLIGHT.labels(model=name)
+            in_flight.inc()
+            started = time.monotonic()
+            try:
+                with span("model_call", model=name, request_type=request_type):
+                    result = await asyncio.wait_for(
+                        self._dispatch(model, request_type, **kwargs),
+                        timeout
+                    )
+            except asyncio.CancelledError:
+                # Abandoned, e.g. the other side of a hedge won
+                self._record_cancelled(name, request_type, started)
+                raise
+            except Exception as e:
+                self._record_failure(name, request_type, started, e)
+                raise
+            finally:
+                in_flight.dec()
+        finally:
+            self._release(model)
+        self._record_success(name, request_type, started)
+        return result
+
+    def _record_success(self, name: str, request_type: str, started: float) -> None:
+        """Record a successful model call in health tracking, scheduler and metrics."""
+        elapsed = time.monotonic() - started
+        self.health[name].record_success(elapsed)
+        if self.hedging is not None:
+            self.hedging.observe(name, request_type, elapsed)
+        if self.scheduler is not None:
+            self.scheduler.report_success(self.models[name].provider)
+        MODEL_REQUESTS.labels(model=name, request_type=request_type, outcome="success").inc()
+        MODEL_REQUEST_DURATION.labels(model=name, request_type=request_type).observe(elapsed)
+
+    def _record_cancelled(self, name: str, request_type: str, started: float) -> None:
+        """Record an abandoned model call; its elapsed time is a lower bound on its latency."""
+        elapsed = time.monotonic() - started
+        if name in self.health:
+            self.health[name].record_cancelled(elapsed)
+        if self.hedging is not None:
+            self.hedging.observe(name, request_type, elapsed)
+        MODEL_REQUESTS.labels(model=name, request_type=request_type, outcome="cancelled").inc()
+
+    def _record_failure(self, name: str, request_type: str, started: float, error: BaseException) -> None:
+        """Record a failed model call in health tracking, scheduler and metrics."""
+        elapsed = time.monotonic() - started
+        self.health[name].record_failure(elapsed)
+        MODEL_REQUESTS.labels(model=name, request_type=request_type, outcome="error").inc()
+        MODEL_REQUEST_DURATION.labels(model=name, request_type=request_type).observe(elapsed)
+        MODEL_ERRORS.labels(model=name, error_type=error_type(error)).inc()
+        if self.scheduler is not None and name in self.models:
+            retry_after = get_retry_after(error)
+            if retry_after is not None:
+                self.scheduler.report_rate_limit(self.models[name].provider, retry_after or None)
+
+    async def _acquire(self, model: AIModel, priority: int, kwargs: Dict[str, Any]) -> None:
+        """Wait for the provider's rate limits to admit a request."""
+        if self.scheduler is None:
+            return
+        tokens = kwargs.get("max_tokens", self.DEFAULT_COMPLETION_TOKENS)
+        if "messages" in kwargs:
+            tokens += estimate_message_tokens(kwargs["messages"])
+        else:
+            tokens += estimate_tokens(kwargs.get("code", "")) + estimate_tokens(kwargs.get("changes", ""))
+        await self.scheduler.acquire(model.provider, tokens, priority)
+
+    async def stream_request(self, model_name: str, **kwargs) -> AsyncGenerator[str, None]:
+        """Stream a chat response from the requested model token by token.
+
+        Roles fail over to the next candidate only if no token was sent yet.
+        """
+        priority = kwargs.pop("priority", PRIORITY_BACKGROUND)
+        async for token in self._stream(
+            model_name,
+            "stream",
+            priority,
+            lambda model: model.stream_response(**kwargs),
+            kwargs
+        ):
+            yield token
+
+    async def stream_analysis(
+        self,
+        model_name: str,
+        code: str,
+        priority: int = PRIORITY_BACKGROUND
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """Stream code analysis findings as soon as the model has written each one."""
+        async for event in self._stream(
+            model_name,
+            "code_analysis",
+            priority,
+            lambda model: model.stream_analysis(code),
+            {"code": code}
+        ):
+            yield event
+
+    async def _stream(
+        self,
+        model_name: str,
+        request_type: str,
+        priority: int,
+        open_stream: Callable[[AIModel], AsyncIterator[Any]],
+        kwargs: Dict[str, Any]
+    ) -> AsyncGenerator[Any, None]:
+        """Relay a model stream, failing over to the next candidate before anything was sent."""
+        candidates = self.get_candidates(model_name)
+        if not candidates:
+            raise ModelNotFoundError(f"Model {model_name} not found")
+
+        for index, candidate in enumerate(candidates):
+            model = self.models[candidate]
+            self._checkout(model)
+            in_flight = MODEL_IN_FLIGHT.labels(model=candidate)
+            streamed = False
+            started = time.monotonic()
+            try:
+                await self._acquire(model, priority, kwargs)
+                in_flight.inc()
+                started = time.monotonic()
+                try:
+                    async for item in open_stream(model):
+                        streamed = True
+                        yield item
+                finally:
+                    in_flight.dec()
+            except Exception as e:
+                self._record_failure(candidate, request_type, started, e)
+                if streamed or index == len(candidates) - 1:
+                    raise
+                self.failovers += 1
+                continue
+            finally:
+                self._release(model)
+            self._record_success(candidate, request_type, started)
+            return
+
+    async def _dispatch(self, model: AIModel, request_type: str, **kwargs):
+        """Call the model method matching the request type."""
         if request_type == "chat":
             return await model.generate_response(**kwargs)
         elif request_type == "code_analysis":
             return await model.analyze_code(**kwargs)
+        elif request_type == "code_suggestions":
+            kwargs.pop("code", None)
+            response = await model.generate_response(**kwargs)
+            # Parse here so a reply that is not valid JSON fails the call and is never cached
+            return parse_json(response, "object")
         else:
-            raise ValueError(f"Unknown request type: {request_type}")
\ No newline at end of file
+            raise ValueError(f"Unknown request type: {request_type}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Get routing statistics."""
+        return {
+            "models": list(self.models.keys()),
+            "pools": self.pools,
+            "health": {name: health.stats() for name, health in self.health.items()},
+            "failovers": self.failovers,
+            "hedging": self.hedging.stats() if self.hedging is not None else None,
+            "cache": self.cache.stats() if self.cache is not None else None,
+            "single_flight": self.single_flight.stats(),
+            "scheduler": self.scheduler.stats() if self.scheduler is not None else None
+        }
@@ -1,58 +1,68 @@
-from typing import List, Dict, Any
+from typing import List, Dict, AsyncGenerator, Optional
 import openai
 from .base import AIModel
+from .http_client import HTTPClientConfig, create_http_client
+from .tokens import estimate_tokens, estimate_message_tokens
+from ..monitoring.metrics import record_token_usage
 
 class OpenAIModel(AIModel):
     """OpenAI model implementation."""
     
-    def __init__(self, api_key: str):
-        """Initialize with API key."""
-        openai.api_key = api_key
+    provider = "openai"
+
+    def __init__(
+        self,
+        api_key: str,
+        default_model: str = "gpt-4",
+        http_config: Optional[HTTPClientConfig] = None
+    ):
+        """Initialize with API key and a pooled HTTP client owned by this model."""
+        self.client = openai.AsyncOpenAI(
+            api_key=api_key,
+            http_client=create_http_client(http_config, openai.DefaultAsyncHttpxClient)
+        )
+        self.default_model = default_model
 
     async def generate_response(self, messages: List[Dict[str, str]], **kwargs) -> str:
         """Generate a response using OpenAI's chat completion."""
+        model = kwargs.get('model', self.default_model)
         try:
-            response = await openai.ChatCompletion.acreate(
-                model=kwargs.get('model', 'gpt-4'),
+            response = await self.client.chat.completions.create(
+                model=model,
                 messages=messages,
                 temperature=kwargs.get('temperature', 0.7),
                 max_tokens=kwargs.get('max_tokens', 2000)
             )
+            if response.usage is not None:
+                record_token_usage(model, response.usage.prompt_tokens, response.usage.completion_tokens)
             return response.choices[0].message.content
         except Exception as e:
             raise Exception(f"OpenAI API error: {str(e)}")
 
-    async def analyze_code(self, code: str, **kwargs) -> Dict[str, Any]:
-        """Analyze code using OpenAI."""
+    def _analysis_messages(self, code: str) -> List[Dict[str, str]]:
+        """Build the code analysis prompt for OpenAI."""
         prompt = f"""Analyze the following code and provide insights:
         
         {code}
         
-        Please provide:
-        1. Potential issues or bugs
-        2. Security concerns
-        3. Performance considerations
-        4. Suggested improvements
-        
-        Format the response as a JSON object with these categories as keys."""
+        Format the response as a JSON object with these keys:
+        - potential_issues: List of potential bugs or issues
+        - security_concerns: List of security considerations
+        - performance_notes: List of performance-related observations
+        - improvement_suggestions: List of specific improvements"""
 
-        messages = [
+        return [
             {"role": "system", "content": "You are a code analysis expert. Provide detailed, actionable insights."},
             {"role": "user", "content": prompt}
         ]
 
-        try:
-            response = await self.generate_response(messages)
-            # Note: The response should be valid JSON string
-            return eval(response)  # In production, use proper JSON parsing with error handling
-        except Exception as e:
-            raise Exception(f"Code analysis failed: {str(e)}")
-
     async def stream_response(self, messages: List[Dict[str, str]], **kwargs) -> AsyncGenerator[str, None]:
         """Stream response tokens from OpenAI."""
+        model = kwargs.get('model', self.default_model)
+        completion_tokens = 0
         try:
-            stream = await openai.ChatCompletion.acreate(
-                model=kwargs.get('model', 'gpt-4'),
+            stream = await self.client.chat.completions.create(
+                model=model,
                 messages=messages,
                 temperature=kwargs.get('temperature', 0.7),
                 max_tokens=kwargs.get('max_tokens', 2000),
@@ -60,7 +70,15 @@ class OpenAIModel(AIModel):
             )
             
             async for chunk in stream:
-                if chunk and chunk.choices and chunk.choices[0].delta.get('content'):
+                if chunk.choices and chunk.choices[0].delta.content:
+                    completion_tokens += estimate_tokens(chunk.choices[0].delta.content)
                     yield chunk.choices[0].delta.content
         except Exception as e:
-            raise Exception(f"OpenAI streaming error: {str(e)}")
\ No newline at end of file
+            raise Exception(f"OpenAI streaming error: {str(e)}")
+        finally:
+            # Streamed responses carry no usage block, so token counts are estimated
+            record_token_usage(model, estimate_message_tokens(messages), completion_tokens)
+
+    async def aclose(self) -> None:
+        """Close the model's HTTP connection pool."""
+        await self.client.close()
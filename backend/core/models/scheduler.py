@@ -0,0 +1,195 @@
+from typing import Dict, Any, Optional, List, Tuple
+import asyncio
+import heapq
+import itertools
+import time
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_BACKGROUND: "background"}
+
+class TokenBucket:
+    """Token bucket refilled continuously at a per-minute rate."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def time_until(self, amount: float) -> float:
+        """Seconds until amount can be consumed (0 if available now)."""
+        self.refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float) -> None:
+        self.tokens -= min(amount, self.capacity)
+
+class ProviderQueue:
+    """Rate limits and prioritized waiters for a single provider."""
+
+    def __init__(self, requests_per_minute: Optional[int], tokens_per_minute: Optional[int]):
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.waiters: List[Tuple[int, int, float, asyncio.Future]] = []
+        self.backoff_until = 0.0
+        self.consecutive_rate_limits = 0
+        self.pump: Optional[asyncio.Task] = None
+        self.rate_limited = 0
+        self.wait_totals: Dict[int, float] = {}
+        self.wait_counts: Dict[int, int] = {}
+        self.wait_max: Dict[int, float] = {}
+
+    def time_until_ready(self, tokens: float) -> float:
+        delay = max(0.0, self.backoff_until - time.monotonic())
+        if self.request_bucket is not None:
+            delay = max(delay, self.request_bucket.time_until(1))
+        if self.token_bucket is not None:
+            delay = max(delay, self.token_bucket.time_until(tokens))
+        return delay
+
+    def consume(self, tokens: float) -> None:
+        if self.request_bucket is not None:
+            self.request_bucket.consume(1)
+        if self.token_bucket is not None:
+            self.token_bucket.consume(tokens)
+
+    def record_wait(self, priority: int, waited: float) -> None:
+        self.wait_totals[priority] = self.wait_totals.get(priority, 0.0) + waited
+        self.wait_counts[priority] = self.wait_counts.get(priority, 0) + 1
+        self.wait_max[priority] = max(self.wait_max.get(priority, 0.0), waited)
+
+class RateLimitScheduler:
+    """Per-provider token-bucket scheduler with priority classes.
+
+    Requests acquire a slot before they reach the provider. Requests per
+    minute and tokens per minute are both enforced, waiting interactive
+    requests are always admitted before background ones, and providers that
+    answer with rate-limit errors are paused for the advertised retry delay
+    (or an exponential backoff).
+    """
+
+    MAX_BACKOFF = 60.0
+
+    def __init__(self, limits: Optional[Dict[str, Dict[str, int]]] = None):
+        self.providers: Dict[str, ProviderQueue] = {}
+        self._sequence = itertools.count()
+        for provider, limit in (limits or {}).items():
+            self.set_limits(provider, limit.get("rpm"), limit.get("tpm"))
+
+    def set_limits(
+        self,
+        provider: str,
+        requests_per_minute: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None
+    ) -> None:
+        """Configure the rate limits for a provider."""
+        self.providers[provider] = ProviderQueue(requests_per_minute, tokens_per_minute)
+
+    async def acquire(self, provider: str, tokens: float = 0, priority: int = PRIORITY_BACKGROUND) -> None:
+        """Wait until a request of the given token size may be sent to the provider."""
+        queue = self.providers.get(provider)
+        if queue is None:
+            return
+
+        if not queue.waiters and queue.time_until_ready(tokens) == 0:
+            queue.consume(tokens)
+            queue.record_wait(priority, 0.0)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(queue.waiters, (priority, next(self._sequence), tokens, future))
+        if queue.pump is None or queue.pump.done():
+            queue.pump = asyncio.get_running_loop().create_task(self._pump(queue))
+
+        enqueued_at = time.monotonic()
+        await future
+        queue.record_wait(priority, time.monotonic() - enqueued_at)
+
+    def report_success(self, provider: str) -> None:
+        """Reset the backoff after a request went through."""
+        queue = self.providers.get(provider)
+        if queue is not None:
+            queue.consecutive_rate_limits = 0
+
+    def report_rate_limit(self, provider: str, retry_after: Optional[float] = None) -> None:
+        """Pause a provider after it answered with a rate-limit error."""
+        queue = self.providers.get(provider)
+        if queue is None:
+            return
+        queue.rate_limited += 1
+        queue.consecutive_rate_limits += 1
+        if retry_after is None:
+            retry_after = min(self.MAX_BACKOFF, 2 ** (queue.consecutive_rate_limits - 1))
+        queue.backoff_until = max(queue.backoff_until, time.monotonic() + retry_after)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get queue depth and wait-time statistics per provider."""
+        stats = {}
+        for provider, queue in self.providers.items():
+            depth = {name: 0 for name in PRIORITY_NAMES.values()}
+            for priority, _, _, future in queue.waiters:
+                if not future.done():
+                    depth[PRIORITY_NAMES.get(priority, str(priority))] += 1
+            stats[provider] = {
+                "queue_depth": depth,
+                "avg_wait_ms": {
+                    PRIORITY_NAMES.get(p, str(p)): queue.wait_totals[p] / queue.wait_counts[p] * 1000
+                    for p in queue.wait_counts
+                },
+                "max_wait_ms": {
+                    PRIORITY_NAMES.get(p, str(p)): wait * 1000 for p, wait in queue.wait_max.items()
+                },
+                "rate_limited": queue.rate_limited,
+                "backoff_remaining_s": max(0.0, queue.backoff_until - time.monotonic())
+            }
+        return stats
+
+    async def _pump(self, queue: ProviderQueue) -> None:
+        """Admit waiters in priority order as capacity becomes available."""
+        while queue.waiters:
+            priority, _, tokens, future = queue.waiters[0]
+            if future.done():
+                # Waiter was cancelled while queued
+                heapq.heappop(queue.waiters)
+                continue
+
+            delay = queue.time_until_ready(tokens)
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+
+            heapq.heappop(queue.waiters)
+            queue.consume(tokens)
+            future.set_result(None)
+
+def get_retry_after(error: BaseException) -> Optional[float]:
+    """Return the retry delay if error (or its cause) is a rate-limit error.
+
+    Returns 0.0 for rate-limit errors without a usable Retry-After header and
+    None for any other error.
+    """
+    seen = set()
+    current: Optional[BaseException] = error
+    while current is not None and id(current) not in seen:
+        seen.add(id(current))
+        status = getattr(current, "status_code", None) or getattr(current, "http_status", None)
+        if status == 429 or "RateLimit" in type(current).__name__:
+            headers = getattr(current, "headers", None)
+            if headers is None:
+                headers = getattr(getattr(current, "response", None), "headers", None)
+            try:
+                return float((headers or {}).get("retry-after", 0))
+            except (TypeError, ValueError):
+                return 0.0
+        current = current.__cause__ or current.__context__
+    return None
@@ -0,0 +1,40 @@
+from typing import Dict, Any, Callable, Awaitable
+import asyncio
+import hashlib
+import json
+
+class SingleFlight:
+    """Coalesces concurrent identical calls into one shared in-flight execution."""
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.executed = 0
+        self.deduplicated = 0
+
+    @staticmethod
+    def make_key(*parts: Any, **kwargs: Any) -> str:
+        """Build a key from positional parts and normalized keyword arguments."""
+        raw = json.dumps([parts, kwargs], sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run fn for key, or join the execution already in flight for it."""
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(fn())
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+            self.executed += 1
+        else:
+            self.deduplicated += 1
+
+        # Shield so one cancelled caller does not cancel the work shared with the others
+        return await asyncio.shield(future)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get coalescing statistics."""
+        return {
+            "executed": self.executed,
+            "deduplicated": self.deduplicated,
+            "in_flight": len(self._inflight)
+        }
@@ -0,0 +1,253 @@
+from typing import Dict, Any, List, Optional, AsyncIterator, AsyncGenerator
+import ast
+import json
+import math
+import re
+
+class StructuredOutputError(Exception):
+    """Raised when no usable JSON value can be recovered from model output."""
+    pass
+
+# Opening "key": of an object member
+KEY_PATTERN = re.compile(r'^\s*("(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\')\s*:\s*$', re.S)
+
+CLOSERS = {"{": "}", "[": "]"}
+
+def strip_trailing_commas(text: str) -> str:
+    """Remove commas directly before a closing bracket, outside of strings."""
+    result = []
+    in_string: Optional[str] = None
+    escape = False
+    for char in text:
+        if in_string:
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == in_string:
+                in_string = None
+        elif char in "\"'":
+            in_string = char
+        elif char in "}]":
+            while result and result[-1].isspace():
+                result.pop()
+            if result and result[-1] == ",":
+                result.pop()
+        result.append(char)
+    return "".join(result)
+
+def _finite(value: Any) -> Any:
+    """Replace NaN and infinite floats with None so the value re-serializes as valid JSON."""
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(item) for item in value]
+    return value
+
+def loads_tolerant(text: str) -> Any:
+    """Parse a JSON value, accepting trailing commas and Python-style literals.
+
+    NaN and infinite numbers become None.
+    """
+    try:
+        return _finite(json.loads(text))
+    except ValueError:
+        pass
+    repaired = strip_trailing_commas(text)
+    try:
+        return _finite(json.loads(repaired))
+    except ValueError:
+        pass
+    try:
+        # Single quotes, True/False/None; literal_eval never executes code
+        return _finite(ast.literal_eval(repaired.strip()))
+    except (ValueError, SyntaxError, MemoryError, RecursionError):
+        raise StructuredOutputError(f"Unparseable JSON fragment: {text[:80]!r}")
+
+class _Frame:
+    """An open object or array while scanning."""
+
+    def __init__(self, kind: str, member_start: int, key: Any = None):
+        self.kind = kind
+        self.member_start = member_start
+        # Key of this container in the root object, for containers nested one level deep
+        self.key = key
+        self.count = 0
+
+class JSONStreamParser:
+    """Incremental, tolerant parser for a JSON value embedded in model output.
+
+    Text is fed as it streams in. Anything before the first opening bracket
+    (prose, markdown code fences) and after the matching close is ignored.
+    Each top-level member is parsed as soon as it closes and reported as an
+    event, as is each item of an array nested directly under the root:
+
+    - ``{"type": "field", "key": key, "value": value}`` for a member of a
+      root object, or an item of a root array (key is its position in the
+      output, counting skipped items)
+    - ``{"type": "item", "key": key, "value": value}`` for an item of an
+      array stored under ``key`` in a root object
+
+    Members that cannot be parsed are skipped and counted in ``errors``
+    instead of failing the whole response. ``close`` recovers what it can
+    from output that was cut off.
+    """
+
+    def __init__(self, expect: Optional[str] = None):
+        # "object" or "array" to skip brackets of the other kind before the value
+        self.expect = expect
+        self._text = ""
+        self._pos = 0
+        self._stack: List[_Frame] = []
+        self._in_string: Optional[str] = None
+        self._escape = False
+        self.started = False
+        self.done = False
+        self.value: Any = None
+        self.errors = 0
+        # Position of the next item of a root array in the output
+        self._root_index = 0
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        """Consume more output, returning the events completed by it."""
+        if self.done:
+            return []
+        self._text += text
+        events: List[Dict[str, Any]] = []
+        text = self._text
+        while self._pos < len(text) and not self.done:
+            char = text[self._pos]
+            if not self.started:
+                if self._opens_root(char):
+                    self.started = True
+                    self.value = {} if char == "{" else []
+                    self._stack.append(_Frame(char, self._pos + 1))
+                self._pos += 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == self._in_string:
+                    self._in_string = None
+            elif char in "\"'":
+                self._in_string = char
+            elif char in "{[":
+                key = None
+                if len(self._stack) == 1 and self._stack[0].kind == "{":
+                    key = self._member_key(self._stack[0].member_start, self._pos)
+                self._stack.append(_Frame(char, self._pos + 1, key))
+            elif char == ",":
+                self._complete_member(self._pos, events)
+                self._stack[-1].member_start = self._pos + 1
+            elif char in "}]":
+                self._complete_member(self._pos, events)
+                self._stack.pop()
+                if not self._stack:
+                    self.done = True
+            self._pos += 1
+        return events
+
+    def close(self) -> List[Dict[str, Any]]:
+        """Finish parsing, salvaging the member that was being written if output was cut off."""
+        if self.done or not self.started:
+            self.done = True
+            return []
+        events: List[Dict[str, Any]] = []
+        root = self._stack[0]
+        fragment = self._text[root.member_start:]
+        if self._in_string:
+            fragment += self._in_string
+        # Close the containers still open inside the pending member
+        for frame in reversed(self._stack[1:]):
+            fragment = fragment.rstrip().rstrip(",:") + CLOSERS[frame.kind]
+        self._emit_root_member(fragment, events)
+        self._stack.clear()
+        self.done = True
+        return events
+
+    def result(self) -> Any:
+        """The value assembled from all parsed members."""
+        if not self.started:
+            raise StructuredOutputError("No JSON value found in model output")
+        return self.value
+
+    def _opens_root(self, char: str) -> bool:
+        if self.expect == "object":
+            return char == "{"
+        if self.expect == "array":
+            return char == "["
+        return char in "{["
+
+    def _member_key(self, start: int, end: int) -> Any:
+        match = KEY_PATTERN.match(self._text[start:end])
+        if match is None:
+            return None
+        try:
+            return loads_tolerant(match.group(1))
+        except StructuredOutputError:
+            return None
+
+    def _complete_member(self, end: int, events: List[Dict[str, Any]]) -> None:
+        frame = self._stack[-1]
+        fragment = self._text[frame.member_start:end]
+        if len(self._stack) == 1:
+            self._emit_root_member(fragment, events)
+        elif len(self._stack) == 2 and frame.kind == "[" and frame.key is not None and fragment.strip():
+            try:
+                item = loads_tolerant(fragment)
+            except StructuredOutputError:
+                self.errors += 1
+                return
+            events.append({"type": "item", "key": frame.key, "value": item})
+
+    def _emit_root_member(self, fragment: str, events: List[Dict[str, Any]]) -> None:
+        if not fragment.strip():
+            return
+        root = self._stack[0]
+        try:
+            if root.kind == "{":
+                member = loads_tolerant("{" + fragment + "}")
+                if not isinstance(member, dict):
+                    raise StructuredOutputError("Object member did not parse to a mapping")
+            else:
+                index = self._root_index
+                self._root_index += 1
+                member = {index: loads_tolerant(fragment)}
+        except StructuredOutputError:
+            self.errors += 1
+            return
+        for key, value in member.items():
+            if root.kind == "{":
+                self.value[key] = value
+            else:
+                self.value.append(value)
+            events.append({"type": "field", "key": key, "value": value})
+
+def parse_json(text: str, expect: Optional[str] = None) -> Any:
+    """Parse the JSON value in a complete model response, tolerating common defects."""
+    parser = JSONStreamParser(expect)
+    parser.feed(text)
+    parser.close()
+    value = parser.result()
+    if not value and parser.errors:
+        raise StructuredOutputError("No part of the JSON value in model output could be parsed")
+    return value
+
+async def parse_stream(
+    tokens: AsyncIterator[str],
+    expect: Optional[str] = None
+) -> AsyncGenerator[Dict[str, Any], None]:
+    """Yield parser events from a token stream as soon as each member closes."""
+    parser = JSONStreamParser(expect)
+    async for token in tokens:
+        for event in parser.feed(token):
+            yield event
+        if parser.done:
+            break
+    for event in parser.close():
+        yield event
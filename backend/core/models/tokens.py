@@ -0,0 +1,16 @@
+from typing import List, Dict
+
+# Average number of characters per token for English text and code
+CHARS_PER_TOKEN = 4
+# Per-message formatting overhead added by chat APIs
+MESSAGE_OVERHEAD_TOKENS = 4
+
+def estimate_tokens(text: str) -> int:
+    """Roughly estimate the number of tokens in a text."""
+    if not text:
+        return 0
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+def estimate_message_tokens(messages: List[Dict[str, str]]) -> int:
+    """Roughly estimate the number of prompt tokens for chat messages."""
+    return sum(estimate_tokens(m.get("content", "")) + MESSAGE_OVERHEAD_TOKENS for m in messages)
@@ -0,0 +1,95 @@
+from typing import Dict, Any, Optional
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+
+logger = logging.getLogger(__name__)
+
+class EventLoopLagMonitor:
+    """Detects and reports code that blocks the asyncio event loop.
+
+    A heartbeat task on the loop measures how late its own wakeups are, while
+    a watchdog thread notices a stalled heartbeat and captures the loop
+    thread's stack so the blocking handler can be identified.
+    """
+
+    def __init__(self, threshold: float = 0.1, interval: float = 0.05):
+        self.threshold = threshold
+        self.interval = interval
+        self.max_lag = 0.0
+        self.last_lag = 0.0
+        self.blocked_count = 0
+        self.last_blocking_stack: Optional[str] = None
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def start(self) -> None:
+        """Start monitoring the running event loop."""
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        """Stop monitoring."""
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Get event loop lag statistics in milliseconds."""
+        return {
+            "threshold_ms": self.threshold * 1000,
+            "last_lag_ms": self.last_lag * 1000,
+            "max_lag_ms": self.max_lag * 1000,
+            "blocked_count": self.blocked_count,
+            "last_blocking_stack": self.last_blocking_stack
+        }
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - started - self.interval)
+            self._heartbeat = time.monotonic()
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            if lag > self.threshold:
+                self.blocked_count += 1
+                logger.warning("Event loop was blocked for %.1f ms", lag * 1000)
+
+    def _watch(self) -> None:
+        reported_heartbeat = None
+        while not self._stopped.wait(self.interval):
+            heartbeat = self._heartbeat
+            stalled_for = time.monotonic() - heartbeat
+            if stalled_for <= self.threshold or heartbeat == reported_heartbeat:
+                continue
+
+            # Report each stall once, with the stack of the code holding the loop
+            reported_heartbeat = heartbeat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            self.last_blocking_stack = "".join(traceback.format_stack(frame))
+            logger.warning(
+                "Event loop blocked for more than %.1f ms, currently executing:\n%s",
+                stalled_for * 1000,
+                self.last_blocking_stack
+            )
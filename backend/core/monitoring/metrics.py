@@ -0,0 +1,290 @@
+from typing import Dict, Any, List, Tuple, Callable, Sequence
+import bisect
+import threading
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(labels: Sequence[Tuple[str, str]]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+class Metric:
+    """Base class for labelled metrics rendered in Prometheus text format."""
+
+    metric_type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], Any] = {}
+
+    def labels(self, **labels: Any) -> "_BoundMetric":
+        """Bind label values, returning an object with the metric's update methods."""
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        return _BoundMetric(self, key)
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.metric_type}"
+        ]
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_sample(list(zip(self.labelnames, key)), value))
+        return lines
+
+    def _render_sample(self, labels: List[Tuple[str, str]], value: Any) -> List[str]:
+        return [f"{self.name}{_format_labels(labels)} {_format_value(value)}"]
+
+class Counter(Metric):
+    """Monotonically increasing counter.
+
+    ``set`` mirrors a running total kept by a component (e.g. from a
+    collector); it must only be given values that never decrease.
+    """
+
+    metric_type = "counter"
+
+    def inc(self, amount: float = 1) -> None:
+        self._inc((), amount)
+
+    def set(self, value: float) -> None:
+        self._set((), value)
+
+    def _inc(self, key: Tuple[str, ...], amount: float) -> None:
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _set(self, key: Tuple[str, ...], value: float) -> None:
+        with self._lock:
+            self._values[key] = value
+
+class Gauge(Metric):
+    """Value that can go up and down."""
+
+    metric_type = "gauge"
+
+    def inc(self, amount: float = 1) -> None:
+        self._inc((), amount)
+
+    def dec(self, amount: float = 1) -> None:
+        self._inc((), -amount)
+
+    def set(self, value: float) -> None:
+        self._set((), value)
+
+    def _inc(self, key: Tuple[str, ...], amount: float) -> None:
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _set(self, key: Tuple[str, ...], value: float) -> None:
+        with self._lock:
+            self._values[key] = value
+
+class Histogram(Metric):
+    """Cumulative histogram with fixed buckets."""
+
+    metric_type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float) -> None:
+        self._observe((), value)
+
+    def _observe(self, key: Tuple[str, ...], value: float) -> None:
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                state["counts"][index] += 1
+            state["sum"] += value
+            state["count"] += 1
+
+    def _render_sample(self, labels: List[Tuple[str, str]], state: Dict[str, Any]) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, state["counts"]):
+            cumulative += count
+            lines.append(
+                f"{self.name}_bucket{_format_labels(labels + [('le', _format_value(bound))])} {cumulative}"
+            )
+        lines.append(f"{self.name}_bucket{_format_labels(labels + [('le', '+Inf')])} {state['count']}")
+        lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(state['sum'])}")
+        lines.append(f"{self.name}_count{_format_labels(labels)} {state['count']}")
+        return lines
+
+class _BoundMetric:
+    """A metric with its label values bound."""
+
+    def __init__(self, metric: Metric, key: Tuple[str, ...]):
+        self._metric = metric
+        self._key = key
+
+    def inc(self, amount: float = 1) -> None:
+        self._metric._inc(self._key, amount)
+
+    def dec(self, amount: float = 1) -> None:
+        self._metric._inc(self._key, -amount)
+
+    def set(self, value: float) -> None:
+        self._metric._set(self._key, value)
+
+    def observe(self, value: float) -> None:
+        self._metric._observe(self._key, value)
+
+class MetricsRegistry:
+    """Holds metrics and renders them in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        """Register a callback that refreshes gauges right before rendering."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Render all metrics."""
+        for collector in self._collectors:
+            collector()
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric: Metric) -> Any:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+def error_type(error: BaseException) -> str:
+    """Name of the original error type, looking through generic wrapper exceptions."""
+    while type(error) is Exception and (error.__cause__ or error.__context__) is not None:
+        error = error.__cause__ or error.__context__
+    return type(error).__name__
+
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUESTS = REGISTRY.counter(
+    "aiden_http_requests_total", "HTTP requests handled", ["route", "method", "status"]
+)
+HTTP_REQUEST_DURATION = REGISTRY.histogram(
+    "aiden_http_request_duration_seconds", "HTTP request latency until the response starts", ["route", "method"]
+)
+HTTP_IN_FLIGHT = REGISTRY.gauge(
+    "aiden_http_requests_in_flight", "HTTP requests currently being handled", ["route"]
+)
+HTTP_ERRORS = REGISTRY.counter(
+    "aiden_http_errors_total", "Unhandled errors raised by HTTP handlers", ["route", "error_type"]
+)
+MODEL_REQUESTS = REGISTRY.counter(
+    "aiden_model_requests_total", "Model calls", ["model", "request_type", "outcome"]
+)
+MODEL_REQUEST_DURATION = REGISTRY.histogram(
+    "aiden_model_request_duration_seconds", "Model call latency", ["model", "request_type"]
+)
+MODEL_IN_FLIGHT = REGISTRY.gauge(
+    "aiden_model_requests_in_flight", "Model calls currently in flight", ["model"]
+)
+MODEL_ERRORS = REGISTRY.counter(
+    "aiden_model_errors_total", "Failed model calls", ["model", "error_type"]
+)
+MODEL_HEDGES = REGISTRY.counter(
+    "aiden_model_hedges_total", "Duplicate calls fired for slow requests", ["model"]
+)
+MODEL_HEDGE_WINS = REGISTRY.counter(
+    "aiden_model_hedge_wins_total", "Hedged calls that answered before the original call", ["model"]
+)
+PROMPT_TOKENS = REGISTRY.counter(
+    "aiden_prompt_tokens_total", "Prompt tokens sent to providers", ["model"]
+)
+COMPLETION_TOKENS = REGISTRY.counter(
+    "aiden_completion_tokens_total", "Completion tokens received from providers", ["model"]
+)
+DISK_OPERATION_DURATION = REGISTRY.histogram(
+    "aiden_disk_operation_duration_seconds", "Latency of disk persistence operations", ["operation"]
+)
+
+def record_token_usage(model: str, prompt_tokens: int, completion_tokens: int) -> None:
+    """Count prompt and completion tokens for a model."""
+    PROMPT_TOKENS.labels(model=model).inc(prompt_tokens)
+    COMPLETION_TOKENS.labels(model=model).inc(completion_tokens)
+
+# Metrics refreshed from component stats by collectors at scrape time
+ANALYSIS_CACHE_LOOKUPS = REGISTRY.counter(
+    "aiden_analysis_cache_lookups_total", "Analysis cache lookups", ["result"]
+)
+ANALYSIS_CACHE_ENTRIES = REGISTRY.gauge(
+    "aiden_analysis_cache_entries", "Entries in the in-memory analysis cache"
+)
+DEDUPLICATED_REQUESTS = REGISTRY.counter(
+    "aiden_deduplicated_requests_total", "Requests served by joining an identical in-flight call", ["layer"]
+)
+MODEL_FAILOVERS = REGISTRY.counter(
+    "aiden_model_failovers_total", "Requests retried on the next candidate model"
+)
+SESSION_EVICTIONS = REGISTRY.counter(
+    "aiden_session_evictions_total", "Conversation sessions evicted from memory"
+)
+JOURNAL_FLUSHES = REGISTRY.counter(
+    "aiden_journal_flushes_total", "Batches written to the memory journal"
+)
+JOURNAL_SNAPSHOTS = REGISTRY.counter(
+    "aiden_journal_snapshots_total", "Session snapshots that compacted the memory journal"
+)
+LEARNING_INTERACTIONS = REGISTRY.counter(
+    "aiden_learning_interactions_total", "Interactions submitted for learning", ["outcome"]
+)
+SCHEDULER_QUEUE_DEPTH = REGISTRY.gauge(
+    "aiden_scheduler_queue_depth", "Requests waiting for provider rate limits", ["provider", "priority"]
+)
+LEARNING_STORE_ENTRIES = REGISTRY.gauge(
+    "aiden_learning_store_entries", "Learnings stored on disk"
+)
+LEARNING_QUEUE_DEPTH = REGISTRY.gauge(
+    "aiden_learning_queue_depth", "Interactions waiting for batched learning analysis"
+)
+LIVE_SESSIONS = REGISTRY.gauge(
+    "aiden_live_sessions", "Conversation sessions held in memory"
+)
@@ -0,0 +1,42 @@
+from typing import Dict
+from collections import Counter
+import sys
+import threading
+import time
+
+class SamplingProfiler:
+    """Samples the stacks of all threads and aggregates them as collapsed stacks.
+
+    The output is the "folded" format understood by flamegraph.pl and
+    speedscope: one ``frame;frame;frame count`` line per distinct stack.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+
+    def run(self, duration: float) -> Dict[str, int]:
+        """Sample for duration seconds (blocking the calling thread)."""
+        own_thread = threading.get_ident()
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        samples: Counter = Counter()
+        deadline = time.monotonic() + duration
+
+        while time.monotonic() < deadline:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({code.co_filename}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(thread_names.get(thread_id, str(thread_id)))
+                samples[";".join(reversed(stack))] += 1
+            time.sleep(self.interval)
+
+        return dict(samples)
+
+    @staticmethod
+    def collapse(samples: Dict[str, int]) -> str:
+        """Render samples in the collapsed-stack text format."""
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(samples.items()))
@@ -0,0 +1,95 @@
+from typing import Dict, Any, List, Optional, Iterator
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+import threading
+import time
+
+class Span:
+    """A timed stage of a request, possibly with nested child spans."""
+
+    def __init__(self, name: str, attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.attributes = attributes or {}
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.error: Optional[str] = None
+        self.children: List["Span"] = []
+
+    @property
+    def duration(self) -> float:
+        end = self.end if self.end is not None else time.perf_counter()
+        return end - self.start
+
+    def to_dict(self, origin: Optional[float] = None) -> Dict[str, Any]:
+        """Serialize the span tree with offsets relative to the root span."""
+        origin = self.start if origin is None else origin
+        result = {
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round(self.duration * 1000, 3),
+            "children": [child.to_dict(origin) for child in self.children]
+        }
+        if self.attributes:
+            result["attributes"] = self.attributes
+        if self.error:
+            result["error"] = self.error
+        return result
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+class Tracer:
+    """Context-variable based tracer keeping recent traces in a ring buffer."""
+
+    def __init__(self, max_traces: int = 200):
+        self._traces: deque = deque(maxlen=max_traces)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def trace(self, name: str, **attributes: Any) -> Iterator[Span]:
+        """Start a new trace (root span) for a request."""
+        root = Span(name, attributes)
+        token = _current_span.set(root)
+        try:
+            yield root
+        except BaseException as e:
+            root.error = type(e).__name__
+            raise
+        finally:
+            root.end = time.perf_counter()
+            _current_span.reset(token)
+            with self._lock:
+                self._traces.append(root)
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+        """Time a stage as a child of the current span; no-op outside a trace."""
+        parent = _current_span.get()
+        if parent is None:
+            yield None
+            return
+
+        span = Span(name, attributes)
+        parent.children.append(span)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = type(e).__name__
+            raise
+        finally:
+            span.end = time.perf_counter()
+            _current_span.reset(token)
+
+    def slowest(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Get the slowest traces among the recently recorded ones."""
+        with self._lock:
+            traces = list(self._traces)
+        traces.sort(key=lambda root: root.duration, reverse=True)
+        return [root.to_dict() for root in traces[:limit]]
+
+tracer = Tracer()
+
+def span(name: str, **attributes: Any):
+    """Time a stage of the current trace using the default tracer."""
+    return tracer.span(name, **attributes)
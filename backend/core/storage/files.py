@@ -0,0 +1,182 @@
+from typing import Dict, Any, List, Optional, Tuple, Iterator, AsyncIterator
+from pathlib import Path
+import asyncio
+import mmap
+import os
+import shutil
+import threading
+import uuid
+
+# Size of the chunks files are streamed in
+CHUNK_SIZE = 64 * 1024
+# Files at least this large are read through a memory map
+MMAP_THRESHOLD = 1024 * 1024
+
+class RangeNotSatisfiableError(Exception):
+    """Raised when a requested byte range lies outside the file."""
+    pass
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single-range ``Range: bytes=...`` header into inclusive offsets.
+
+    Returns None when there is no usable header (the whole file is sent) and
+    raises RangeNotSatisfiableError when the range lies outside the file.
+    Multi-range requests are answered with the whole file.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start_text, _, end_text = header[len("bytes="):].strip().partition("-")
+    try:
+        if not start_text:
+            # Suffix range: the last N bytes
+            length = int(end_text)
+            if length <= 0 or size == 0:
+                raise RangeNotSatisfiableError(header)
+            return max(0, size - length), size - 1
+        start = int(start_text)
+        end = int(end_text) if end_text else size - 1
+    except ValueError:
+        return None
+    if start >= size or start > end:
+        raise RangeNotSatisfiableError(header)
+    return start, min(end, size - 1)
+
+def iter_file(path: Path, start: int = 0, end: Optional[int] = None, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Yield bytes start..end (inclusive) of a file in fixed-size chunks.
+
+    Large files are read through a memory map so chunks are copied straight
+    from the page cache; memory use stays at one chunk either way.
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        end = size - 1 if end is None else min(end, size - 1)
+        if end < start:
+            return
+
+        if size >= MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                position = start
+                while position <= end:
+                    stop = min(position + chunk_size, end + 1)
+                    yield mapped[position:stop]
+                    position = stop
+            return
+
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+async def write_stream(path: Path, chunks: AsyncIterator[bytes]) -> int:
+    """Write streamed chunks to a file atomically, returning the bytes written.
+
+    Data goes to a temporary file next to the target, which replaces the
+    target only once the stream completed. Disk writes run in a worker
+    thread so slow disks do not stall the event loop.
+    """
+    await asyncio.to_thread(path.parent.mkdir, parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    written = 0
+    try:
+        f = await asyncio.to_thread(open, tmp_path, "wb")
+        try:
+            async for chunk in chunks:
+                if chunk:
+                    await asyncio.to_thread(f.write, chunk)
+                    written += len(chunk)
+        finally:
+            await asyncio.to_thread(f.close)
+        await asyncio.to_thread(os.replace, tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return written
+
+def atomic_write(path: Path, data: bytes, fsync: bool = True) -> None:
+    """Replace a file's contents so readers see either the old or the new version.
+
+    The data is written to a temporary file next to the target, flushed to
+    disk and renamed over the target; with fsync the directory entry is
+    synced too, so the new version also survives a crash.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            if fsync:
+                os.fsync(f.fileno())
+        if path.exists():
+            shutil.copymode(path, tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    if fsync and hasattr(os, "O_DIRECTORY"):
+        fd = os.open(path.parent, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+class DirectoryIndex:
+    """Sorted listing of a directory's files, rebuilt only when the directory changes.
+
+    The directory's mtime changes whenever entries are added, removed or
+    renamed, so the cached listing is reused until then. Rewriting an
+    existing file in place does not change it, and the mtime may not tick
+    between two quick changes, so writers call invalidate() after every
+    write; files changed by other processes keep their cached size and
+    mtime until the next rebuild.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self._entries: List[Dict[str, Any]] = []
+        self._mtime_ns: Optional[int] = None
+        self._lock = threading.Lock()
+        self.rebuilds = 0
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """Get the cached file entries, rebuilding them if the directory changed."""
+        mtime_ns = self.root.stat().st_mtime_ns
+        with self._lock:
+            if mtime_ns != self._mtime_ns:
+                self._entries = self._scan()
+                self._mtime_ns = mtime_ns
+                self.rebuilds += 1
+            return self._entries
+
+    def page(self, offset: int = 0, limit: Optional[int] = None) -> Dict[str, Any]:
+        """Get one page of the listing (everything from offset without a limit)."""
+        entries = self.entries()
+        return {
+            "files": entries[offset:] if limit is None else entries[offset:offset + limit],
+            "total": len(entries),
+            "offset": offset,
+            "limit": limit
+        }
+
+    def invalidate(self) -> None:
+        """Force a rebuild on the next access."""
+        with self._lock:
+            self._mtime_ns = None
+
+    def _scan(self) -> List[Dict[str, Any]]:
+        entries = []
+        with os.scandir(self.root) as it:
+            for entry in it:
+                # Skip in-progress uploads
+                if entry.name.startswith(".") and entry.name.endswith(".tmp"):
+                    continue
+                if entry.is_file():
+                    stat = entry.stat()
+                    entries.append({"name": entry.name, "size": stat.st_size, "modified": stat.st_mtime})
+        entries.sort(key=lambda entry: entry["name"])
+        return entries
@@ -0,0 +1,332 @@
+from abc import ABC, abstractmethod
+from typing import Dict, Any, List, Optional, Tuple, Callable, Awaitable
+from pathlib import Path
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+ChangeCallback = Callable[[str], Awaitable[None]]
+
+class SharedState(ABC):
+    """State shared by all worker processes serving the API.
+
+    Values are JSON documents grouped in namespaces; conversation sessions
+    are kept as append-only entry logs. Every write is recorded as a change,
+    and callbacks subscribed to a namespace run in each worker when another
+    worker changes it, so per-process caches built from the state (such as
+    model clients) can be rebuilt.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[str, List[ChangeCallback]] = {}
+
+    def subscribe(self, namespace: str, callback: ChangeCallback) -> None:
+        """Call callback with the changed key whenever another worker writes to namespace."""
+        self._subscribers.setdefault(namespace, []).append(callback)
+
+    async def _notify(self, namespace: str, key: str) -> None:
+        for callback in self._subscribers.get(namespace, []):
+            try:
+                await callback(key)
+            except Exception:
+                logger.exception("Change handler for %s/%s failed", namespace, key)
+
+    def start(self) -> None:
+        """Start delivering changes made by other workers."""
+        pass
+
+    async def stop(self) -> None:
+        """Stop delivering changes."""
+        pass
+
+    @abstractmethod
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        """Get a value, or None if it is not set."""
+        pass
+
+    @abstractmethod
+    def set(self, namespace: str, key: str, value: Any) -> None:
+        """Set a value."""
+        pass
+
+    @abstractmethod
+    def setdefault(self, namespace: str, key: str, value: Any) -> Any:
+        """Set a value unless one exists, returning whichever value is stored."""
+        pass
+
+    @abstractmethod
+    def delete(self, namespace: str, key: str) -> bool:
+        """Delete a value, returning whether it existed."""
+        pass
+
+    @abstractmethod
+    def items(self, namespace: str) -> Dict[str, Any]:
+        """Get all values in a namespace."""
+        pass
+
+    @abstractmethod
+    def append_session_entries(self, entries: List[Tuple[str, Dict[str, Any]]]) -> Dict[str, Tuple[int, int]]:
+        """Append (session_id, entry) pairs in one transaction.
+
+        Returns, per session, the sequence number of its newest entry before
+        the batch (0 if there was none) and of the last entry written.
+        """
+        pass
+
+    @abstractmethod
+    def session_entries(self, session_id: str, limit: int) -> Tuple[List[Dict[str, Any]], int]:
+        """Get a session's newest entries, oldest first, and the newest sequence number."""
+        pass
+
+    @abstractmethod
+    def session_versions(self, session_ids: List[str]) -> Dict[str, int]:
+        """Sequence number of each session's newest entry (0 for an empty session)."""
+        pass
+
+    @abstractmethod
+    def trim_sessions(self, keep: int) -> int:
+        """Drop all but each session's newest keep entries, returning the number dropped."""
+        pass
+
+class SQLiteSharedState(SharedState):
+    """Shared state in a local SQLite database in WAL mode.
+
+    Every worker opens its own connections to the same file: one for
+    writes and one for reads, so reads are not held up by a batch write in
+    progress. Changes made by other workers are picked up by polling the
+    change log, which is pruned after ``change_retention`` seconds.
+    """
+
+    def __init__(self, db_path: Path, poll_interval: float = 0.5, change_retention: float = 3600.0):
+        super().__init__()
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.poll_interval = poll_interval
+        self.change_retention = change_retention
+        # Identifies this worker's own writes in the change log
+        self.origin = uuid.uuid4().hex
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=10.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS state (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                PRIMARY KEY (namespace, key)
+            );
+            CREATE TABLE IF NOT EXISTS changes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                origin TEXT NOT NULL,
+                created REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS session_entries (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_session_entries_session
+                ON session_entries (session_id, id);
+        """)
+        self._conn.commit()
+        # WAL readers see the last committed state without waiting for the writer
+        self._read_lock = threading.Lock()
+        self._reader = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=10.0)
+        self._last_change = self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM changes").fetchone()[0]
+        self._task: Optional[asyncio.Task] = None
+        self.notifications = 0
+
+    def start(self) -> None:
+        """Start polling for other workers' changes on the running event loop."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._watch())
+
+    async def stop(self) -> None:
+        """Stop polling for changes."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        with self._read_lock:
+            row = self._reader.execute(
+                "SELECT value FROM state WHERE namespace = ? AND key = ?",
+                (namespace, key)
+            ).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def set(self, namespace: str, key: str, value: Any) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO state (namespace, key, value) VALUES (?, ?, ?)",
+                (namespace, key, json.dumps(value))
+            )
+            self._record_change(namespace, key)
+            self._conn.commit()
+
+    def setdefault(self, namespace: str, key: str, value: Any) -> Any:
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO state (namespace, key, value) VALUES (?, ?, ?)",
+                (namespace, key, json.dumps(value))
+            )
+            if cursor.rowcount:
+                self._record_change(namespace, key)
+            self._conn.commit()
+            row = self._conn.execute(
+                "SELECT value FROM state WHERE namespace = ? AND key = ?",
+                (namespace, key)
+            ).fetchone()
+        return json.loads(row[0])
+
+    def delete(self, namespace: str, key: str) -> bool:
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM state WHERE namespace = ? AND key = ?",
+                (namespace, key)
+            )
+            if cursor.rowcount:
+                self._record_change(namespace, key)
+            self._conn.commit()
+        return cursor.rowcount > 0
+
+    def items(self, namespace: str) -> Dict[str, Any]:
+        with self._read_lock:
+            rows = self._reader.execute(
+                "SELECT key, value FROM state WHERE namespace = ? ORDER BY key",
+                (namespace,)
+            ).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def append_session_entries(self, entries: List[Tuple[str, Dict[str, Any]]]) -> Dict[str, Tuple[int, int]]:
+        first: Dict[str, int] = {}
+        last: Dict[str, int] = {}
+        with self._lock:
+            for session_id, entry in entries:
+                cursor = self._conn.execute(
+                    "INSERT INTO session_entries (session_id, data) VALUES (?, ?)",
+                    (session_id, json.dumps(entry))
+                )
+                first.setdefault(session_id, cursor.lastrowid)
+                last[session_id] = cursor.lastrowid
+            # Read inside the inserts' write transaction so no other worker can interleave
+            written = {
+                session_id: (
+                    self._conn.execute(
+                        "SELECT COALESCE(MAX(id), 0) FROM session_entries WHERE session_id = ? AND id < ?",
+                        (session_id, first_id)
+                    ).fetchone()[0],
+                    last[session_id]
+                )
+                for session_id, first_id in first.items()
+            }
+            self._conn.commit()
+        return written
+
+    def session_entries(self, session_id: str, limit: int) -> Tuple[List[Dict[str, Any]], int]:
+        with self._read_lock:
+            rows = self._reader.execute(
+                "SELECT id, data FROM session_entries WHERE session_id = ? ORDER BY id DESC LIMIT ?",
+                (session_id, limit)
+            ).fetchall()
+        rows.reverse()
+        return [json.loads(data) for _, data in rows], rows[-1][0] if rows else 0
+
+    def session_versions(self, session_ids: List[str]) -> Dict[str, int]:
+        versions = {session_id: 0 for session_id in session_ids}
+        with self._read_lock:
+            for session_id in session_ids:
+                versions[session_id] = self._reader.execute(
+                    "SELECT COALESCE(MAX(id), 0) FROM session_entries WHERE session_id = ?",
+                    (session_id,)
+                ).fetchone()[0]
+        return versions
+
+    def trim_sessions(self, keep: int) -> int:
+        with self._lock:
+            cursor = self._conn.execute(
+                """DELETE FROM session_entries WHERE id IN (
+                       SELECT id FROM (
+                           SELECT id, ROW_NUMBER() OVER (PARTITION BY session_id ORDER BY id DESC) AS position
+                           FROM session_entries
+                       ) WHERE position > ?
+                   )""",
+                (keep,)
+            )
+            self._conn.commit()
+        return cursor.rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        """Get shared state statistics."""
+        return {
+            "backend": "sqlite",
+            "path": str(self.db_path),
+            "last_change": self._last_change,
+            "notifications": self.notifications
+        }
+
+    def close(self) -> None:
+        """Close the underlying database connections."""
+        with self._lock:
+            self._conn.close()
+        with self._read_lock:
+            self._reader.close()
+
+    def _record_change(self, namespace: str, key: str) -> None:
+        self._conn.execute(
+            "INSERT INTO changes (namespace, key, origin, created) VALUES (?, ?, ?, ?)",
+            (namespace, key, self.origin, time.time())
+        )
+
+    def _changes_since(self, change_id: int) -> List[Tuple[int, str, str, str]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, namespace, key, origin FROM changes WHERE id > ? ORDER BY id",
+                (change_id,)
+            ).fetchall()
+            if rows:
+                self._conn.execute(
+                    "DELETE FROM changes WHERE created < ?",
+                    (time.time() - self.change_retention,)
+                )
+                self._conn.commit()
+        return rows
+
+    async def _watch(self) -> None:
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                changes = await asyncio.to_thread(self._changes_since, self._last_change)
+            except sqlite3.Error:
+                logger.exception("Polling shared state changes failed")
+                continue
+            for change_id, namespace, key, origin in changes:
+                self._last_change = change_id
+                if origin != self.origin:
+                    self.notifications += 1
+                    await self._notify(namespace, key)
+
+def open_shared_state(backend: str, db_path: Path) -> Optional[SharedState]:
+    """Open the configured shared state backend.
+
+    ``local`` keeps state inside the process (single worker) and returns
+    None; ``sqlite`` shares it through a SQLite database at db_path.
+    """
+    if backend == "local":
+        return None
+    if backend == "sqlite":
+        return SQLiteSharedState(db_path)
+    raise ValueError(f"Unknown shared state backend: {backend}")
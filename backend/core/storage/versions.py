@@ -0,0 +1,230 @@
+from typing import Dict, Any, List, Optional
+from pathlib import Path
+import hashlib
+import json
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+from .files import atomic_write
+
+logger = logging.getLogger(__name__)
+
+# Byte offset and length of a version record in its chain file
+INDEX_ENTRY = struct.Struct(">QI")
+
+class VersionNotFoundError(Exception):
+    """Raised when a file has no recorded version with the requested number."""
+    pass
+
+class VersionStore:
+    """Content-addressed history of the files the agent modifies.
+
+    File contents are stored once per distinct content as zlib-compressed
+    blobs named by their SHA-256, so repeated versions and unchanged files
+    cost no extra space. Each file has an append-only chain of numbered
+    versions pointing at blobs, with a fixed-width index locating each
+    record; the index's last entry is the chain's head, so recording,
+    reading and rolling back a version never scan the history. Writes
+    through the store are atomic and record both the previous and the new
+    content, so any earlier version can be restored with a single blob
+    read; a rollback is itself recorded as a new version and never
+    discards history.
+    """
+
+    def __init__(self, root: Path, compression_level: int = 6, fsync: bool = True):
+        self.root = Path(root)
+        self.compression_level = compression_level
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self.blobs_written = 0
+        self.blobs_deduplicated = 0
+
+    def write(self, file_path: str, content: str, message: str = "") -> Dict[str, Any]:
+        """Atomically replace a file's content, recording the old and new versions.
+
+        Returns the version record of the new content.
+        """
+        path = Path(file_path)
+        data = content.encode("utf-8")
+        with self._lock:
+            if path.exists():
+                self._record(path, path.read_bytes(), "snapshot before write")
+            atomic_write(path, data, self.fsync)
+            return self._record(path, data, message)
+
+    def snapshot(self, file_path: str, message: str = "snapshot") -> Optional[Dict[str, Any]]:
+        """Record a file's current content, returning its version (None if the file is missing)."""
+        path = Path(file_path)
+        with self._lock:
+            if not path.exists():
+                return None
+            return self._record(path, path.read_bytes(), message)
+
+    def history(self, file_path: str) -> List[Dict[str, Any]]:
+        """Get a file's version records, oldest first.
+
+        A torn final line left by a crash mid-write is skipped.
+        """
+        chain_path = self._chain_path(Path(file_path))
+        if not chain_path.exists():
+            return []
+        records = []
+        with open(chain_path, 'r') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    logger.warning("Skipping unreadable version record in %s", chain_path.name)
+        return records
+
+    def read(self, file_path: str, version: int) -> str:
+        """Get the content of a recorded version."""
+        with self._lock:
+            record = self._version(Path(file_path), version)
+        return self._read_blob(record["digest"]).decode("utf-8")
+
+    def rollback(self, file_path: str, version: int) -> Dict[str, Any]:
+        """Restore a file to an earlier version, recorded as a new version."""
+        path = Path(file_path)
+        with self._lock:
+            record = self._version(path, version)
+            data = self._read_blob(record["digest"])
+            if path.exists():
+                self._record(path, path.read_bytes(), "snapshot before rollback")
+            atomic_write(path, data, self.fsync)
+            return self._record(path, data, f"rollback to version {version}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Get blob store statistics."""
+        return {
+            "blobs_written": self.blobs_written,
+            "blobs_deduplicated": self.blobs_deduplicated
+        }
+
+    def _record(self, path: Path, data: bytes, message: str) -> Dict[str, Any]:
+        """Append a version for data unless it matches the file's latest version."""
+        digest = self._write_blob(data)
+        chain_path = self._chain_path(path)
+        count = self._sync_index(chain_path)
+        if count:
+            head = self._entry(chain_path, count)
+            if head["digest"] == digest:
+                return head
+
+        record = {
+            "version": count + 1,
+            "digest": digest,
+            "size": len(data),
+            "timestamp": time.time(),
+            "message": message
+        }
+        if not count:
+            # The first line names the file the chain belongs to
+            record["path"] = str(path.resolve())
+        line = (json.dumps(record) + "\n").encode("utf-8")
+        chain_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(chain_path, 'ab') as f:
+            offset = f.seek(0, os.SEEK_END)
+            f.write(line)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        # The index is rebuilt from the chain after a crash, so it is not fsynced
+        with open(self._index_path(chain_path), 'ab') as f:
+            f.write(INDEX_ENTRY.pack(offset, len(line)))
+        return record
+
+    def _sync_index(self, chain_path: Path) -> int:
+        """Index chain records the index is missing, returning the number of versions.
+
+        Only the chain past the last indexed record is read: records left
+        unindexed by a crash between the two appends are indexed, and a torn
+        final line is cut off so the next record starts on a line of its own.
+        """
+        if not chain_path.exists():
+            return 0
+        index_path = self._index_path(chain_path)
+        index_path.touch(exist_ok=True)
+        with open(index_path, 'rb+') as index, open(chain_path, 'rb+') as chain:
+            size = index.seek(0, os.SEEK_END)
+            count = size // INDEX_ENTRY.size
+            if size % INDEX_ENTRY.size:
+                index.truncate(count * INDEX_ENTRY.size)
+            end = 0
+            if count:
+                index.seek((count - 1) * INDEX_ENTRY.size)
+                offset, length = INDEX_ENTRY.unpack(index.read(INDEX_ENTRY.size))
+                end = offset + length
+            chain_size = chain.seek(0, os.SEEK_END)
+            if end > chain_size:
+                # The index does not match this chain; rebuild it
+                index.truncate(0)
+                count = end = 0
+            if end == chain_size:
+                return count
+
+            chain.seek(end)
+            index.seek(count * INDEX_ENTRY.size)
+            position = end
+            for line in chain.read().splitlines(keepends=True):
+                if not line.endswith(b"\n"):
+                    break
+                if line.strip():
+                    try:
+                        json.loads(line)
+                    except ValueError:
+                        logger.warning("Skipping unreadable version record in %s", chain_path.name)
+                    else:
+                        index.write(INDEX_ENTRY.pack(position, len(line)))
+                        count += 1
+                position += len(line)
+            if position < chain_size:
+                chain.truncate(position)
+        return count
+
+    def _entry(self, chain_path: Path, version: int) -> Dict[str, Any]:
+        """Read a version record through the chain's index."""
+        with open(self._index_path(chain_path), 'rb') as index:
+            index.seek((version - 1) * INDEX_ENTRY.size)
+            offset, length = INDEX_ENTRY.unpack(index.read(INDEX_ENTRY.size))
+        with open(chain_path, 'rb') as chain:
+            chain.seek(offset)
+            return json.loads(chain.read(length))
+
+    def _version(self, path: Path, version: int) -> Dict[str, Any]:
+        chain_path = self._chain_path(path)
+        if not 1 <= version <= self._sync_index(chain_path):
+            raise VersionNotFoundError(f"No version {version} recorded for {path}")
+        return self._entry(chain_path, version)
+
+    def _write_blob(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        blob_path = self._blob_path(digest)
+        if blob_path.exists():
+            self.blobs_deduplicated += 1
+        else:
+            atomic_write(blob_path, zlib.compress(data, self.compression_level), self.fsync)
+            self.blobs_written += 1
+        return digest
+
+    def _read_blob(self, digest: str) -> bytes:
+        with open(self._blob_path(digest), 'rb') as f:
+            return zlib.decompress(f.read())
+
+    def _blob_path(self, digest: str) -> Path:
+        return self.root / "objects" / digest[:2] / digest[2:]
+
+    def _chain_path(self, path: Path) -> Path:
+        name = hashlib.sha256(str(path.resolve()).encode("utf-8")).hexdigest()[:32]
+        return self.root / "chains" / f"{name}.jsonl"
+
+    def _index_path(self, chain_path: Path) -> Path:
+        return chain_path.with_suffix(".idx")
+
+# Shared store for all code modifications
+version_store = VersionStore(Path("workspace") / "versions")
@@ -1,11 +1,22 @@
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, Response
 from pydantic import BaseModel
 import openai
 import os
 from pathlib import Path
+from typing import Optional
 
-openai.api_key = os.getenv("OPENAI_API_KEY")
+from core.models.http_client import create_http_client
+from core.monitoring.loop_monitor import EventLoopLagMonitor
+from core.storage.files import (
+    DirectoryIndex,
+    RangeNotSatisfiableError,
+    atomic_write,
+    iter_file,
+    parse_range,
+    write_stream
+)
 
 app = FastAPI()
 
@@ -18,8 +29,50 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+loop_monitor = EventLoopLagMonitor(
+    threshold=float(os.getenv("LOOP_LAG_THRESHOLD_MS", "100")) / 1000
+)
+
+@app.on_event("startup")
+async def start_loop_monitor():
+    loop_monitor.start()
+
+@app.on_event("shutdown")
+async def stop_loop_monitor():
+    await loop_monitor.stop()
+
+# Long-lived pooled client for the legacy /chat endpoint, created on first use
+openai_client: Optional[openai.AsyncOpenAI] = None
+
+def get_openai_client() -> openai.AsyncOpenAI:
+    """Get the shared OpenAI client, creating it once an API key is configured."""
+    global openai_client
+    if openai_client is None:
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise HTTPException(status_code=503, detail="OPENAI_API_KEY is not configured")
+        openai_client = openai.AsyncOpenAI(
+            api_key=api_key,
+            http_client=create_http_client(client_class=openai.DefaultAsyncHttpxClient)
+        )
+    return openai_client
+
+@app.on_event("shutdown")
+async def close_openai_client():
+    if openai_client is not None:
+        await openai_client.close()
+
 WORKSPACE_DIR = Path("workspace")
 WORKSPACE_DIR.mkdir(exist_ok=True)
+workspace_index = DirectoryIndex(WORKSPACE_DIR)
+
+def resolve_workspace_path(filename: str) -> Path:
+    """Resolve a file name inside the workspace, rejecting paths that escape it."""
+    root = WORKSPACE_DIR.resolve()
+    file_path = (root / filename).resolve()
+    if file_path.parent != root:
+        raise HTTPException(status_code=400, detail="Invalid file name")
+    return file_path
 
 class ChatRequest(BaseModel):
     message: str
@@ -27,14 +80,14 @@ class ChatRequest(BaseModel):
 
 @app.post("/chat")
 async def chat(req: ChatRequest):
-    response = openai.ChatCompletion.create(
+    response = await get_openai_client().chat.completions.create(
         model=req.model,
         messages=[
             {"role": "system", "content": "Du bist Aiden, ein hilfsbereiter KI-Operator."},
             {"role": "user", "content": req.message}
         ]
     )
-    reply = response.choices[0].message["content"]
+    reply = response.choices[0].message.content
     return { "reply": reply }
 
 class FileRequest(BaseModel):
@@ -44,16 +97,62 @@ class FileRequest(BaseModel):
 @app.post("/create_file")
 def create_file(req: FileRequest):
     file_path = WORKSPACE_DIR / req.filename
-    file_path.write_text(req.content, encoding="utf-8")
+    atomic_write(file_path, req.content.encode("utf-8"))
+    workspace_index.invalidate()
     return { "status": "created", "path": str(file_path) }
 
 @app.get("/list_files")
-def list_files():
-    return { "files": [f.name for f in WORKSPACE_DIR.iterdir() if f.is_file()] }
+def list_files(offset: int = Query(0, ge=0), limit: Optional[int] = Query(None, ge=1, le=1000)):
+    page = workspace_index.page(offset, limit)
+    return {
+        "files": [entry["name"] for entry in page["files"]],
+        "entries": page["files"],
+        "total": page["total"],
+        "offset": offset,
+        "limit": limit
+    }
 
 @app.get("/read_file")
 def read_file(filename: str):
     file_path = WORKSPACE_DIR / filename
     if file_path.exists():
         return { "content": file_path.read_text(encoding="utf-8") }
-    return { "error": "Datei nicht gefunden" }
\ No newline at end of file
+    return { "error": "Datei nicht gefunden" }
+
+@app.put("/files/{filename}")
+async def upload_file(filename: str, request: Request):
+    """Stream the request body into a workspace file without buffering it."""
+    file_path = resolve_workspace_path(filename)
+    size = await write_stream(file_path, request.stream())
+    workspace_index.invalidate()
+    return { "status": "created", "path": str(WORKSPACE_DIR / filename), "size": size }
+
+@app.get("/files/{filename}")
+def download_file(filename: str, request: Request):
+    """Stream a workspace file, honouring single byte-range requests."""
+    file_path = resolve_workspace_path(filename)
+    if not file_path.is_file():
+        raise HTTPException(status_code=404, detail="Datei nicht gefunden")
+
+    size = file_path.stat().st_size
+    try:
+        byte_range = parse_range(request.headers.get("range"), size)
+    except RangeNotSatisfiableError:
+        return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+
+    headers = {"Accept-Ranges": "bytes"}
+    if byte_range is None:
+        start, end, status_code = 0, size - 1, 200
+    else:
+        start, end = byte_range
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1 if size else 0)
+
+    # The sync generator is iterated in the threadpool, keeping disk reads off the event loop
+    return StreamingResponse(
+        iter_file(file_path, start, end),
+        status_code=status_code,
+        media_type="application/octet-stream",
+        headers=headers
+    )
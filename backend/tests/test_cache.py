@@ -0,0 +1,76 @@
+"""Tests for the two-tier analysis cache.
+
+Run from the repository root with ``python -m pytest backend/tests``.
+"""
+from backend.core.models.cache import AnalysisCache
+
+def make_key(**overrides):
+    args = {
+        "model_name": "gpt-4",
+        "request_type": "code_analysis",
+        "prompt_version": "2",
+        "code": "def f():\n    return 1\n",
+        "changes": ""
+    }
+    args.update(overrides)
+    return AnalysisCache.make_key(
+        args["model_name"],
+        args["request_type"],
+        args["prompt_version"],
+        args["code"],
+        args["changes"]
+    )
+
+def test_key_is_stable_and_depends_on_every_part():
+    key = make_key()
+    assert key == make_key()
+    assert len(key) == 64
+    assert make_key(model_name="claude-3") != key
+    assert make_key(request_type="code_suggestions") != key
+    assert make_key(prompt_version="3") != key
+    assert make_key(code="def f():\n    return 2\n") != key
+    assert make_key(changes="x = 1") != key
+
+def test_key_parts_cannot_run_into_each_other():
+    # Contents are hashed separately, so moving text between them changes the key
+    assert AnalysisCache.make_key("m", "t", "1", "ab", "c") != AnalysisCache.make_key("m", "t", "1", "a", "bc")
+
+def test_memory_hit_and_miss_counters(tmp_path):
+    cache = AnalysisCache(cache_dir=str(tmp_path))
+    assert cache.get("missing") is None
+    cache.set("key", {"issues": []})
+    assert cache.get("key") == {"issues": []}
+    stats = cache.stats()
+    assert (stats["memory_hits"], stats["disk_hits"], stats["misses"]) == (1, 0, 1)
+
+def test_entries_survive_a_restart_through_the_disk_tier(tmp_path):
+    AnalysisCache(cache_dir=str(tmp_path)).set("key", {"score": 7})
+    cache = AnalysisCache(cache_dir=str(tmp_path))
+    assert cache.get("key") == {"score": 7}
+    assert cache.get("key") == {"score": 7}
+    assert (cache.disk_hits, cache.memory_hits) == (1, 1)
+
+def test_expired_entries_are_dropped_from_both_tiers(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("backend.core.models.cache.time.time", lambda: now[0])
+    cache = AnalysisCache(ttl=60, cache_dir=str(tmp_path))
+    cache.set("key", "value")
+
+    now[0] += 59
+    assert cache.get("key") == "value"
+
+    now[0] += 2
+    assert cache.get("key") is None
+    assert list(tmp_path.glob("*.json")) == []
+    assert AnalysisCache(ttl=60, cache_dir=str(tmp_path)).get("key") is None
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = AnalysisCache(max_size=2, cache_dir=None)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.evictions == 1
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
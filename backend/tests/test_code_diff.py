@@ -0,0 +1,129 @@
+"""Tests for unit-level code diffs and incremental change analysis.
+
+Run from the repository root with ``python -m pytest backend/tests``.
+"""
+import asyncio
+from backend.core.agent.code_diff import MODULE_UNIT, diff_code, extract_units
+from backend.core.agent.modifier import CodeModifier
+from backend.core.models.base import AIModel
+from backend.core.models.cache import AnalysisCache
+from backend.core.models.model_router import ModelRouter, ROLE_CODE_ANALYSIS
+
+SOURCE = '''import os
+
+LIMIT = 3
+
+def first(x):
+    return x + 1
+
+class Greeter(Base):
+    greeting = "hi"
+
+    def greet(self, name):
+        return f"{self.greeting} {name}"
+
+    def leave(self):
+        pass
+'''
+
+def test_units_are_named_and_fingerprinted():
+    units = extract_units(SOURCE)
+    assert list(units) == ["first", "Greeter.greet", "Greeter.leave", "Greeter", MODULE_UNIT]
+    assert units["first"].source == "def first(x):\n    return x + 1"
+    assert 'greeting = "hi"' in units["Greeter"].source
+    assert "import os" in units[MODULE_UNIT].source
+    assert len({unit.digest for unit in units.values()}) == len(units)
+
+def test_fingerprints_ignore_formatting_comments_and_position():
+    moved = SOURCE.replace(
+        "def first(x):\n    return x + 1\n",
+        "\n\n# adds one\ndef first(x):\n    return (x   +   1)\n"
+    )
+    old, new = extract_units(SOURCE), extract_units(moved)
+    assert all(old[name].digest == new[name].digest for name in old)
+
+def test_diff_classifies_units():
+    new_source = SOURCE.replace("return x + 1", "return x + 2").replace(
+        "    def leave(self):\n        pass\n",
+        "    def wave(self):\n        return 'o/'\n"
+    )
+    diff = diff_code(SOURCE, new_source)
+    assert diff.modified == ["first"]
+    assert diff.added == ["Greeter.wave"]
+    assert diff.removed == ["Greeter.leave"]
+    assert diff.unchanged == ["Greeter.greet", "Greeter", MODULE_UNIT]
+    assert diff.changed == ["first", "Greeter.wave"]
+    assert not diff.context_changed
+    assert "return x + 1" in diff.change_excerpt("first")
+    assert "return x + 2" in diff.change_excerpt("first")
+    assert diff.excerpt("first").startswith("# Module context\nimport os")
+
+def test_class_header_changes_modify_the_class_unit_only():
+    diff = diff_code(SOURCE, SOURCE.replace("class Greeter(Base):", "class Greeter(Other):"))
+    assert diff.changed == ["Greeter"]
+
+def test_module_level_changes_change_the_context():
+    diff = diff_code(SOURCE, SOURCE.replace("LIMIT = 3", "LIMIT = 4"))
+    assert diff.changed == [MODULE_UNIT]
+    assert diff.context_changed
+
+def test_duplicate_names_get_distinct_units():
+    units = extract_units("def f():\n    return 1\n\ndef f():\n    return 2\n")
+    assert list(units) == ["f", "f#2"]
+
+def test_unparseable_code_has_no_diff():
+    assert extract_units("def broken(:\n") is None
+    assert diff_code(SOURCE, "def broken(:\n") is None
+
+class RecordingModel(AIModel):
+    def __init__(self):
+        self.analyzed = []
+
+    async def generate_response(self, messages, **kwargs):
+        return "{}"
+
+    async def analyze_code(self, code, **kwargs):
+        self.analyzed.append(code)
+        return {"potential_issues": [f"issue {len(self.analyzed)}"]}
+
+    def _analysis_messages(self, code):
+        return []
+
+def test_changed_unit_analyses_are_reused_once_unchanged(tmp_path):
+    async def run():
+        model = RecordingModel()
+        router = ModelRouter(cache=AnalysisCache(cache_dir=None))
+        router.register_model("model", model, roles=[ROLE_CODE_ANALYSIS])
+        modifier = CodeModifier(router)
+        path = tmp_path / "module.py"
+
+        path.write_text(SOURCE)
+        version_two = SOURCE.replace("return x + 1", "return x + 2")
+        first = await modifier.analyze_code_changes(str(path), version_two)
+
+        # Only Greeter.greet changes next; first's analysis comes from the cache
+        path.write_text(version_two)
+        version_three = version_two.replace("{self.greeting} {name}", "{self.greeting}, {name}")
+        second = await modifier.analyze_code_changes(str(path), version_three)
+        return model, first, second
+
+    model, first, second = asyncio.run(run())
+    assert first["changed_units"] == ["first"]
+    assert second["changed_units"] == ["Greeter.greet"]
+    assert len(model.analyzed) == 2
+    assert "--- original" in model.analyzed[1]
+    assert "issue 1" in second["potential_issues"]
+
+def test_unparseable_changes_are_analyzed_with_the_proposed_code(tmp_path):
+    async def run():
+        model = RecordingModel()
+        router = ModelRouter()
+        router.register_model("model", model, roles=[ROLE_CODE_ANALYSIS])
+        path = tmp_path / "module.py"
+        path.write_text(SOURCE)
+        await CodeModifier(router).analyze_code_changes(str(path), "def broken(:\n")
+        return model
+
+    analyzed = asyncio.run(run()).analyzed
+    assert len(analyzed) == 1
+    assert "def broken(:" in analyzed[0] and "import os" in analyzed[0]
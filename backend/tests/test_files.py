@@ -0,0 +1,130 @@
+"""Tests for streamed, range-capable workspace file I/O.
+
+Run from the repository root with ``python -m pytest backend/tests``.
+"""
+import asyncio
+import importlib
+from pathlib import Path
+import pytest
+from backend.core.storage import files
+from backend.core.storage.files import (
+    DirectoryIndex,
+    RangeNotSatisfiableError,
+    atomic_write,
+    iter_file,
+    parse_range,
+    write_stream
+)
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("", None),
+    ("items=0-5", None),
+    ("bytes=0-1,4-5", None),
+    ("bytes=abc-def", None),
+    ("bytes=0-9", (0, 9)),
+    ("bytes=10-19", (10, 19)),
+    ("bytes=90-", (90, 99)),
+    ("bytes=90-500", (90, 99)),
+    ("bytes=-10", (90, 99)),
+    ("bytes=-500", (0, 99)),
+    ("bytes=99-99", (99, 99))
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 100) == expected
+
+@pytest.mark.parametrize("header, size", [
+    ("bytes=100-", 100),
+    ("bytes=150-200", 100),
+    ("bytes=20-10", 100),
+    ("bytes=-0", 100),
+    ("bytes=0-", 0),
+    ("bytes=-5", 0)
+])
+def test_unsatisfiable_ranges(header, size):
+    with pytest.raises(RangeNotSatisfiableError):
+        parse_range(header, size)
+
+@pytest.mark.parametrize("size", [1000, files.MMAP_THRESHOLD + 1000])
+def test_iter_file_yields_the_requested_bytes(tmp_path, size):
+    data = bytes(range(256)) * (size // 256 + 1)
+    path = tmp_path / "data.bin"
+    path.write_bytes(data[:size])
+
+    assert b"".join(iter_file(path, chunk_size=300)) == data[:size]
+    assert b"".join(iter_file(path, 10, 709, chunk_size=64)) == data[10:710]
+    assert b"".join(iter_file(path, size - 5, size + 100)) == data[size - 5:size]
+    assert all(len(chunk) <= 64 for chunk in iter_file(path, 0, 700, chunk_size=64))
+
+def test_write_stream_replaces_the_file_only_when_complete(tmp_path):
+    path = tmp_path / "upload.bin"
+    path.write_bytes(b"old")
+
+    async def chunks(fail):
+        yield b"new "
+        if fail:
+            raise ConnectionError("client went away")
+        yield b"content"
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(write_stream(path, chunks(fail=True)))
+    assert path.read_bytes() == b"old"
+    assert [p.name for p in tmp_path.iterdir()] == ["upload.bin"]
+
+    assert asyncio.run(write_stream(path, chunks(fail=False))) == 11
+    assert path.read_bytes() == b"new content"
+
+def test_directory_index_reflects_rewrites_after_invalidate(tmp_path):
+    index = DirectoryIndex(tmp_path)
+    atomic_write(tmp_path / "b.txt", b"1", fsync=False)
+    atomic_write(tmp_path / "a.txt", b"22", fsync=False)
+    (tmp_path / ".a.txt.123.tmp").write_bytes(b"partial")
+    assert [(e["name"], e["size"]) for e in index.entries()] == [("a.txt", 2), ("b.txt", 1)]
+
+    (tmp_path / "a.txt").write_bytes(b"4444")
+    index.invalidate()
+    assert index.page(0, 1)["files"][0]["size"] == 4
+    assert index.page(1)["total"] == 2
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    testclient = pytest.importorskip("fastapi.testclient")
+    monkeypatch.syspath_prepend(str(Path(__file__).resolve().parent.parent))
+    monkeypatch.chdir(tmp_path)
+    main = importlib.import_module("main")
+    workspace = tmp_path / "files"
+    workspace.mkdir()
+    monkeypatch.setattr(main, "WORKSPACE_DIR", workspace)
+    monkeypatch.setattr(main, "workspace_index", DirectoryIndex(workspace))
+    return testclient.TestClient(main.app), workspace
+
+def test_download_ranges_and_416(client):
+    client, workspace = client
+    (workspace / "data.bin").write_bytes(bytes(range(100)))
+    (workspace / "empty.bin").write_bytes(b"")
+
+    response = client.get("/files/data.bin")
+    assert response.status_code == 200
+    assert response.headers["accept-ranges"] == "bytes"
+    assert len(response.content) == 100
+
+    response = client.get("/files/data.bin", headers={"Range": "bytes=10-19"})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == "bytes 10-19/100"
+    assert response.content == bytes(range(10, 20))
+
+    for name, header, size in [("data.bin", "bytes=100-", 100), ("empty.bin", "bytes=-5", 0)]:
+        response = client.get(f"/files/{name}", headers={"Range": header})
+        assert response.status_code == 416
+        assert response.headers["content-range"] == f"bytes */{size}"
+
+    assert client.get("/files/missing.bin").status_code == 404
+
+def test_uploads_and_rewrites_show_up_in_the_listing(client):
+    client, workspace = client
+    assert client.put("/files/up.bin", content=b"x" * 10).json()["size"] == 10
+    client.post("/create_file", json={"filename": "note.txt", "content": "a"})
+    client.post("/create_file", json={"filename": "note.txt", "content": "abcde"})
+
+    entries = {entry["name"]: entry["size"] for entry in client.get("/list_files").json()["entries"]}
+    assert entries == {"note.txt": 5, "up.bin": 10}
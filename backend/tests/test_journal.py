@@ -0,0 +1,96 @@
+"""Crash recovery of the memory journal and session snapshots.
+
+Run from the repository root with ``python -m pytest backend/tests``.
+"""
+import asyncio
+from backend.core.agent.journal import MemoryJournal
+from backend.core.agent.session import SessionStore
+
+def open_store(root):
+    journal = MemoryJournal(root / "journal")
+    return SessionStore(root / "sessions", journal=journal), journal
+
+def contents(store, session_id):
+    return [entry["content"] for entry in store.get_history(session_id)]
+
+class Crash(Exception):
+    pass
+
+def test_crash_between_rotate_and_complete_snapshot(tmp_path, monkeypatch):
+    async def crash():
+        store, journal = open_store(tmp_path)
+        for i in range(3):
+            store.append("a", {"role": "user", "content": f"a{i}"})
+            store.append("b", {"role": "user", "content": f"b{i}"})
+
+        async def fail(seq, segment):
+            raise Crash()
+
+        # Session files are written after the rotation, then the process dies
+        monkeypatch.setattr(journal, "complete_snapshot", fail)
+        try:
+            await store.snapshot()
+        except Crash:
+            pass
+        # Entries recorded after the rotation land in the next segment
+        store.append("a", {"role": "user", "content": "a3"})
+        store.append("c", {"role": "user", "content": "c0"})
+        await journal.flush()
+
+    asyncio.run(crash())
+    store, _ = open_store(tmp_path)
+    assert contents(store, "a") == ["a0", "a1", "a2", "a3"]
+    assert contents(store, "b") == ["b0", "b1", "b2"]
+    assert contents(store, "c") == ["c0"]
+
+def test_crash_after_rotate_before_session_files(tmp_path):
+    async def crash():
+        store, journal = open_store(tmp_path)
+        store.append("a", {"role": "user", "content": "a0"})
+        await journal.rotate()
+        store.append("a", {"role": "user", "content": "a1"})
+        await journal.flush()
+
+    asyncio.run(crash())
+    store, _ = open_store(tmp_path)
+    assert contents(store, "a") == ["a0", "a1"]
+
+def test_recovery_after_completed_snapshot(tmp_path):
+    async def run():
+        store, journal = open_store(tmp_path)
+        store.append("a", {"role": "user", "content": "a0"})
+        await store.snapshot()
+        store.append("a", {"role": "user", "content": "a1"})
+        await journal.flush()
+
+    asyncio.run(run())
+    store, journal = open_store(tmp_path)
+    assert contents(store, "a") == ["a0", "a1"]
+    # Only the segment written after the snapshot is left
+    assert len(journal._segments()) == 1
+
+def test_torn_final_record_is_skipped(tmp_path):
+    async def run():
+        store, journal = open_store(tmp_path)
+        store.append("a", {"role": "user", "content": "a0"})
+        await journal.flush()
+        with open(journal._segment_path(journal.segment), 'a') as f:
+            f.write('{"seq": 2, "session_id": "a", "en')
+
+    asyncio.run(run())
+    store, _ = open_store(tmp_path)
+    assert contents(store, "a") == ["a0"]
+
+def test_evicted_sessions_survive_snapshot(tmp_path):
+    async def run():
+        journal = MemoryJournal(tmp_path / "journal")
+        store = SessionStore(tmp_path / "sessions", max_sessions=1, journal=journal)
+        store.append("a", {"role": "user", "content": "a0"})
+        store.append("b", {"role": "user", "content": "b0"})
+        await store.snapshot()
+
+    asyncio.run(run())
+    store, journal = open_store(tmp_path)
+    assert journal.replay() == {}
+    assert contents(store, "a") == ["a0"]
+    assert contents(store, "b") == ["b0"]
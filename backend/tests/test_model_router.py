@@ -0,0 +1,121 @@
+"""Tests for health-based routing, failover and the circuit breaker.
+
+Run from the repository root with ``python -m pytest backend/tests``.
+"""
+import asyncio
+import pytest
+from backend.core.models.base import AIModel
+from backend.core.models.health import ModelHealth
+from backend.core.models.model_router import ModelRouter, ModelNotFoundError
+
+class FakeModel(AIModel):
+    def __init__(self, reply="ok", error=None, delay=0.0):
+        self.reply = reply
+        self.error = error
+        self.delay = delay
+        self.calls = 0
+
+    async def generate_response(self, messages, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return self.reply
+
+    def _analysis_messages(self, code):
+        return [{"role": "user", "content": code}]
+
+def make_router(attempt_timeout=90.0, **models):
+    router = ModelRouter(attempt_timeout=attempt_timeout)
+    for name, model in models.items():
+        router.register_model(name, model, roles=["chat"])
+    return router
+
+def chat(router, role="chat"):
+    return asyncio.run(router.route_request(role, "chat", messages=[{"role": "user", "content": "hi"}]))
+
+def test_failover_to_the_next_candidate_on_error():
+    primary = FakeModel(error=RuntimeError("down"))
+    backup = FakeModel(reply="from backup")
+    router = make_router(primary=primary, backup=backup)
+
+    assert chat(router) == "from backup"
+    assert (primary.calls, backup.calls) == (1, 1)
+    assert router.failovers == 1
+    assert router.health["primary"].failures == 1
+
+def test_failover_when_an_attempt_times_out():
+    slow = FakeModel(reply="slow", delay=1.0)
+    fast = FakeModel(reply="fast")
+    router = make_router(attempt_timeout=0.05, slow=slow, fast=fast)
+
+    assert chat(router) == "fast"
+    assert router.health["slow"].failures == 1
+
+def test_last_error_is_raised_when_every_candidate_fails():
+    router = make_router(
+        first=FakeModel(error=RuntimeError("first")),
+        second=FakeModel(error=ValueError("second"))
+    )
+    with pytest.raises(ValueError, match="second"):
+        chat(router)
+
+def test_unknown_model_or_role():
+    with pytest.raises(ModelNotFoundError):
+        chat(make_router(), role="missing")
+
+def test_candidates_are_ordered_by_latency_and_errors():
+    router = make_router(a=FakeModel(), b=FakeModel(), c=FakeModel())
+    router.health["a"].record_success(2.0)
+    router.health["b"].record_success(0.5)
+    router.health["c"].record_success(0.5)
+    router.health["c"].record_failure(0.5)
+    assert router.get_candidates("chat") == ["b", "c", "a"]
+    assert router.get_candidates("a") == ["a"]
+
+def test_open_circuit_moves_a_model_to_the_back(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("backend.core.models.health.time.monotonic", lambda: now[0])
+    flaky = FakeModel(error=RuntimeError("down"))
+    steady = FakeModel(reply="steady")
+    router = make_router(flaky=flaky, steady=steady)
+    router.health["steady"].record_success(5.0)
+
+    for _ in range(3):
+        assert chat(router) == "steady"
+    health = router.health["flaky"]
+    assert not health.is_available()
+    assert router.get_candidates("chat") == ["steady", "flaky"]
+
+    # Requests skip the open circuit until the cooldown elapses
+    chat(router)
+    assert flaky.calls == 3
+
+    now[0] += health.cooldown
+    assert health.is_available()
+    health.record_success(0.1)
+    assert health.consecutive_failures == 0
+    assert router.get_candidates("chat")[0] == "flaky"
+
+def test_open_circuit_is_still_tried_as_a_last_resort(monkeypatch):
+    monkeypatch.setattr("backend.core.models.health.time.monotonic", lambda: 100.0)
+    only = FakeModel(error=RuntimeError("down"))
+    router = make_router(only=only)
+    for _ in range(3):
+        with pytest.raises(RuntimeError):
+            chat(router)
+    assert not router.health["only"].is_available()
+
+    only.error = None
+    assert chat(router) == "ok"
+    assert router.health["only"].is_available()
+
+def test_health_circuit_opens_after_consecutive_failures(monkeypatch):
+    monkeypatch.setattr("backend.core.models.health.time.monotonic", lambda: 0.0)
+    health = ModelHealth(failure_threshold=2, cooldown=10.0)
+    health.record_failure(0.1)
+    health.record_success(0.1)
+    health.record_failure(0.1)
+    assert health.is_available()
+    health.record_failure(0.1)
+    assert not health.is_available()
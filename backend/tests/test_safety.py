@@ -0,0 +1,102 @@
+"""Tests for the AST-based safety analyzer.
+
+File and network rules match calls and attribute access in the parsed code,
+not substrings of the source, so text in strings and comments is ignored.
+
+Run from the repository root with ``python -m pytest backend/tests``.
+"""
+import pytest
+from backend.core.agent.safety import (
+    IMPROVEMENT_PROFILE,
+    MODIFIER_PROFILE,
+    SafetyAnalyzer,
+    analyze_source
+)
+
+def reason(code, profile=IMPROVEMENT_PROFILE):
+    return analyze_source(code, profile)["reason"]
+
+@pytest.mark.parametrize("code, module", [
+    ("import os", "os"),
+    ("import subprocess as sp", "subprocess"),
+    ("from sys import argv", "sys"),
+    ("def f():\n    import shutil\n", "shutil")
+])
+def test_dangerous_imports_anywhere_in_the_tree(code, module):
+    assert reason(code) == f"Dangerous import detected: {module}"
+
+def test_import_rules_match_module_names_exactly():
+    assert analyze_source("import osmosis\nimport system_tools\n", IMPROVEMENT_PROFILE)["safe"]
+
+@pytest.mark.parametrize("code, name", [
+    ("open('data.txt')", "open"),
+    ("handle.write('x')", "write"),
+    ("path.unlink()", "unlink"),
+    ("items.remove(1)", "remove")
+])
+def test_file_operations_are_matched_as_calls(code, name):
+    assert reason(code) == f"Potentially dangerous file operation detected: {name}("
+
+@pytest.mark.parametrize("code", [
+    "# open('data.txt') was removed\nx = 1\n",
+    "message = 'call open( or connect( to continue'\n",
+    "def reopen():\n    return 1\n\nreopen()\n",
+    "writer = None\n",
+    "requests_total = 0\n"
+])
+def test_text_in_strings_comments_and_other_names_is_not_flagged(code):
+    assert analyze_source(code, IMPROVEMENT_PROFILE)["safe"]
+
+@pytest.mark.parametrize("code, detail", [
+    ("sock = socket.socket()", "socket."),
+    ("server.listen(5)", "listen("),
+    ("conn.connect(('localhost', 80))", "connect("),
+    ("urlopen('http://example.com')", "urlopen("),
+    ("request.Request('http://example.com')", "request.")
+])
+def test_network_operations(code, detail):
+    assert reason(code) == f"Potentially dangerous network operation detected: {detail}"
+
+def test_all_violations_are_reported_and_the_reason_follows_rule_order():
+    code = "server.bind(('', 80))\nopen('x')\nimport socket\n"
+    verdict = analyze_source(code, IMPROVEMENT_PROFILE)
+    assert not verdict["safe"]
+    assert verdict["reason"] == "Dangerous import detected: socket"
+    assert [issue["line"] for issue in verdict["issues"]] == [3, 2, 1]
+
+def test_modifier_profile_only_checks_imports():
+    code = "open('x').write('y')\nsocket.socket()\n"
+    assert analyze_source(code, MODIFIER_PROFILE)["safe"]
+    assert not analyze_source("import sys", MODIFIER_PROFILE)["safe"]
+    assert analyze_source("import shutil", MODIFIER_PROFILE)["safe"]
+
+def test_syntax_errors_are_unsafe():
+    verdict = analyze_source("def broken(:\n", IMPROVEMENT_PROFILE)
+    assert verdict["syntax_error"]
+    assert not verdict["safe"]
+    assert verdict["reason"].startswith("Syntax error")
+
+def test_verdicts_are_memoized_per_profile_and_content():
+    analyzer = SafetyAnalyzer(max_entries=2)
+    code = "open('x')"
+    assert not analyzer.check(code, IMPROVEMENT_PROFILE)["safe"]
+    assert not analyzer.check(code, IMPROVEMENT_PROFILE)["safe"]
+    assert analyzer.check(code, MODIFIER_PROFILE)["safe"]
+    assert (analyzer.hits, analyzer.misses) == (1, 2)
+
+    analyzer.check("x = 1", MODIFIER_PROFILE)
+    assert analyzer.stats()["size"] == 2
+
+def test_check_files_shares_verdicts_for_identical_content(tmp_path):
+    first = tmp_path / "a.py"
+    second = tmp_path / "b.py"
+    first.write_text("import os\n")
+    second.write_text("import os\n")
+    analyzer = SafetyAnalyzer()
+
+    verdicts = analyzer.check_files([str(first), str(second), str(tmp_path / "missing.py")])
+    assert verdicts[str(first)] is verdicts[str(second)]
+    assert verdicts[str(first)]["reason"] == "Dangerous import detected: os"
+    assert not verdicts[str(tmp_path / "missing.py")]["safe"]
+    assert analyzer.check("import os\n")["reason"] == "Dangerous import detected: os"
+    assert analyzer.hits == 1
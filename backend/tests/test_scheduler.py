@@ -0,0 +1,114 @@
+"""Tests for the per-provider rate-limit scheduler.
+
+Run from the repository root with ``python -m pytest backend/tests``.
+"""
+import asyncio
+import time
+import pytest
+from backend.core.models.scheduler import (
+    RateLimitScheduler,
+    TokenBucket,
+    PRIORITY_INTERACTIVE,
+    PRIORITY_BACKGROUND,
+    get_retry_after
+)
+
+class RateLimitError(Exception):
+    def __init__(self, headers=None):
+        super().__init__("rate limited")
+        self.status_code = 429
+        self.headers = headers
+
+def test_bucket_refills_at_the_per_minute_rate(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr("backend.core.models.scheduler.time.monotonic", lambda: now[0])
+    bucket = TokenBucket(60)
+    bucket.consume(60)
+    assert bucket.time_until(1) == pytest.approx(1.0)
+    now[0] += 0.5
+    assert bucket.time_until(1) == pytest.approx(0.5)
+    now[0] += 0.5
+    assert bucket.time_until(1) == 0.0
+    # Requests larger than the bucket only wait for a full bucket
+    assert bucket.time_until(1000) == pytest.approx(59.0)
+
+def test_unconfigured_providers_are_not_limited():
+    async def run():
+        scheduler = RateLimitScheduler()
+        await asyncio.wait_for(scheduler.acquire("openai", tokens=10 ** 9), 0.1)
+
+    asyncio.run(run())
+
+def test_waiting_interactive_requests_go_before_background_ones():
+    async def run():
+        scheduler = RateLimitScheduler({"openai": {"rpm": 600}})
+        order = []
+
+        async def request(name, priority):
+            await scheduler.acquire("openai", priority=priority)
+            order.append(name)
+
+        # Drain the bucket so every following request has to queue
+        scheduler.providers["openai"].request_bucket.tokens = 0
+        tasks = [asyncio.create_task(request(f"background-{i}", PRIORITY_BACKGROUND)) for i in range(3)]
+        await asyncio.sleep(0)
+        tasks += [asyncio.create_task(request(f"interactive-{i}", PRIORITY_INTERACTIVE)) for i in range(2)]
+        await asyncio.wait_for(asyncio.gather(*tasks), 5)
+        return order
+
+    assert asyncio.run(run()) == [
+        "interactive-0", "interactive-1", "background-0", "background-1", "background-2"
+    ]
+
+def test_tokens_per_minute_limit_makes_large_requests_wait():
+    async def run():
+        scheduler = RateLimitScheduler({"anthropic": {"tpm": 6000}})
+        await scheduler.acquire("anthropic", tokens=6000)
+        started = time.monotonic()
+        await asyncio.wait_for(scheduler.acquire("anthropic", tokens=10), 5)
+        return time.monotonic() - started
+
+    # 10 tokens at 100 tokens per second
+    assert asyncio.run(run()) == pytest.approx(0.1, abs=0.05)
+
+def test_rate_limit_pauses_the_provider_for_retry_after(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr("backend.core.models.scheduler.time.monotonic", lambda: now[0])
+    scheduler = RateLimitScheduler({"openai": {"rpm": 1000}})
+    queue = scheduler.providers["openai"]
+
+    scheduler.report_rate_limit("openai", retry_after=7.0)
+    assert queue.time_until_ready(1) == pytest.approx(7.0)
+    now[0] += 7.0
+    assert queue.time_until_ready(1) == 0.0
+    assert queue.rate_limited == 1
+
+def test_rate_limits_without_retry_after_back_off_exponentially(monkeypatch):
+    monkeypatch.setattr("backend.core.models.scheduler.time.monotonic", lambda: 0.0)
+    scheduler = RateLimitScheduler({"openai": {"rpm": 1000}})
+    queue = scheduler.providers["openai"]
+
+    delays = []
+    for _ in range(8):
+        scheduler.report_rate_limit("openai")
+        delays.append(queue.backoff_until)
+    assert delays == [1, 2, 4, 8, 16, 32, 60, 60]
+
+    scheduler.report_success("openai")
+    queue.backoff_until = 0.0
+    scheduler.report_rate_limit("openai")
+    assert queue.backoff_until == 1
+
+def test_retry_after_is_read_from_the_error_or_its_cause():
+    assert get_retry_after(RateLimitError({"retry-after": "3"})) == 3.0
+    assert get_retry_after(RateLimitError()) == 0.0
+    assert get_retry_after(RateLimitError({"retry-after": "soon"})) == 0.0
+    assert get_retry_after(ValueError("bad request")) is None
+
+    try:
+        try:
+            raise RateLimitError({"retry-after": "5"})
+        except RateLimitError as e:
+            raise RuntimeError("request failed") from e
+    except RuntimeError as wrapped:
+        assert get_retry_after(wrapped) == 5.0
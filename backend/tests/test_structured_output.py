@@ -0,0 +1,92 @@
+"""Tests for the tolerant streaming JSON parser.
+
+Run from the repository root with ``python -m pytest backend/tests``.
+"""
+import asyncio
+import json
+import pytest
+from backend.core.models.structured_output import (
+    JSONStreamParser,
+    StructuredOutputError,
+    loads_tolerant,
+    parse_json,
+    parse_stream
+)
+
+def feed_in_pieces(text, size, expect=None):
+    parser = JSONStreamParser(expect)
+    events = []
+    for start in range(0, len(text), size):
+        events.extend(parser.feed(text[start:start + size]))
+    events.extend(parser.close())
+    return parser, events
+
+def test_markdown_fence_and_prose_are_ignored():
+    text = 'Here is the analysis:\n```json\n{"potential_issues": ["a"], "performance_notes": []}\n```\nHope it helps!'
+    assert parse_json(text, "object") == {"potential_issues": ["a"], "performance_notes": []}
+
+def test_apostrophes_in_prose_and_strings():
+    text = "Here's what I found: {\"potential_issues\": [\"it's slow\", 'don\\'t block']} that's all"
+    assert parse_json(text, "object") == {"potential_issues": ["it's slow", "don't block"]}
+
+def test_trailing_commas_and_python_literals():
+    assert parse_json("{'a': True, 'b': None, 'c': [1, 2,],}") == {"a": True, "b": None, "c": [1, 2]}
+
+@pytest.mark.parametrize("size", [1, 3, 7, 1000])
+def test_events_do_not_depend_on_chunking(size):
+    text = '{"potential_issues": [{"line": 1}, {"line": 2}], "security_concerns": []}'
+    _, events = feed_in_pieces(text, size, "object")
+    assert events == [
+        {"type": "item", "key": "potential_issues", "value": {"line": 1}},
+        {"type": "item", "key": "potential_issues", "value": {"line": 2}},
+        {"type": "field", "key": "potential_issues", "value": [{"line": 1}, {"line": 2}]},
+        {"type": "field", "key": "security_concerns", "value": []}
+    ]
+
+def test_truncated_output_keeps_complete_members_and_salvages_the_last():
+    parser, events = feed_in_pieces('{"a": 1, "b": [1, 2', 4)
+    assert parser.result() == {"a": 1, "b": [1, 2]}
+    assert events[-1] == {"type": "field", "key": "b", "value": [1, 2]}
+
+def test_truncated_string_member_is_closed():
+    parser, _ = feed_in_pieces('{"a": 1, "b": "unfinish', 5)
+    assert parser.result() == {"a": 1, "b": "unfinish"}
+
+def test_unparseable_member_is_skipped():
+    parser, _ = feed_in_pieces('{"a": 1, "b": oops, "c": 3}', 4)
+    assert parser.result() == {"a": 1, "c": 3}
+    assert parser.errors == 1
+
+def test_root_array_keys_keep_positions_of_skipped_items():
+    parser, events = feed_in_pieces('[1, oops, 3]', 2, "array")
+    assert parser.result() == [1, 3]
+    assert [(event["key"], event["value"]) for event in events] == [(0, 1), (2, 3)]
+    assert parser.errors == 1
+
+def test_expect_skips_brackets_of_the_other_kind():
+    assert parse_json('Options [a] and [b]: {"a": 1}', "object") == {"a": 1}
+
+def test_no_json_raises():
+    with pytest.raises(StructuredOutputError):
+        parse_json("no json here")
+
+def test_nothing_parseable_raises():
+    with pytest.raises(StructuredOutputError):
+        parse_json("{oops}")
+
+def test_non_finite_numbers_become_null():
+    value = parse_json('{"a": NaN, "b": [Infinity, -Infinity, 1e999], "c": 1.5}')
+    assert value == {"a": None, "b": [None, None, None], "c": 1.5}
+    # Streamed events must re-serialize as strict JSON
+    json.dumps(value, allow_nan=False)
+    assert loads_tolerant("1e999") is None
+
+def test_parse_stream_stops_after_the_value():
+    async def tokens():
+        for token in ['{"a"', ': 1}', ' trailing {"b": 2}']:
+            yield token
+
+    async def collect():
+        return [event async for event in parse_stream(tokens(), "object")]
+
+    assert asyncio.run(collect()) == [{"type": "field", "key": "a", "value": 1}]
@@ -0,0 +1,100 @@
+"""Tests for the content-addressed version store.
+
+Run from the repository root with ``python -m pytest backend/tests``.
+"""
+import pytest
+from backend.core.storage.versions import INDEX_ENTRY, VersionNotFoundError, VersionStore
+
+@pytest.fixture
+def store(tmp_path):
+    return VersionStore(tmp_path / "versions", fsync=False)
+
+@pytest.fixture
+def target(tmp_path):
+    path = tmp_path / "module.py"
+    path.write_text("v1")
+    return path
+
+def chain_files(store, target):
+    chain = store._chain_path(target)
+    return chain, store._index_path(chain)
+
+def test_write_records_the_previous_and_new_content(store, target):
+    record = store.write(str(target), "v2", message="edit")
+    assert record["version"] == 2
+    assert target.read_text() == "v2"
+    history = store.history(str(target))
+    assert [(r["version"], r["message"]) for r in history] == [(1, "snapshot before write"), (2, "edit")]
+    assert history[0]["path"] == str(target.resolve())
+    assert store.read(str(target), 1) == "v1"
+
+def test_identical_content_is_stored_once(store, target):
+    store.write(str(target), "v2")
+    store.write(str(target), "v2")
+    store.write(str(target), "v1")
+    assert [r["version"] for r in store.history(str(target))] == [1, 2, 3]
+    assert store.blobs_written == 2
+    assert store.blobs_deduplicated >= 3
+
+def test_rollback_is_recorded_as_a_new_version(store, target):
+    for content in ("v2", "v3"):
+        store.write(str(target), content)
+    record = store.rollback(str(target), 1)
+    assert target.read_text() == "v1"
+    assert record["version"] == 4
+    assert record["message"] == "rollback to version 1"
+    assert store.read(str(target), 3) == "v3"
+
+def test_unknown_versions(store, target):
+    store.write(str(target), "v2")
+    for version in (0, 3):
+        with pytest.raises(VersionNotFoundError):
+            store.read(str(target), version)
+    with pytest.raises(VersionNotFoundError):
+        store.rollback(str(target), 5)
+    assert target.read_text() == "v2"
+    with pytest.raises(VersionNotFoundError):
+        store.read(str(target.with_name("other.py")), 1)
+
+def test_torn_final_record_is_skipped_and_cut_off(store, target):
+    store.write(str(target), "v2")
+    chain, _ = chain_files(store, target)
+    with open(chain, "ab") as f:
+        f.write(b'{"version": 3, "dig')
+
+    assert [r["version"] for r in store.history(str(target))] == [1, 2]
+    assert store.write(str(target), "v3")["version"] == 3
+    assert [r["version"] for r in store.history(str(target))] == [1, 2, 3]
+    assert store.read(str(target), 3) == "v3"
+
+def test_records_missing_from_the_index_are_recovered(store, target):
+    store.write(str(target), "v2")
+    _, index = chain_files(store, target)
+    data = index.read_bytes()
+    # Crash after the chain append: the last entry is missing and the one before torn
+    index.write_bytes(data[:INDEX_ENTRY.size + 3])
+
+    assert store.read(str(target), 2) == "v2"
+    assert store.write(str(target), "v3")["version"] == 3
+    assert index.stat().st_size == 3 * INDEX_ENTRY.size
+
+def test_chains_without_an_index_are_indexed_on_first_use(store, target):
+    store.write(str(target), "v2")
+    store.write(str(target), "v3")
+    _, index = chain_files(store, target)
+    index.unlink()
+
+    assert store.read(str(target), 2) == "v2"
+    assert store.rollback(str(target), 2)["version"] == 4
+    assert target.read_text() == "v2"
+
+def test_writes_only_read_the_head_of_the_chain(store, target, monkeypatch):
+    for version in range(2, 30):
+        store.write(str(target), f"v{version}")
+
+    def no_full_reads(*args, **kwargs):
+        raise AssertionError("history parsed")
+    monkeypatch.setattr(store, "history", no_full_reads)
+    store.write(str(target), "v30")
+    store.rollback(str(target), 3)
+    assert store.read(str(target), 31) == "v3"